@@ -0,0 +1,217 @@
+"""
+バッチ解析CLI
+ディレクトリ内のCSVをプロセスプールで並列解析し、ファイルごとのJSONレポートと全体サマリーを出力する
+
+使い方:
+    python cli.py ../data --output-dir ../reports --workers 8 --target A_Assemble=5.2
+    python cli.py ../data --merge   # 日別・ライン別ファイルを統合して1レポートにする
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from constants import (
+    ZONES, DEFAULT_TARGET, DEFAULT_THRESHOLD_GOOD, DEFAULT_THRESHOLD_OK
+)
+from multi_source import MultiSourceLoader, find_input_files
+from pipeline import run_pipeline
+from stage_cache import StageCache
+from streaming import ZoneStatsAccumulator
+
+
+def parse_targets(items, default_target):
+    """「ゾーン=秒」形式の指定から目標値の辞書を作成"""
+    target_values = {zone: default_target for zone in ZONES}
+    for item in items or []:
+        zone, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError(f"目標値の形式が不正です: {item}（例: A_Assemble=5.2）")
+        target_values[zone.strip()] = float(value)
+    return target_values
+
+
+def report_names(files, input_path):
+    """サブディレクトリ（ライン・日付）を含めて衝突しないレポート名（ファイル → 名前）
+
+    ディレクトリ指定はそのディレクトリ、globは一致した全ファイルの共通ディレクトリからの相対パスを使う。
+    拡張子だけが異なるファイルは拡張子も含めて区別する。
+    """
+    if os.path.isdir(input_path):
+        root = input_path
+    elif files:
+        root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in files])
+    else:
+        root = os.path.dirname(input_path)
+    stems = {path: os.path.relpath(os.path.abspath(path), os.path.abspath(root)) for path in files}
+    counts = {}
+    for relative in stems.values():
+        stem = os.path.splitext(relative)[0]
+        counts[stem] = counts.get(stem, 0) + 1
+    names = {}
+    for path, relative in stems.items():
+        stem = os.path.splitext(relative)[0]
+        name = stem if counts[stem] == 1 else relative.replace(".", "_")
+        names[path] = name.replace(os.sep, "__") + ".json"
+    return names
+
+
+def analyze_file(file_path, report_path, target_values, threshold_good, threshold_ok, use_cache,
+                 loader_options=None):
+    """1ファイルを解析してレポートを書き出す（ワーカープロセスで実行）
+
+    loader_optionsを渡すと、file_path配下の全ファイルを統合した1つのデータとして解析する。
+    """
+    started = time.perf_counter()
+    entry = {"file": file_path}
+    
+    stage_cache = StageCache() if use_cache else None
+    loader = None
+    if loader_options is not None:
+        loader = MultiSourceLoader(file_path, stage_cache=stage_cache, **loader_options)
+    result, error = run_pipeline(file_path, target_values, threshold_good, threshold_ok,
+                                 stage_cache=stage_cache, loader=loader)
+    if error:
+        entry["error"] = error
+        entry["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+        return entry
+    
+    report = {
+        "source": result["source"],
+        "preprocess_stats": result["preprocess_stats"],
+        "statistics": result["stats_dict"],
+        "llm_json": result["llm_json"]
+    }
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    
+    failed_files = result["preprocess_stats"].get("failed_files")
+    if failed_files:
+        entry["failed_files"] = failed_files
+    entry.update({
+        "report": report_path,
+        "rows": result["preprocess_stats"]["final_rows"],
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+        # 全体サマリー用にゾーン別の逐次集計を親プロセスへ返す
+        "accumulator": ZoneStatsAccumulator().update(result["df_clean"]).to_dict()
+    })
+    return entry
+
+
+def run_batch(input_path, output_dir, target_values, workers=None, pattern="*.csv",
+              threshold_good=DEFAULT_THRESHOLD_GOOD, threshold_ok=DEFAULT_THRESHOLD_OK,
+              use_cache=True):
+    """入力ファイル群を並列解析し、全体サマリーを返す"""
+    started = time.perf_counter()
+    files = find_input_files(input_path, pattern)
+    os.makedirs(output_dir, exist_ok=True)
+    
+    names = report_names(files, input_path)
+    
+    entries = []
+    combined = ZoneStatsAccumulator()
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = {
+            pool.submit(
+                analyze_file, file_path,
+                os.path.join(output_dir, names[file_path]),
+                target_values, threshold_good, threshold_ok, use_cache
+            ): file_path
+            for file_path in files
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            file_path = futures[future]
+            try:
+                entry = future.result()
+            except Exception as e:
+                entry = {"file": file_path, "error": f"ワーカーエラー: {str(e)}"}
+            accumulator = entry.pop("accumulator", None)
+            if accumulator:
+                combined.merge(ZoneStatsAccumulator.from_dict(accumulator))
+            entries.append(entry)
+            status = entry.get("error", "OK")
+            print(f"[{done}/{len(files)}] {file_path}: {status}", file=sys.stderr)
+    
+    summary = {
+        "input": input_path,
+        "file_count": len(files),
+        "failed_count": sum(1 for entry in entries if "error" in entry),
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+        "statistics": combined.to_stats_dict(target_values),
+        "files": sorted(entries, key=lambda entry: entry["file"])
+    }
+    with open(os.path.join(output_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    return summary
+
+
+def run_merged(input_path, output_dir, target_values, workers=None, pattern="*.csv",
+               threshold_good=DEFAULT_THRESHOLD_GOOD, threshold_ok=DEFAULT_THRESHOLD_OK,
+               use_cache=True):
+    """入力ファイル群を1つのデータに統合して解析し、サマリーを返す（読み込みはスレッドで並列化）"""
+    started = time.perf_counter()
+    files = find_input_files(input_path, pattern)
+    os.makedirs(output_dir, exist_ok=True)
+    
+    loader_options = {"pattern": pattern}
+    if workers:
+        loader_options["workers"] = workers
+    entry = analyze_file(input_path, os.path.join(output_dir, "merged.json"), target_values,
+                         threshold_good, threshold_ok, use_cache, loader_options=loader_options)
+    accumulator = entry.pop("accumulator", None)
+    failed_files = entry.get("failed_files", {})
+    for file_path, error in failed_files.items():
+        print(f"{file_path}: {error}", file=sys.stderr)
+    summary = {
+        "input": input_path,
+        "file_count": len(files),
+        "failed_count": len(files) if "error" in entry else len(failed_files),
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+        "statistics": ZoneStatsAccumulator.from_dict(accumulator).to_stats_dict(target_values)
+        if accumulator else {},
+        "files": [entry]
+    }
+    with open(os.path.join(output_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    return summary
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="サイクルタイムCSVのバッチ解析")
+    parser.add_argument("input", help="CSVファイル、ディレクトリ、またはglobパターン")
+    parser.add_argument("-o", "--output-dir", default="reports", help="レポート出力先")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="ワーカープロセス数（既定: CPUコア数）")
+    parser.add_argument("--pattern", default="*.csv", help="ディレクトリ指定時のファイルパターン")
+    parser.add_argument("--default-target", type=float, default=DEFAULT_TARGET, help="目標タクト（秒）")
+    parser.add_argument("-t", "--target", action="append", metavar="ZONE=SECONDS", help="ゾーン別の目標タクト")
+    parser.add_argument("--threshold-good", type=float, default=DEFAULT_THRESHOLD_GOOD)
+    parser.add_argument("--threshold-ok", type=float, default=DEFAULT_THRESHOLD_OK)
+    parser.add_argument("--no-cache", action="store_true", help="ステージキャッシュを使わない")
+    parser.add_argument("--merge", action="store_true",
+                        help="全ファイルを1つのデータに統合して解析（日別・ライン別ファイル向け）")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        target_values = parse_targets(args.target, args.default_target)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    
+    summary = (run_merged if args.merge else run_batch)(
+        args.input, args.output_dir, target_values,
+        workers=args.workers, pattern=args.pattern,
+        threshold_good=args.threshold_good, threshold_ok=args.threshold_ok,
+        use_cache=not args.no_cache
+    )
+    print(f"{summary['file_count']}ファイルを解析しました"
+          f"（失敗: {summary['failed_count']}、{summary['elapsed_seconds']}秒）→ {args.output_dir}")
+    return 1 if summary["failed_count"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,9 +11,65 @@ PROJECT_ROOT = os.path.dirname(APP_DIR)
 DEFAULT_CSV_PATH = os.path.join(PROJECT_ROOT, "data", "generated_cycles_4zones_2000rows.csv")
 ICON_PATH = os.path.join(PROJECT_ROOT, "assets", "robot_icon.png")
 
+# 解析対象（CSVファイル・ディレクトリ・globパターン。ディレクトリは日別・ライン別ファイルをまとめて読み込む）
+DATA_SOURCE = os.environ.get("CYCLEEYE_DATA_SOURCE", DEFAULT_CSV_PATH)
+DATA_SOURCE_PATTERN = os.environ.get("CYCLEEYE_DATA_PATTERN", "*.csv")
+
+# キャッシュ保存先（CSV→Parquet変換結果など）
+CACHE_DIR = os.environ.get("CYCLEEYE_CACHE_DIR", os.path.join(PROJECT_ROOT, ".cache"))
+PARQUET_CACHE_DIR = os.path.join(CACHE_DIR, "parquet")
+STAGE_CACHE_DIR = os.path.join(CACHE_DIR, "stages")
+LLM_CACHE_DIR = os.path.join(CACHE_DIR, "llm")
+ROLLUP_DB_PATH = os.environ.get("CYCLEEYE_ROLLUP_DB", os.path.join(CACHE_DIR, "rollups.sqlite3"))
+# ディスクキャッシュの合計サイズを実ファイルから数え直す間隔（書き込み件数、他プロセスの書き込み分を反映）
+DISK_CACHE_RESCAN_WRITES = 256
+
+# 解析ステージキャッシュ設定（処理内容を変えたらバージョンを上げて無効化）
+STAGE_CACHE_VERSION = 4
+STAGE_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+STAGE_CACHE_CONTENT_HASH = os.environ.get("CYCLEEYE_CACHE_CONTENT_HASH", "0") == "1"
+
+# LLM応答キャッシュ設定（同じ解析結果・プロンプト・モデル設定なら応答を再利用）
+LLM_CACHE_TTL_SECONDS = int(os.environ.get("CYCLEEYE_LLM_CACHE_TTL", 24 * 60 * 60))  # 0で無効
+LLM_CACHE_MAX_BYTES = 50 * 1024 * 1024
+
 # ゾーン定義
 ZONES = ["A_Assemble", "A2_Assemble", "B_Assemble", "B2_Assemble"]
 
+# 読み込みスキーマ（これ以外の列は読み込まない）
+ANALYSIS_COLUMNS = ["zone_name", "cycle_number", "start_datetime", "adjusted_time_seconds", "is_outlier"]
+COLUMN_DTYPES = {
+    "zone_name": "category",
+    "cycle_number": "Int32",
+    "adjusted_time_seconds": "float32",
+    "is_outlier": "boolean",
+}
+DATETIME_COLUMNS = ["start_datetime"]
+
+# チャンク読み込み設定（この行数ずつ読み込み、閾値を超えるファイルはチャンク処理）
+DEFAULT_CHUNK_SIZE = 200_000
+CHUNKED_THRESHOLD_BYTES = 256 * 1024 * 1024
+# チャンク処理でグラフ・異常値リスト用に保持する直近行数（統計・しきい値は全行から求める）
+CHUNKED_WINDOW_ROWS = int(os.environ.get("CYCLEEYE_CHUNKED_WINDOW_ROWS", 500_000))
+
+# 複数ファイル読み込み設定（読み込みスレッド数）
+MULTI_SOURCE_WORKERS = int(os.environ.get("CYCLEEYE_INGEST_WORKERS", min(16, (os.cpu_count() or 1) * 2)))
+
+# ライブモード設定（更新間隔・1回の取り込み上限・グラフ表示に保持する直近行数）
+LIVE_REFRESH_SECONDS = 5
+LIVE_MAX_BYTES_PER_POLL = 64 * 1024 * 1024
+LIVE_WINDOW_ROWS = 20_000
+
+# ストリーミング異常値検出設定（t-digestの圧縮係数・バッファ件数）
+TDIGEST_COMPRESSION = 200
+TDIGEST_BUFFER_SIZE = 2000
+
+# Hampel法（ゾーン内のサイクル順に移動中央値・移動MADで判定）
+HAMPEL_WINDOW = 31  # 移動窓のサイクル数（中心の前後15サイクル）
+HAMPEL_THRESHOLD = 3.0  # 移動中央値からの乖離がMAD換算の標準偏差の何倍で異常とするか
+HAMPEL_BLOCK_ROWS = 65_536  # 移動MADで一度に展開する窓の数（作業メモリ = この数 × 窓幅 × 8バイト）
+MAD_TO_STD = 1.4826  # 正規分布でMADを標準偏差に換算する係数
+
 # デフォルト設定値
 DEFAULT_TARGET = 5.0
 DEFAULT_THRESHOLD_GOOD = 90
@@ -27,8 +83,52 @@ CHART_HEIGHT = 700
 Y_AXIS_RANGE = [4, 12]  # 時系列グラフのY軸範囲
 TARGET_LINE_COLOR = "rgba(255, 100, 100, 0.6)"  # 薄い赤色
 TARGET_LINE_WIDTH = 2
+TIMESERIES_MAX_POINTS = 2000  # 時系列1ゾーンあたりの描画点数上限（サブプロット幅の約2倍）
+DOWNSAMPLE_METHOD = "lttb"  # "lttb" または "minmax"
+VIEW_CACHE_MAX_ENTRIES = 64  # 図・表キャッシュの最大保持数（全セッション共有）
+
+# 時間帯別集計設定（シフト表は「名前=開始時刻」をカンマ区切り、最後のシフトは翌日の最初のシフト開始まで）
+SHIFT_CALENDAR = os.environ.get("CYCLEEYE_SHIFTS", "早番=06:00,遅番=14:00,夜勤=22:00")
+TIME_BUCKETS = {"hour": "時刻", "shift": "シフト", "day": "日", "day_shift": "日×シフト"}
+DEFAULT_TIME_BUCKET = "shift"
+
+# 集計ロールアップ設定（ゾーン×分・時の集計をSQLiteに保存し、大量データの表示は集計から作成）
+ROLLUP_ENABLED = os.environ.get("CYCLEEYE_ROLLUPS", "1") == "1"
+ROLLUP_RESOLUTIONS = (60, 3600, 86400)  # 集計単位（秒）: 分・時・日
+ROLLUP_HISTOGRAM_RESOLUTIONS = (3600, 86400)  # ヒストグラム集計の単位（秒）: 時・日
+ROLLUP_HISTOGRAM_BIN_WIDTH = 0.05  # ヒストグラム集計のビン幅（秒）
+ROLLUP_VIEW_MIN_ROWS = int(os.environ.get("CYCLEEYE_ROLLUP_MIN_ROWS", 1_000_000))  # この行数以上で集計から表示
 
 # LLM設定
+ANOMALY_LIMIT = 10  # LLMに渡すゾーンあたりの異常値件数
 LLM_MODEL = "gpt-4o"
 LLM_TEMPERATURE = 0.7
-LLM_MAX_TOKENS = 2000
\ No newline at end of file
+LLM_MAX_TOKENS = 2000
+LLM_STREAM_FPS = 10  # ストリーミング表示の最大更新回数（回/秒）
+LLM_STREAM_FLUSH_CHUNKS = 64  # この数のチャンクが溜まったら更新間隔を待たずに表示
+LLM_PROMPT_TOKEN_BUDGET = int(os.environ.get("CYCLEEYE_LLM_PROMPT_BUDGET", 6000))  # プロンプトのトークン上限
+
+# 多ゾーン分析（ゾーングループごとに並行分析してから統合）
+LLM_MAP_REDUCE_MIN_ZONES = 8  # このゾーン数以上でマップ・リデュース分析に切り替え
+LLM_ZONE_GROUP_SIZE = 4  # 1リクエストで分析するゾーン数
+LLM_MAP_CONCURRENCY = int(os.environ.get("CYCLEEYE_LLM_CONCURRENCY", 4))  # 同時リクエスト数の上限
+LLM_MAP_MAX_TOKENS = 600  # ゾーングループ分析1件あたりの最大トークン数
+
+# LLMクライアント設定（タイムアウト・リトライ・接続プール・サーキットブレーカー）
+LLM_CONNECT_TIMEOUT = 5.0  # 接続確立の上限（秒）
+LLM_READ_TIMEOUT = 30.0  # 受信待ちの上限（秒、ストリーミング中のチャンク間隔にも適用）
+LLM_WRITE_TIMEOUT = 10.0
+LLM_POOL_TIMEOUT = 5.0  # 接続プールの空き待ちの上限（秒）
+LLM_MAX_CONNECTIONS = 20  # 全セッション共有の同時接続数の上限
+LLM_MAX_KEEPALIVE_CONNECTIONS = 10
+LLM_MAX_RETRIES = 3  # 429・5xx・接続エラー時の再試行回数
+LLM_BACKOFF_BASE = 0.5  # 再試行待ちの基準（秒、指数的に増やしてジッターを加える）
+LLM_BACKOFF_MAX = 8.0
+LLM_BREAKER_FAILURES = 3  # 連続失敗がこの回数に達したらAPI呼び出しを止める
+LLM_BREAKER_RESET_SECONDS = 60  # 停止後、試行を再開するまでの時間（秒）
+LLM_TELEMETRY_MAX_RECORDS = 500  # 保持する呼び出し記録の件数
+
+# 処理時間計測（ステージ別の時間・メモリ・キャッシュ状態）
+INSTRUMENTATION_ENABLED = os.environ.get("CYCLEEYE_INSTRUMENT", "0") == "1"
+METRICS_EXPORT_FORMAT = os.environ.get("CYCLEEYE_METRICS_FORMAT", "")  # "prometheus" / "ndjson" / ""（出力しない）
+METRICS_EXPORT_PATH = os.environ.get("CYCLEEYE_METRICS_PATH", os.path.join(CACHE_DIR, "metrics", "cycleeye"))
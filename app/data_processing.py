@@ -1,15 +1,26 @@
 """
 データ処理モジュール
-CSV読み込み、前処理、異常値検出、統計計算を担当
+CSV読み込み、前処理、異常値検出、統計計算を担当（Streamlitに依存しない）
 """
 
+import os
+import hashlib
+from collections import deque
 import pandas as pd
 import numpy as np
-import streamlit as st
-from constants import ZONES, DEFAULT_TARGET
+from numpy.lib.stride_tricks import sliding_window_view
+from constants import (
+    PARQUET_CACHE_DIR, DEFAULT_CHUNK_SIZE, CHUNKED_WINDOW_ROWS,
+    ANALYSIS_COLUMNS, COLUMN_DTYPES, DATETIME_COLUMNS,
+    HAMPEL_WINDOW, HAMPEL_THRESHOLD, HAMPEL_BLOCK_ROWS, MAD_TO_STD
+)
+from streaming import StreamingOutlierDetector, ZoneStatsAccumulator
+from zone_store import order_zones
+
+PARQUET_EXTENSIONS = (".parquet", ".pq")
+ARROW_EXTENSIONS = (".arrow", ".feather")
 
 
-@st.cache_data
 def load_csv_data(file_path):
     """CSVデータを読み込む"""
     try:
@@ -19,7 +30,126 @@ def load_csv_data(file_path):
         return None, str(e)
 
 
-@st.cache_data
+def load_columnar_data(file_path, use_cache=True):
+    """Parquet/Arrow/CSVを固定スキーマで読み込む
+
+    CSVは初回読み込み時にParquetへ変換してキャッシュし、
+    2回目以降は変換済みファイルから必要な列だけを読み込む。
+    """
+    try:
+        ext = os.path.splitext(file_path)[1].lower()
+        if ext in PARQUET_EXTENSIONS:
+            df = _read_parquet_projected(file_path)
+        elif ext in ARROW_EXTENSIONS:
+            df = _read_arrow_projected(file_path)
+        else:
+            df = _read_csv_cached(file_path, use_cache)
+        return apply_schema(df), None
+    except Exception as e:
+        return None, str(e)
+
+
+def apply_schema(df):
+    """読み込んだDataFrameを解析用スキーマの型に揃える"""
+    for col, dtype in COLUMN_DTYPES.items():
+        if col in df.columns and str(df[col].dtype) != dtype:
+            df[col] = df[col].astype(dtype)
+    for col in DATETIME_COLUMNS:
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+    return df
+
+
+def read_csv_typed(file_path, header=None, **kwargs):
+    """解析対象の列だけを型指定付きでCSVから読み込む
+
+    headerを渡した場合は、ヘッダー行を含まないデータ（追記分など）として読み込む。
+    read_csvのparse_datesやnullable型指定はCパーサー上で遅いため、
+    型変換は読み込み後にapply_schemaでまとめて行う。
+    """
+    if header is None:
+        columns_in_file = pd.read_csv(file_path, nrows=0).columns
+    else:
+        columns_in_file = header
+        kwargs.update(header=None, names=header)
+    columns = [col for col in ANALYSIS_COLUMNS if col in columns_in_file]
+    reader = pd.read_csv(file_path, usecols=columns, **kwargs)
+    # 列順はファイルによらずスキーマ順に揃える
+    if isinstance(reader, pd.DataFrame):
+        return apply_schema(reader[columns])
+    return (apply_schema(chunk[columns]) for chunk in reader)
+
+
+def _read_parquet_projected(file_path):
+    """Parquetから解析対象の列だけを読み込む"""
+    import pyarrow.parquet as pq
+    available = pq.read_schema(file_path).names
+    columns = [col for col in ANALYSIS_COLUMNS if col in available]
+    return pd.read_parquet(file_path, columns=columns)
+
+
+def _read_arrow_projected(file_path):
+    """Arrow IPC(Feather)から解析対象の列だけを読み込む"""
+    import pyarrow as pa
+    with pa.memory_map(file_path) as source:
+        available = pa.ipc.open_file(source).schema.names
+    columns = [col for col in ANALYSIS_COLUMNS if col in available]
+    return pd.read_feather(file_path, columns=columns)
+
+
+def parquet_cache_path(file_path):
+    """CSVに対応するParquetキャッシュのパス（パス・サイズ・更新時刻で一意）"""
+    stat = os.stat(file_path)
+    abs_path = os.path.abspath(file_path)
+    path_key = hashlib.sha1(abs_path.encode("utf-8")).hexdigest()[:12]
+    version_key = f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(PARQUET_CACHE_DIR, f"{stem}-{path_key}-{version_key}.parquet")
+
+
+def _read_csv_cached(file_path, use_cache):
+    """CSVを読み込み、可能であればParquetキャッシュを経由する"""
+    if not use_cache:
+        return read_csv_typed(file_path)
+    try:
+        import pyarrow  # noqa: F401  Parquet変換にはpyarrowが必要
+    except ImportError:
+        return read_csv_typed(file_path)
+
+    cache_path = parquet_cache_path(file_path)
+    if os.path.exists(cache_path):
+        return _read_parquet_projected(cache_path)
+
+    df = apply_schema(read_csv_typed(file_path))
+    try:
+        _write_parquet_cache(df, cache_path)
+    except OSError:
+        pass  # キャッシュ書き込み失敗時も読み込み結果は返す
+    return df
+
+
+def _write_parquet_cache(df, cache_path):
+    """Parquetキャッシュを書き込み、同じCSVの古いキャッシュを削除"""
+    cache_dir = os.path.dirname(cache_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, cache_path)
+
+    # ファイル名の「stem-pathkey-」が同じものは同一CSVの旧バージョン
+    prefix = os.path.basename(cache_path).rsplit("-", 2)[0] + "-"
+    for name in os.listdir(cache_dir):
+        if name.startswith(prefix) and name.endswith(".parquet") and \
+                os.path.join(cache_dir, name) != cache_path:
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except OSError:
+                pass
+
+
+REQUIRED_COLUMNS = ["zone_name", "adjusted_time_seconds"]
+
+
 def preprocess_data(df):
     """データ前処理"""
     stats_log = {
@@ -29,23 +159,157 @@ def preprocess_data(df):
     }
     
     # 必須列チェック
-    required_cols = ["zone_name", "adjusted_time_seconds"]
-    if not all(col in df.columns for col in required_cols):
+    if not all(col in df.columns for col in REQUIRED_COLUMNS):
         return None, stats_log, "必須列が不足しています"
     
+    df = filter_valid_rows(df, stats_log)
+    stats_log["final_rows"] = len(df)
+    
+    return df, stats_log, None
+
+
+def filter_valid_rows(df, stats_log):
+    """欠損値・無効値を除外し、除外件数をstats_logに加算"""
     # 欠損値除外
     original_len = len(df)
     df = df.dropna(subset=["adjusted_time_seconds", "zone_name"])
-    stats_log["removed_missing"] = original_len - len(df)
+    stats_log["removed_missing"] += original_len - len(df)
     
     # 無効値除外 (adjusted_time_seconds <= 0)
     original_len = len(df)
     df = df[df["adjusted_time_seconds"] > 0]
-    stats_log["removed_invalid"] = original_len - len(df)
+    stats_log["removed_invalid"] += original_len - len(df)
     
-    stats_log["final_rows"] = len(df)
+    return df
+
+
+def iter_preprocessed_chunks(file_path, stats_log, chunksize=DEFAULT_CHUNK_SIZE):
+    """ファイルをチャンク単位で読み込み、前処理済みチャンクを順に返す
+
+    stats_logの各カウンタはチャンクを処理するたびに加算される。
+    元ファイル全体をメモリに載せることはない。
+    """
+    offset = 0
+    for chunk in _iter_raw_chunks(file_path, chunksize):
+        if not all(col in chunk.columns for col in REQUIRED_COLUMNS):
+            raise ValueError("必須列が不足しています")
+        chunk = apply_schema(chunk)
+        chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+        offset += len(chunk)
+        
+        stats_log["original_rows"] += len(chunk)
+        chunk = filter_valid_rows(chunk, stats_log)
+        stats_log["final_rows"] += len(chunk)
+        yield chunk
+
+
+def preprocess_data_chunked(file_path, chunksize=DEFAULT_CHUNK_SIZE):
+    """チャンク読み込みによる前処理（preprocess_dataと同じ戻り値）
+
+    元ファイル全体を一度に読み込まずに前処理し、前処理済みのチャンクを連結して返す
+    （複数ファイルの統合用。単一の大容量ファイルは連結しないChunkedAnalysisで解析する）。
+    """
+    stats_log = {
+        "original_rows": 0,
+        "removed_missing": 0,
+        "removed_invalid": 0,
+        "final_rows": 0
+    }
+    try:
+        chunks = list(iter_preprocessed_chunks(file_path, stats_log, chunksize))
+    except ValueError as e:
+        return None, stats_log, str(e)
+    except Exception as e:
+        return None, stats_log, f"チャンク読み込みエラー: {str(e)}"
     
-    return df, stats_log, None
+    return concat_frames(chunks), stats_log, None
+
+
+class RecentFrames:
+    """直近window_rows行だけを保持するチャンクの列（古いチャンクから捨てる）"""
+
+    def __init__(self, window_rows):
+        self.window_rows = window_rows
+        self._frames = deque()
+        self._rows = 0
+
+    def append(self, df):
+        if len(df) == 0:
+            return
+        self._frames.append(df.iloc[-self.window_rows:])
+        self._rows += len(self._frames[-1])
+        while len(self._frames) > 1 and self._rows - len(self._frames[0]) >= self.window_rows:
+            self._rows -= len(self._frames.popleft())
+
+    def frame(self):
+        return concat_frames(list(self._frames)).iloc[-self.window_rows:]
+
+
+class ChunkedAnalysis:
+    """大容量ファイルのチャンク単位の解析（前処理済みチャンクを連結しない）
+
+    チャンクを順に逐次集計器・StreamingOutlierDetectorへ流して統計・しきい値を全行から求め、
+    グラフ・異常値リスト用には直近window_rows行だけを保持する。
+    ピークメモリは直近データと生チャンク1つ分で、ファイルの行数に依存しない。
+    """
+
+    def __init__(self, window_rows=CHUNKED_WINDOW_ROWS):
+        self.detector = StreamingOutlierDetector()
+        self.accumulator = ZoneStatsAccumulator()
+        self.recent = RecentFrames(window_rows)
+
+    def consume(self, chunks):
+        """チャンクを取り込み、取り込み時点のしきい値でフラグを付けたチャンクを順に返す"""
+        for chunk in chunks:
+            flagged = self.detector.update(chunk)
+            self.accumulator.update(chunk)
+            self.recent.append(chunk)
+            yield flagged
+
+    def recent_frame(self):
+        """直近データ（IQR法・Z-score法は全行のしきい値、Hampel法は直近データ内のサイクル順で判定）"""
+        frame = self.detector.flag(self.recent.frame())
+        return frame.assign(hampel_flag=zone_hampel_flags(frame))
+
+    def stats_dict(self, target_values):
+        """全行のゾーン別統計"""
+        return self.accumulator.to_stats_dict(target_values)
+
+
+def _iter_raw_chunks(file_path, chunksize):
+    """形式に応じてファイルをチャンク単位で読み込む"""
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in PARQUET_EXTENSIONS:
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(file_path)
+        columns = [col for col in ANALYSIS_COLUMNS if col in parquet_file.schema_arrow.names]
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from read_csv_typed(file_path, chunksize=chunksize)
+
+
+def concat_frames(frames):
+    """カテゴリ列のカテゴリを統合してからDataFrameを連結する
+
+    チャンクやファイルごとにカテゴリが異なるとpd.concatはobject型に
+    戻してしまうため、先にカテゴリの和集合へ揃える。
+    """
+    frames = [frame for frame in frames if frame is not None]
+    if not frames:
+        return pd.DataFrame(columns=ANALYSIS_COLUMNS)
+    for col in frames[0].columns:
+        if not isinstance(frames[0][col].dtype, pd.CategoricalDtype):
+            continue
+        categories = pd.api.types.union_categoricals(
+            [frame[col] for frame in frames if col in frame.columns]
+        ).categories
+        frames = [
+            frame.assign(**{col: frame[col].cat.set_categories(categories)})
+            if col in frame.columns else frame
+            for frame in frames
+        ]
+    return pd.concat(frames)
 
 
 def detect_outliers_iqr(series):
@@ -68,48 +332,133 @@ def detect_outliers_zscore(series):
     return z_scores > 3
 
 
-@st.cache_data
-def analyze_outliers(df):
-    """ゾーン別に異常値を検出"""
-    df = df.copy()
-    df["iqr_flag"] = False
-    df["zscore_flag"] = False
+def detect_outliers_hampel(series, window=HAMPEL_WINDOW, threshold=HAMPEL_THRESHOLD):
+    """Hampel法による異常値検出（seriesはサイクル順に並んだ1ゾーン分）"""
+    flags = hampel_flags(series.to_numpy(dtype="float64"), np.zeros(len(series), dtype="int64"),
+                         window=window, threshold=threshold)
+    return pd.Series(flags, index=series.index)
+
+
+def hampel_flags(values, groups, order=None, window=HAMPEL_WINDOW, threshold=HAMPEL_THRESHOLD):
+    """グループ（ゾーン）内の並び順で移動中央値・移動MADを求め、Hampel法のフラグを返す
+
+    移動中央値はpandasのrolling median（スキップリストによる O(n log w)）で求める。
+    MADは窓ごとに、窓内の各点と窓の中央値との偏差 |x_j - 中央値_i| の中央値を求める
+    （_rolling_madでHAMPEL_BLOCK_ROWS個の窓ずつ展開、O(n w)）。
+    order: グループ内の並び順（Noneは配列順）。戻り値は元の並びのbool配列。
+    """
+    n = len(values)
+    if n == 0:
+        return np.zeros(0, dtype="bool")
+    groups = np.asarray(groups)
+    if order is None:
+        order = np.arange(n)
+    # グループ→グループ内順の安定ソート（元の行順をタイブレークに使う）
+    sort_idx = np.lexsort((np.arange(n), order, groups))
+    sorted_values = values[sort_idx]
+    sorted_groups = groups[sort_idx]
+    bounds = np.concatenate([[0], np.flatnonzero(np.diff(sorted_groups)) + 1, [n]])
     
-    for zone in ZONES:
-        zone_mask = df["zone_name"] == zone
-        if zone_mask.sum() > 0:
-            zone_data = df.loc[zone_mask, "adjusted_time_seconds"]
-            df.loc[zone_mask, "iqr_flag"] = detect_outliers_iqr(zone_data)
-            df.loc[zone_mask, "zscore_flag"] = detect_outliers_zscore(zone_data)
+    sorted_flags = np.zeros(n, dtype="bool")
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        segment = sorted_values[start:stop]
+        median = pd.Series(segment).rolling(window, center=True, min_periods=1).median().to_numpy()
+        mad = _rolling_mad(segment, median, window)
+        deviation = np.abs(segment - median)
+        # MADが0の区間（一定値が続く区間）は判定しない（Z-score法の標準偏差0と同じ扱い）
+        sorted_flags[start:stop] = (mad > 0) & (deviation > threshold * MAD_TO_STD * mad)
     
-    return df
+    flags = np.empty(n, dtype="bool")
+    flags[sort_idx] = sorted_flags
+    return flags
+
+
+def _rolling_mad(segment, median, window, block_rows=HAMPEL_BLOCK_ROWS):
+    """中央揃えの移動窓ごとの median_j |x_j - median[i]|（窓はrolling(center=True)と同じ）
+
+    端の点はrolling(min_periods=1)と同じく、切り詰めた窓で求める。
+    """
+    n = len(segment)
+    left = window // 2
+    right = window - 1 - left
+    mad = np.empty(n)
+    if n >= window:
+        windows = sliding_window_view(segment, window)
+        for start in range(0, len(windows), block_rows):
+            block = windows[start:start + block_rows]
+            centers = slice(start + left, start + left + len(block))
+            mad[centers] = np.median(np.abs(block - median[centers, None]), axis=1)
+    edges = list(range(min(left, n))) + list(range(max(n - right, min(left, n)), n))
+    for i in edges:
+        mad[i] = np.median(np.abs(segment[max(i - left, 0):i + right + 1] - median[i]))
+    return mad
+
+
+def zone_hampel_flags(df, window=HAMPEL_WINDOW, threshold=HAMPEL_THRESHOLD):
+    """DataFrameの各ゾーンについて、サイクル順にHampel法のフラグを求める"""
+    zone_codes = df["zone_name"].astype("category").cat.codes.to_numpy()
+    return hampel_flags(df["adjusted_time_seconds"].to_numpy(dtype="float64"), zone_codes,
+                        _cycle_order(df), window, threshold)
+
+
+def _cycle_order(df):
+    """ゾーン内のサイクル順の並び替えキー（開始時刻→サイクル番号→行順）"""
+    if "start_datetime" in df.columns and pd.api.types.is_datetime64_any_dtype(df["start_datetime"]):
+        return df["start_datetime"].to_numpy(dtype="datetime64[ns]").view("int64")
+    if "cycle_number" in df.columns:
+        return df["cycle_number"].to_numpy(dtype="float64", na_value=np.nan)
+    return None
 
 
-@st.cache_data
-def calculate_statistics(df, target_values):
-    """ゾーン別統計を計算"""
-    stats_dict = {}
+def discover_zones(df):
+    """データに含まれるゾーンを返す（ZONES定義順、未定義のゾーンは名前順で後ろに追加）"""
+    return order_zones(df["zone_name"].dropna().unique())
+
+
+def analyze_outliers(df):
+    """ゾーン別に異常値を検出
+
+    データに含まれる全ゾーンについて、groupbyの1パスで
+    IQR法・Z-score法のしきい値を求めてフラグを付ける。
+    Hampel法はゾーン内のサイクル順の移動窓で判定し、ドリフト中の局所的な異常を拾う。
+    """
+    values = df["adjusted_time_seconds"].astype("float64")
+    grouped = values.groupby(df["zone_name"], observed=True, sort=False)
     
-    for zone in ZONES:
-        zone_data = df[df["zone_name"] == zone]["adjusted_time_seconds"]
-        if len(zone_data) == 0:
-            continue
-        
-        target = target_values.get(zone, DEFAULT_TARGET)
-        mean_val = zone_data.mean()
-        achieve_rate = (target / mean_val * 100) if mean_val > 0 else 0
-        
-        stats_dict[zone] = {
-            "target": round(target, 1),
-            "mean": round(mean_val, 1),
-            "min": round(zone_data.min(), 1),
-            "max": round(zone_data.max(), 1),
-            "std": round(zone_data.std(), 1),
-            "achieve_rate": round(achieve_rate, 1),
-            "count": len(zone_data)
-        }
+    # IQR法（detect_outliers_iqrと同じ判定）
+    q1 = grouped.transform("quantile", 0.25)
+    q3 = grouped.transform("quantile", 0.75)
+    iqr = q3 - q1
+    iqr_flag = (values < q1 - 1.5 * iqr) | (values > q3 + 1.5 * iqr)
+    
+    # Z-score法（detect_outliers_zscoreと同じ判定、標準偏差0のゾーンは対象外）
+    mean = grouped.transform("mean")
+    std = grouped.transform("std")
+    zscore_flag = (std != 0) & ((values - mean).abs() / std > 3)
     
-    return stats_dict
+    return df.assign(
+        iqr_flag=iqr_flag.to_numpy(),
+        zscore_flag=zscore_flag.to_numpy(),
+        # Hampel法（サイクル順の移動中央値・移動MAD）
+        hampel_flag=zone_hampel_flags(df)
+    )
+
+
+def calculate_statistics(df, target_values, zone_store=None, rollups=None, time_range=None):
+    """ゾーン別統計を計算
+
+    zone_storeがあればゾーンごとの配列ビューを、無ければ全件を1回で逐次集計器に渡す。
+    rollups（RollupView）を渡すと生データではなく集計ロールアップから求める
+    （time_rangeで期間を絞れる）。
+    """
+    if rollups is not None:
+        return rollups.statistics(target_values, time_range)
+    accumulator = ZoneStatsAccumulator()
+    if zone_store is None:
+        return accumulator.update(df).to_stats_dict(target_values)
+    for zone in zone_store.zones:
+        accumulator.update_zone(zone, zone_store.values(zone))
+    return accumulator.to_stats_dict(target_values)
 
 
 def get_status(achieve_rate, threshold_good, threshold_ok):
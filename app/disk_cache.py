@@ -0,0 +1,155 @@
+"""
+ディスクキャッシュモジュール
+キー（内容ハッシュ）単位でファイルを保存し、合計サイズの上限をLRUで守る
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from constants import DISK_CACHE_RESCAN_WRITES
+
+
+def make_key(*parts):
+    """任意のJSON化可能な値から正規化したハッシュキーを作成"""
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """ファイル単位のディスクキャッシュ（最終アクセス時刻によるLRU削除）
+
+    ヒット時にファイルの更新時刻をアクセス時刻として更新し、
+    書き込み後に合計サイズがmax_bytesを超えていれば古いものから削除する。
+    合計サイズはメモリ上で加算し、ディレクトリ全体の走査は上限超過時と
+    rescan_writes件ごと（他プロセスの書き込み分の反映）に限る。
+    """
+
+    def __init__(self, directory, max_bytes, rescan_writes=DISK_CACHE_RESCAN_WRITES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.rescan_writes = rescan_writes
+        self._total = None  # 合計サイズの見積もり（Noneは未走査）
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def path_for(self, key, ext):
+        return os.path.join(self.directory, key[:2], f"{key}{ext}")
+
+    def lookup(self, key, ext):
+        """キャッシュ済みならパスを返す（LRU用にアクセス時刻を更新）"""
+        path = self.path_for(key, ext)
+        if not os.path.exists(path):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def store(self, key, ext, write_func):
+        """write_func(一時パス)で書き込み、完成後に置き換えてから容量を調整
+
+        一時ファイルは書き込みごとに一意な名前で作るため、同じキーへの並行書き込みでも衝突しない。
+        """
+        path = self.path_for(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), prefix=f"{key}.",
+                                         suffix=".tmp", delete=False) as f:
+            tmp_path = f.name
+        try:
+            write_func(tmp_path)
+            size = os.path.getsize(tmp_path)
+            replaced = _file_size(path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        with self._lock:
+            self._writes += 1
+            rescan = self._total is None or self._writes % self.rescan_writes == 0
+            if not rescan:
+                self._total += size - replaced
+            over = rescan or self._total > self.max_bytes
+        if over:
+            self.evict()
+        return path
+
+    def read_json(self, key):
+        path = self.lookup(key, ".json")
+        if path is None:
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def write_json(self, key, data):
+        def write(tmp_path):
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+        return self.store(key, ".json", write)
+
+    def remove(self, key, ext):
+        path = self.path_for(key, ext)
+        size = _file_size(path)
+        try:
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            if self._total is not None:
+                self._total -= size
+
+    def evict(self):
+        """ディレクトリを走査して合計サイズを数え直し、上限を超えていれば最終アクセスが古いファイルから削除"""
+        with self._lock:
+            return self._evict()
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        removed = 0
+        if total > self.max_bytes:
+            for _, size, path in sorted(entries):
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+                if total <= self.max_bytes:
+                    break
+        self._total = total
+        return removed
+
+    def clear(self):
+        with self._lock:
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    try:
+                        os.remove(os.path.join(root, name))
+                    except OSError:
+                        pass
+            self._total = 0
+
+
+def _file_size(path):
+    """ファイルサイズ（存在しなければ0）"""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
@@ -0,0 +1,83 @@
+"""
+時系列ダウンサンプリングモジュール
+描画点数を画面幅に合わせて間引く（LTTB / バケット最小最大）
+"""
+
+import numpy as np
+
+
+def minmax_indices(y, n_out):
+    """等幅バケットごとの最小点・最大点を残すインデックス（先頭・末尾を含む）"""
+    n = len(y)
+    n_buckets = (n_out - 2) // 2
+    if n <= n_out or n_buckets < 1:
+        return np.arange(n)
+    
+    y = np.asarray(y, dtype="float64")
+    size = -(-n // n_buckets)
+    n_rows = -(-n // size)
+    padded = np.full(n_rows * size, np.nan)
+    padded[:n] = y
+    blocks = padded.reshape(n_rows, size)
+    starts = np.arange(n_rows) * size
+    
+    idx = np.concatenate([
+        starts + np.nanargmin(blocks, axis=1),
+        starts + np.nanargmax(blocks, axis=1),
+        [0, n - 1]
+    ])
+    return np.unique(idx)
+
+
+def lttb_indices(x, y, n_out):
+    """Largest-Triangle-Three-Buckets で残す点のインデックスを返す"""
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    
+    # 先頭・末尾を除く区間を n_out-2 個のバケットに分割
+    bounds = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # 各バケットの平均点（次バケットの代表点として使う）。末尾の点を最終バケットとして追加
+    edges = np.append(bounds, n)
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x, edges[:-1]) / counts
+    avg_y = np.add.reduceat(y, edges[:-1]) / counts
+    
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        start, end = bounds[i], bounds[i + 1]
+        nx, ny = avg_x[i + 1], avg_y[i + 1]
+        # 前の選択点・次バケット平均点と作る三角形の面積（2倍値）が最大の点を選ぶ
+        area = np.abs(
+            (x[prev] - nx) * (y[start:end] - y[prev])
+            - (x[prev] - x[start:end]) * (ny - y[prev])
+        )
+        prev = start + int(np.argmax(area))
+        selected[i + 1] = prev
+    return selected
+
+
+def downsample_indices(x, y, n_out, method="lttb"):
+    """描画用に残す点のインデックスを返す（n_out点以下ならすべて）
+
+    LTTBは点数が多いとき、先にバケット最小最大で候補を絞ってから適用する。
+    """
+    n = len(y)
+    if n <= n_out:
+        return np.arange(n)
+    
+    if method == "minmax":
+        return minmax_indices(y, n_out)
+    if method != "lttb":
+        raise ValueError(f"未対応のダウンサンプリング方式です: {method}")
+    
+    if n > 4 * n_out:
+        candidates = minmax_indices(y, 4 * n_out)
+        return candidates[lttb_indices(np.asarray(x)[candidates], np.asarray(y)[candidates], n_out)]
+    return lttb_indices(x, y, n_out)
@@ -0,0 +1,186 @@
+"""
+処理時間計測モジュール
+解析の各ステージの実行時間・常駐メモリの増減・キャッシュ状態を記録し、
+Prometheusのtextfile形式またはNDJSONで出力する（無効時はほぼ負荷なし）
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from constants import INSTRUMENTATION_ENABLED, METRICS_EXPORT_FORMAT, METRICS_EXPORT_PATH
+
+_local = threading.local()
+# 実行ごとに変わる計測値（記録の内容の比較から除く）
+MEASURED_FIELDS = ("seconds", "rss_mb", "rss_delta_mb")
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else None
+
+
+def _current_rss_bytes():
+    """プロセスの現在の常駐メモリ（取得できない環境ではNone）
+
+    最大常駐メモリ（ru_maxrss）はプロセス開始からの最大値で、一度上がると
+    以降のステージの増加が0になるため、ステージの前後で現在値を比べる。
+    Linuxは/proc/self/statm、それ以外はpsutilがあれば使う。
+    """
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, TypeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+class _NullStage:
+    """計測無効時のステージ（何もしない）"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **fields):
+        pass
+
+
+NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    """1ステージの計測（with文の間の経過時間と常駐メモリの増減）"""
+
+    def __init__(self, timer, name, fields):
+        self.timer = timer
+        self.fields = {"stage": name, **fields}
+
+    def set(self, **fields):
+        """キャッシュ状態などの付加情報を記録"""
+        self.fields.update(fields)
+
+    def __enter__(self):
+        self._parent = getattr(_local, "stage", NULL_STAGE)
+        _local.stage = self
+        self._rss = _current_rss_bytes()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        seconds = time.perf_counter() - self._start
+        rss = _current_rss_bytes()
+        _local.stage = self._parent
+        self.fields["seconds"] = round(seconds, 4)
+        if rss is not None and self._rss is not None:
+            self.fields["rss_mb"] = round(rss / 1024 / 1024, 1)
+            self.fields["rss_delta_mb"] = round((rss - self._rss) / 1024 / 1024, 1)
+        if exc_type is not None:
+            self.fields["error"] = exc_type.__name__
+        self.timer.records.append(self.fields)
+        return False
+
+
+def current_stage():
+    """実行中のステージ（計測していなければ何もしないステージ）"""
+    return getattr(_local, "stage", NULL_STAGE)
+
+
+class StageTimer:
+    """ステージ別の計測記録
+
+    with timer.stage("statistics") as stage: ... の形で使い、
+    stage.set(cache="hit") でキャッシュ状態を付加する。
+    """
+
+    def __init__(self, enabled=INSTRUMENTATION_ENABLED):
+        self.enabled = enabled
+        self.run_id = uuid.uuid4().hex[:12]
+        self.records = []
+
+    def stage(self, name, **fields):
+        if not self.enabled:
+            return NULL_STAGE
+        return _Stage(self, name, fields)
+
+    def extend(self, records):
+        """別の計測（前回の解析実行分など）の記録を追加"""
+        if self.enabled:
+            self.records.extend(records)
+
+    def total_seconds(self):
+        return round(sum(r["seconds"] for r in self.records), 4)
+
+    def signature(self):
+        """時間・メモリを除いた記録の内容（同じ処理をしただけの再実行かどうかの判定用）"""
+        return tuple(
+            tuple(sorted((key, value) for key, value in record.items() if key not in MEASURED_FIELDS))
+            for record in self.records
+        )
+
+    # ========== 出力 ==========
+
+    def export(self, fmt=METRICS_EXPORT_FORMAT, path=METRICS_EXPORT_PATH):
+        """記録をファイルへ出力（fmt: "prometheus" / "ndjson"、それ以外は何もしない）"""
+        if not self.enabled or not self.records:
+            return None
+        if fmt == "prometheus":
+            return self.write_prometheus(path + ".prom")
+        if fmt == "ndjson":
+            return self.append_ndjson(path + ".ndjson")
+        return None
+
+    def append_ndjson(self, path):
+        """1ステージ1行のJSONとして追記"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        timestamp = time.time()
+        with open(path, "a", encoding="utf-8") as f:
+            for record in self.records:
+                f.write(json.dumps({"run_id": self.run_id, "timestamp": timestamp, **record},
+                                   ensure_ascii=False) + "\n")
+        return path
+
+    def write_prometheus(self, path):
+        """node_exporterのtextfileコレクタ形式で最新の計測を書き出す（置き換えは原子的）"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # 同名ステージ（グラフの再描画など）は時間・メモリの増減を合計、常駐メモリは最後の値にまとめる
+        stages = {}
+        for record in self.records:
+            merged = stages.setdefault(record["stage"], {"seconds": 0.0, "rss_delta_mb": None, "rss_mb": None,
+                                                         "cache": None})
+            merged["seconds"] += record["seconds"]
+            if record.get("rss_delta_mb") is not None:
+                merged["rss_delta_mb"] = (merged["rss_delta_mb"] or 0.0) + record["rss_delta_mb"]
+                merged["rss_mb"] = record["rss_mb"]
+            if record.get("cache") is not None:
+                merged["cache"] = record["cache"]
+        
+        lines = []
+        metrics = [
+            ("cycleeye_stage_duration_seconds", "ステージの実行時間", "seconds", 1),
+            ("cycleeye_stage_rss_delta_bytes", "ステージ前後の常駐メモリの増減（負は解放）", "rss_delta_mb", 1024 * 1024),
+            ("cycleeye_stage_rss_bytes", "ステージ終了時の常駐メモリ", "rss_mb", 1024 * 1024),
+        ]
+        for metric, help_text, field, scale in metrics:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} gauge")
+            for stage, merged in stages.items():
+                if merged[field] is not None:
+                    lines.append(f'{metric}{{stage="{stage}"}} {merged[field] * scale:g}')
+        lines.append("# HELP cycleeye_stage_cache_hit ステージ出力をキャッシュから取得したか（1=ヒット）")
+        lines.append("# TYPE cycleeye_stage_cache_hit gauge")
+        for stage, merged in stages.items():
+            if merged["cache"] is not None:
+                lines.append(f'cycleeye_stage_cache_hit{{stage="{stage}"}} {int(merged["cache"] == "hit")}')
+        lines.append("# HELP cycleeye_last_run_timestamp_seconds 最後に計測を出力した時刻")
+        lines.append("# TYPE cycleeye_last_run_timestamp_seconds gauge")
+        lines.append(f"cycleeye_last_run_timestamp_seconds {time.time():.3f}")
+        
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+        return path
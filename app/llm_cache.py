@@ -0,0 +1,41 @@
+"""
+LLM応答キャッシュモジュール
+プロンプト・解析結果・モデル設定のハッシュをキーに、応答テキストをディスクへ保存する
+"""
+
+import time
+from constants import LLM_CACHE_DIR, LLM_CACHE_MAX_BYTES, LLM_CACHE_TTL_SECONDS
+from disk_cache import DiskCache, make_key
+
+
+class LLMResponseCache:
+    """LLM応答のディスクキャッシュ（有効期限付き、容量超過はLRU削除）"""
+
+    def __init__(self, directory=LLM_CACHE_DIR, max_bytes=LLM_CACHE_MAX_BYTES,
+                 ttl_seconds=LLM_CACHE_TTL_SECONDS):
+        self.disk = DiskCache(directory, max_bytes)
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def key(system_prompt, prompt_template, llm_json, model, temperature, max_tokens):
+        return make_key("llm", system_prompt, prompt_template, llm_json, model, temperature, max_tokens)
+
+    def get(self, key):
+        """有効期限内の応答テキスト（無い・期限切れはNone）"""
+        if self.ttl_seconds <= 0:
+            return None
+        entry = self.disk.read_json(key)
+        if not isinstance(entry, dict) or "response" not in entry:
+            return None
+        if time.time() - entry.get("created_at", 0) > self.ttl_seconds:
+            self.disk.remove(key, ".json")
+            return None
+        return entry["response"]
+
+    def put(self, key, response):
+        if self.ttl_seconds <= 0:
+            return
+        try:
+            self.disk.write_json(key, {"created_at": time.time(), "response": response})
+        except (OSError, TypeError):
+            pass  # キャッシュできなくても応答はそのまま使う
@@ -0,0 +1,294 @@
+"""
+LLMクライアントモジュール
+タイムアウト・接続プール付きのOpenAIクライアントに、再試行（ジッター付き指数バックオフ）、
+サーキットブレーカー、呼び出しごとの計測（レイテンシ・再試行回数・トークン数）を加える
+"""
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+import numpy as np
+from constants import (
+    LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT, LLM_WRITE_TIMEOUT, LLM_POOL_TIMEOUT,
+    LLM_MAX_CONNECTIONS, LLM_MAX_KEEPALIVE_CONNECTIONS,
+    LLM_MAX_RETRIES, LLM_BACKOFF_BASE, LLM_BACKOFF_MAX,
+    LLM_BREAKER_FAILURES, LLM_BREAKER_RESET_SECONDS, LLM_TELEMETRY_MAX_RECORDS,
+    LLM_MODEL, LLM_TEMPERATURE
+)
+from llm_prompts import count_tokens
+
+
+def _openai():
+    """openaiモジュール（読み込みに時間がかかるため、AI分析を初めて使うときに読み込む）"""
+    import openai
+    return openai
+
+
+class CircuitOpenError(Exception):
+    """サーキットブレーカーが開いているためAPIを呼び出さなかった"""
+
+
+def client_timeout():
+    return _openai().Timeout(connect=LLM_CONNECT_TIMEOUT, read=LLM_READ_TIMEOUT,
+                          write=LLM_WRITE_TIMEOUT, pool=LLM_POOL_TIMEOUT)
+
+
+def client_limits():
+    # openaiが使うHTTPクライアントの接続数設定クラス（httpx.Limits）
+    Limits = type(_openai().DEFAULT_CONNECTION_LIMITS)
+    return Limits(max_connections=LLM_MAX_CONNECTIONS,
+                  max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS)
+
+
+def create_openai_client(api_key, base_url=None):
+    """タイムアウト・接続プールを設定したOpenAIクライアント（再試行はResilientLLMClientが行う）"""
+    openai = _openai()
+    return openai.OpenAI(api_key=api_key, base_url=base_url, timeout=client_timeout(), max_retries=0,
+                         http_client=openai.DefaultHttpxClient(limits=client_limits()))
+
+
+def is_retryable(error):
+    """再試行すべきエラーか（429・5xx・タイムアウト・接続エラー）"""
+    openai = _openai()
+    if isinstance(error, (openai.APIConnectionError, openai.RateLimitError)):
+        return True  # APITimeoutErrorはAPIConnectionErrorのサブクラス
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def backoff_delay(attempt, error=None, base=LLM_BACKOFF_BASE, cap=LLM_BACKOFF_MAX, rng=random):
+    """再試行までの待ち時間（Retry-Afterがあれば優先、無ければフルジッター付き指数バックオフ）"""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(cap, max(0.0, float(retry_after)))
+        except ValueError:
+            pass
+    return rng.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """連続失敗でAPI呼び出しを止め、一定時間後に1件だけ試行を許可する
+
+    試行中（half_open）は、その結果が記録されるまで他の呼び出しを拒否する。
+    全セッション・並行呼び出しで共有されるため、状態の更新はロックで保護する。
+    試行の結果が記録されないままreset_seconds経過した場合は、次の1件に試行を許可する。
+    障害とみなさないエラー（400・401等）はrelease_probeで試行枠だけを返し、失敗数は変えない。
+    """
+
+    def __init__(self, failure_threshold=LLM_BREAKER_FAILURES, reset_seconds=LLM_BREAKER_RESET_SECONDS,
+                 clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "open":
+                return False
+            now = self.clock()
+            if self.probe_started_at is not None and now - self.probe_started_at < self.reset_seconds:
+                return False  # 試行中
+            self.probe_started_at = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probe_started_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = self.clock()
+            self.probe_started_at = None
+
+    def release_probe(self):
+        with self._lock:
+            self.probe_started_at = None
+
+
+class LLMTelemetry:
+    """LLM呼び出しの計測記録（直近max_records件）"""
+
+    def __init__(self, max_records=LLM_TELEMETRY_MAX_RECORDS):
+        self.records = deque(maxlen=max_records)
+
+    def record(self, **fields):
+        self.records.append(fields)
+
+    def summary(self):
+        """件数・失敗数・レイテンシ（p50/p95）・再試行回数・トークン数の集計"""
+        records = list(self.records)
+        latencies = [r["latency_seconds"] for r in records if r["status"] == "ok"]
+        return {
+            "calls": len(records),
+            "errors": sum(r["status"] != "ok" for r in records),
+            "retries": sum(r["retries"] for r in records),
+            "latency_p50": round(float(np.percentile(latencies, 50)), 3) if latencies else None,
+            "latency_p95": round(float(np.percentile(latencies, 95)), 3) if latencies else None,
+            "prompt_tokens": sum(r["prompt_tokens"] for r in records),
+            "completion_tokens": sum(r["completion_tokens"] for r in records),
+        }
+
+
+class _StreamState:
+    """1回の呼び出し中の受信状態"""
+
+    def __init__(self, on_delta):
+        self.on_delta = on_delta
+        self.chunks = []
+        self.usage = None
+
+    def receive(self, chunk):
+        if getattr(chunk, "usage", None) is not None:
+            self.usage = chunk.usage
+        if chunk.choices and chunk.choices[0].delta.content:
+            self.chunks.append(chunk.choices[0].delta.content)
+            if self.on_delta:
+                self.on_delta(self.chunks[-1])
+
+
+class ResilientLLMClient:
+    """再試行・サーキットブレーカー・計測付きのストリーミングチャット呼び出し
+
+    再試行は応答チャンクを受信する前の失敗に限る（表示済みの途中結果を重複させないため）。
+    """
+
+    def __init__(self, client, breaker=None, telemetry=None, max_retries=LLM_MAX_RETRIES,
+                 sleep=time.sleep, async_sleep=asyncio.sleep, rng=random):
+        self.client = client
+        self.breaker = breaker or CircuitBreaker()
+        self.telemetry = telemetry or LLMTelemetry()
+        self.max_retries = max_retries
+        self.sleep = sleep
+        self.async_sleep = async_sleep
+        self.rng = rng
+
+    @property
+    def api_key(self):
+        return self.client.api_key
+
+    @property
+    def base_url(self):
+        return self.client.base_url
+
+    def _request(self, messages, max_tokens):
+        return dict(model=LLM_MODEL, messages=messages, stream=True, temperature=LLM_TEMPERATURE,
+                    max_tokens=max_tokens, stream_options={"include_usage": True})
+
+    def _check_breaker(self, messages, started):
+        if not self.breaker.allow():
+            self._record(messages, started, 0, None, "circuit_open")
+            raise CircuitOpenError("LLM APIの連続エラーのため、一時的に呼び出しを停止しています")
+
+    def _should_retry(self, error, state, attempt):
+        return not state.chunks and attempt < self.max_retries and is_retryable(error)
+
+    def _record(self, messages, started, retries, state, status):
+        usage = state.usage if state else None
+        self.telemetry.record(
+            model=LLM_MODEL,
+            status=status,
+            latency_seconds=round(time.perf_counter() - started, 3),
+            retries=retries,
+            prompt_tokens=usage.prompt_tokens if usage else sum(count_tokens(m["content"]) for m in messages),
+            completion_tokens=usage.completion_tokens if usage else (len(state.chunks) if state else 0),
+        )
+
+    def _finish(self, messages, started, attempt, state, error):
+        if error is None:
+            self.breaker.record_success()
+            self._record(messages, started, attempt, state, "ok")
+            return "".join(state.chunks)
+        # 障害（429・5xx・タイムアウト・接続エラー）だけを数え、リクエスト自体の誤りでは遮断しない
+        if is_retryable(error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.release_probe()
+        self._record(messages, started, attempt, state, type(error).__name__)
+        raise error
+
+    def stream_chat(self, messages, max_tokens, on_delta=None):
+        """ストリーミングでチャット補完を受信し、全文を返す"""
+        started = time.perf_counter()
+        self._check_breaker(messages, started)
+        attempt = 0
+        while True:
+            state = _StreamState(on_delta)
+            try:
+                for chunk in self.client.chat.completions.create(**self._request(messages, max_tokens)):
+                    state.receive(chunk)
+                return self._finish(messages, started, attempt, state, None)
+            except Exception as e:
+                if not self._should_retry(e, state, attempt):
+                    return self._finish(messages, started, attempt, state, e)
+                self.sleep(backoff_delay(attempt, e, rng=self.rng))
+                attempt += 1
+
+    def async_session(self):
+        """同じ接続先・タイムアウト・接続数設定の非同期セッション（async withで使う）"""
+        return AsyncLLMSession(self)
+
+
+class AsyncLLMSession:
+    """ResilientLLMClientの非同期版（イベントループごとにAsyncOpenAIを作成して閉じる）"""
+
+    def __init__(self, llm):
+        self.llm = llm
+        self.client = None
+
+    async def __aenter__(self):
+        openai = _openai()
+        self.client = openai.AsyncOpenAI(
+            api_key=self.llm.api_key, base_url=self.llm.base_url, timeout=client_timeout(),
+            max_retries=0, http_client=openai.DefaultAsyncHttpxClient(limits=client_limits())
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.client.close()
+
+    async def astream_chat(self, messages, max_tokens, on_delta=None):
+        llm = self.llm
+        started = time.perf_counter()
+        llm._check_breaker(messages, started)
+        attempt = 0
+        while True:
+            state = _StreamState(on_delta)
+            try:
+                response = await self.client.chat.completions.create(**llm._request(messages, max_tokens))
+                async for chunk in response:
+                    state.receive(chunk)
+                return llm._finish(messages, started, attempt, state, None)
+            except Exception as e:
+                if not llm._should_retry(e, state, attempt):
+                    return llm._finish(messages, started, attempt, state, e)
+                await llm.async_sleep(backoff_delay(attempt, e, rng=llm.rng))
+                attempt += 1
+
+
+def as_resilient(client):
+    """OpenAIクライアントをResilientLLMClientで包む（包み済みならそのまま）"""
+    if isinstance(client, ResilientLLMClient):
+        return client
+    return ResilientLLMClient(client)
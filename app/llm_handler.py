@@ -1,16 +1,21 @@
 """
 LLM処理モジュール
-OpenAI APIとの連携、JSON生成を担当
+OpenAI APIとの連携を担当（LLM向けJSONの生成はllm_payload）
 """
 
 import os
-import json
 import streamlit as st
-from openai import OpenAI
 from constants import (
-    ZONES, LLM_MODEL, LLM_TEMPERATURE, LLM_MAX_TOKENS
+    LLM_MODEL, LLM_TEMPERATURE, LLM_MAX_TOKENS, LLM_MAP_REDUCE_MIN_ZONES, LLM_PROMPT_TOKEN_BUDGET
 )
-from data_processing import get_status
+from llm_payload import generate_llm_json  # noqa: F401  既存の呼び出し元向けに再公開
+from llm_payload import rule_based_report
+from llm_client import ResilientLLMClient, create_openai_client, as_resilient
+from llm_prompts import (
+    SYSTEM_PROMPT, PROMPT_TEMPLATE, MAP_PROMPT_TEMPLATE, REDUCE_PROMPT_TEMPLATE, build_prompt
+)
+from llm_mapreduce import run_map_reduce
+from stream_renderer import StreamRenderer
 
 
 @st.cache_resource
@@ -34,132 +39,85 @@ def init_openai_client():
         if not api_key:
             return None, "APIキーが設定されていません"
         
-        client = OpenAI(api_key=api_key)
+        # タイムアウト・接続プール・再試行・サーキットブレーカーは全セッションで共有
+        client = ResilientLLMClient(create_openai_client(api_key))
         return client, None
     except Exception as e:
         return None, f"OpenAIクライアント初期化エラー: {str(e)}"
 
 
-def generate_llm_json(df, stats_dict, threshold_good, threshold_ok):
-    """LLM向けの構造化JSONを生成"""
-    output = {
-        "summary": {
-            "overall_comment": "製造ラインの4ゾーンのサイクルタイムデータを解析しました。"
-        },
-        "zones": {}
-    }
+def analyze_with_llm(client, llm_json, stream_placeholder, response_cache=None, stream_metrics=None):
+    """OpenAI GPT-4oでデータを分析（キャッシュ済みの応答はAPIを呼ばずに表示）
+
+    ゾーン数がLLM_MAP_REDUCE_MIN_ZONES以上の場合は、ゾーングループごとの並行分析を
+    ライン全体レポートへ統合するマップ・リデュース分析を行う。
+    stream_metrics（辞書）を渡すと、ストリーミングの計測結果（TTFT・トークン/秒）と
+    応答キャッシュの状態（"cache": "hit"/"miss"、キャッシュ無しでは書き込まない）を書き込む。
+    """
+    map_reduce = len(llm_json.get("zones", {})) >= LLM_MAP_REDUCE_MIN_ZONES
+    templates = (MAP_PROMPT_TEMPLATE, REDUCE_PROMPT_TEMPLATE) if map_reduce else PROMPT_TEMPLATE
+    cache_key = None
+    if response_cache is not None:
+        cache_key = response_cache.key(SYSTEM_PROMPT, (templates, LLM_PROMPT_TOKEN_BUDGET), llm_json,
+                                       LLM_MODEL, LLM_TEMPERATURE, LLM_MAX_TOKENS)
+        cached = response_cache.get(cache_key)
+        if stream_metrics is not None:
+            stream_metrics["cache"] = "hit" if cached is not None else "miss"
+        if cached is not None:
+            stream_placeholder.markdown(cached)
+            return cached, None
     
-    for zone in ZONES:
-        if zone not in stats_dict:
-            continue
-        
-        zone_stats = stats_dict[zone]
-        zone_data = df[df["zone_name"] == zone]
-        
-        # 異常値リスト
-        anomalies = []
-        outlier_data = zone_data[zone_data["iqr_flag"] | zone_data["zscore_flag"]]
-        for _, row in outlier_data.head(10).iterrows():
-            anomalies.append({
-                "timestamp": str(row.get("start_datetime", row.name)),
-                "value": float(row["adjusted_time_seconds"]),
-                "iqr_flag": bool(row["iqr_flag"]),
-                "zscore_flag": bool(row["zscore_flag"])
-            })
-        
-        status = get_status(zone_stats["achieve_rate"], threshold_good, threshold_ok)
-        
-        # 評価と推奨
-        evaluation = f"達成率{zone_stats['achieve_rate']}%（ステータス: {status}）"
-        recommendations = []
-        
-        if zone_stats["achieve_rate"] < threshold_ok:
-            recommendations.append({
-                "text": f"平均サイクルタイム{zone_stats['mean']}秒がターゲット{zone_stats['target']}秒を大きく上回っています",
-                "priority": "High",
-                "reason": f"達成率が{zone_stats['achieve_rate']}%と低い"
-            })
-        
-        if zone_stats["std"] > 1.0:
-            recommendations.append({
-                "text": "ばらつきが大きいため、工程の安定化が必要です",
-                "priority": "Medium",
-                "reason": f"標準偏差が{zone_stats['std']}秒"
-            })
-        
-        output["zones"][zone] = {
-            "stats": {
-                "target": zone_stats["target"],
-                "mean": zone_stats["mean"],
-                "min": zone_stats["min"],
-                "max": zone_stats["max"],
-                "achieve_rate": zone_stats["achieve_rate"],
-                "status": status
-            },
-            "histogram": {
-                "x_min": zone_stats["min"],
-                "x_max": zone_stats["max"],
-                "bins": 30
-            },
-            "timeseries": {
-                "point_count": zone_stats["count"],
-                "notes": "時系列データあり"
-            },
-            "anomalies": anomalies,
-            "evaluation": {
-                "short": evaluation
-            },
-            "recommendations": recommendations
-        }
+    if map_reduce:
+        full_response, error = analyze_with_llm_map_reduce(client, llm_json, stream_placeholder, stream_metrics)
+    else:
+        full_response, error = analyze_with_llm_single(client, llm_json, stream_placeholder, stream_metrics)
     
-    output["requested_additional_data"] = ["作業者情報", "設備保全履歴", "材料ロット情報"]
+    if error:
+        # API障害・サーキットブレーカー作動時はルールベースの評価・推奨事項で代替（キャッシュしない）
+        fallback = rule_based_report(llm_json, error)
+        stream_placeholder.markdown(fallback)
+        if stream_metrics is not None:
+            stream_metrics["fallback"] = True
+        return fallback, None
     
-    return output
+    if response_cache is not None:
+        response_cache.put(cache_key, full_response)
+    return full_response, None
 
 
-def analyze_with_llm(client, llm_json, stream_placeholder):
-    """OpenAI GPT-4oでデータを分析"""
+def analyze_with_llm_single(client, llm_json, stream_placeholder, stream_metrics=None):
+    """全ゾーンを1回のリクエストで分析"""
+    renderer = StreamRenderer(stream_placeholder)
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": build_prompt(llm_json)}
+    ]
+    try:
+        as_resilient(client).stream_chat(messages, LLM_MAX_TOKENS, renderer.feed)
+    except Exception as e:
+        return None, f"LLM分析エラー: {str(e)}"
     
-    prompt = f"""
-あなたは製造ラインの生産性改善を専門とする熟練のデータアナリストです。
-以下のJSONデータは、4つの製造ゾーン（A_Assemble, A2_Assemble, B_Assemble, B2_Assemble）のサイクルタイムデータの統計分析結果です。
-
-**データ概要:**
-{json.dumps(llm_json, ensure_ascii=False, indent=2)}
+    full_response = renderer.finish()
+    if stream_metrics is not None:
+        stream_metrics.update(renderer.metrics())
+    return full_response, None
 
-**分析依頼:**
-1. 各ゾーンの現状を評価してください（達成率、ばらつき、異常値の観点から）
-2. 問題点を優先度順に指摘してください
-3. 具体的な改善提案を3-5個提示してください（数値的根拠を含めて）
-4. 追加で収集すべきデータがあれば提案してください
 
-**回答形式:**
-- 親しみやすく、わかりやすい日本語で回答してください
-- 重要な数値は必ず含めてください
-- 箇条書きや見出しを使って読みやすくしてください
-"""
+def analyze_with_llm_map_reduce(client, llm_json, stream_placeholder, stream_metrics=None):
+    """多ゾーンのマップ・リデュース分析（ゾーン別の結果が届くたびに途中経過を表示）
 
-    try:
-        response = client.chat.completions.create(
-            model=LLM_MODEL,
-            messages=[
-                {"role": "system", "content": "あなたは製造ラインの生産性改善を専門とする熟練のデータアナリストです。"},
-                {"role": "user", "content": prompt}
-            ],
-            stream=True,
-            temperature=LLM_TEMPERATURE,
-            max_tokens=LLM_MAX_TOKENS
+    計測結果のTTFTは分析開始から統合レポートの最初のトークンまでの時間。
+    """
+    renderer = StreamRenderer(stream_placeholder)
+    
+    def show_partial(done, total, partials):
+        stream_placeholder.markdown(
+            "\n\n".join(partials) + f"\n\n⏳ ゾーン別分析 {done}/{total} 完了（全体レポート作成待ち）"
         )
-        
-        full_response = ""
-        for chunk in response:
-            if chunk.choices[0].delta.content:
-                content = chunk.choices[0].delta.content
-                full_response += content
-                stream_placeholder.markdown(full_response + "▌")
-        
-        stream_placeholder.markdown(full_response)
-        return full_response, None
-        
-    except Exception as e:
-        return None, f"LLM分析エラー: {str(e)}"
\ No newline at end of file
+    
+    full_response, error = run_map_reduce(client, llm_json, show_partial, renderer.feed)
+    if full_response is not None:
+        renderer.finish()
+        if stream_metrics is not None:
+            stream_metrics.update(renderer.metrics())
+    return full_response, error
@@ -0,0 +1,75 @@
+"""
+多ゾーンLLM分析モジュール
+ゾーングループごとの分析を同時実行数を制限して並行に行い、最後にライン全体レポートへ統合する
+"""
+
+import asyncio
+from constants import LLM_MAX_TOKENS, LLM_ZONE_GROUP_SIZE, LLM_MAP_CONCURRENCY, LLM_MAP_MAX_TOKENS
+from llm_client import as_resilient
+from llm_prompts import SYSTEM_PROMPT, build_map_prompt, build_reduce_prompt, zone_groups
+
+
+async def stream_completion(session, prompt, max_tokens, on_delta=None):
+    """チャット補完をストリーミングで受信し、全文を返す（on_deltaには各チャンクを渡す）"""
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+    return await session.astream_chat(messages, max_tokens, on_delta)
+
+
+async def analyze_zones_async(session, llm_json, on_partial=None, on_reduce_delta=None,
+                              concurrency=LLM_MAP_CONCURRENCY, group_size=LLM_ZONE_GROUP_SIZE):
+    """ゾーングループを並行分析（マップ）し、ライン全体レポートに統合（リデュース）
+
+    on_partial(完了数, グループ数, 完了順の部分結果リスト) は各グループの完了ごとに、
+    on_reduce_delta(チャンク) は統合レポートのチャンク受信ごとに呼ばれる。
+    戻り値: (統合レポート, エラーメッセージ)
+    """
+    groups = zone_groups(llm_json, group_size)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    
+    async def analyze_group(zones):
+        async with semaphore:
+            return zones, await stream_completion(session, build_map_prompt(llm_json, zones),
+                                                  LLM_MAP_MAX_TOKENS)
+    
+    # マップ: 完了した順に部分結果を通知（統合時はゾーン順に並べ直す）
+    results = {}
+    failures = []
+    tasks = [asyncio.ensure_future(analyze_group(zones)) for zones in groups]
+    for done in asyncio.as_completed(tasks):
+        try:
+            zones, text = await done
+        except Exception as e:
+            failures.append(str(e))
+            continue
+        results[tuple(zones)] = f"### {', '.join(zones)}\n{text}"
+        if on_partial:
+            on_partial(len(results), len(groups), list(results.values()))
+    
+    if not results:
+        return None, f"LLM分析エラー: {failures[0] if failures else 'ゾーンがありません'}"
+    
+    partials = [results[tuple(zones)] for zones in groups if tuple(zones) in results]
+    if failures:
+        partials.append(f"（{len(failures)}グループは分析に失敗したため含まれていません）")
+    
+    # リデュース: ライン全体レポートをストリーミングで作成
+    report = await stream_completion(session, build_reduce_prompt(llm_json, partials),
+                                     LLM_MAX_TOKENS, on_reduce_delta)
+    return report, None
+
+
+def run_map_reduce(client, llm_json, on_partial=None, on_reduce_delta=None,
+                   concurrency=LLM_MAP_CONCURRENCY, group_size=LLM_ZONE_GROUP_SIZE):
+    """同期コードからマップ・リデュース分析を実行（イベントループごとに非同期セッションを作成）"""
+    async def run():
+        async with as_resilient(client).async_session() as session:
+            return await analyze_zones_async(session, llm_json, on_partial, on_reduce_delta,
+                                             concurrency, group_size)
+    
+    try:
+        return asyncio.run(run())
+    except Exception as e:
+        return None, f"LLM分析エラー: {str(e)}"
@@ -0,0 +1,135 @@
+"""
+LLM向けペイロード生成モジュール
+解析結果からLLMに渡す構造化JSONを生成する（Streamlit・OpenAIに依存しない）
+"""
+
+import numpy as np
+import pandas as pd
+from constants import ANOMALY_LIMIT
+from data_processing import get_status
+from zone_store import ZoneStore, order_zones
+
+
+def anomaly_records(zone_store, limit=ANOMALY_LIMIT):
+    """ゾーン別の異常値レコード（各ゾーン先頭limit件）を全ゾーン一括で作成"""
+    iqr_flags = zone_store.flag(None, "iqr_flag")
+    zscore_flags = zone_store.flag(None, "zscore_flag")
+    hampel_flags = zone_store.flag(None, "hampel_flag")
+    idx = np.flatnonzero(iqr_flags | zscore_flags | hampel_flags)
+    
+    # ゾーンは連続区間なので、区間先頭からの順位で各ゾーン先頭limit件を選ぶ
+    zone_pos = np.searchsorted(zone_store.offsets, idx, side="right") - 1
+    _, first, inverse = np.unique(zone_pos, return_index=True, return_inverse=True)
+    keep = np.arange(len(idx)) - first[inverse] < limit
+    idx, zone_pos = idx[keep], zone_pos[keep]
+    
+    timestamps = zone_store.timestamps()
+    if timestamps is not None:
+        labels = pd.DatetimeIndex(timestamps[idx]).astype(str)
+    else:
+        labels = zone_store.rows()[idx].astype(str)
+    records = zip(
+        labels.tolist(),
+        np.round(zone_store.values()[idx].astype("float64"), 3).tolist(),
+        iqr_flags[idx].tolist(),
+        zscore_flags[idx].tolist(),
+        hampel_flags[idx].tolist()
+    )
+    
+    anomalies = {zone: [] for zone in zone_store.zones}
+    for pos, (timestamp, value, iqr_flag, zscore_flag, hampel_flag) in zip(zone_pos.tolist(), records):
+        anomalies[zone_store.zones[pos]].append({
+            "timestamp": timestamp,
+            "value": value,
+            "iqr_flag": iqr_flag,
+            "zscore_flag": zscore_flag,
+            "hampel_flag": hampel_flag
+        })
+    return anomalies
+
+
+def generate_llm_json(df, stats_dict, threshold_good, threshold_ok, zone_store=None):
+    """LLM向けの構造化JSONを生成"""
+    if zone_store is None:
+        zone_store = ZoneStore.from_frame(df)
+    
+    zones = order_zones(stats_dict)
+    output = {
+        "summary": {
+            "overall_comment": f"製造ラインの{len(zones)}ゾーンのサイクルタイムデータを解析しました。"
+        },
+        "zones": {}
+    }
+    
+    # 異常値リスト（全ゾーン一括で作成）
+    anomalies_by_zone = anomaly_records(zone_store)
+    
+    for zone in zones:
+        zone_stats = stats_dict[zone]
+        anomalies = anomalies_by_zone.get(zone, [])
+        
+        status = get_status(zone_stats["achieve_rate"], threshold_good, threshold_ok)
+        
+        # 評価と推奨
+        evaluation = f"達成率{zone_stats['achieve_rate']}%（ステータス: {status}）"
+        recommendations = []
+        
+        if zone_stats["achieve_rate"] < threshold_ok:
+            recommendations.append({
+                "text": f"平均サイクルタイム{zone_stats['mean']}秒がターゲット{zone_stats['target']}秒を大きく上回っています",
+                "priority": "High",
+                "reason": f"達成率が{zone_stats['achieve_rate']}%と低い"
+            })
+        
+        if zone_stats["std"] > 1.0:
+            recommendations.append({
+                "text": "ばらつきが大きいため、工程の安定化が必要です",
+                "priority": "Medium",
+                "reason": f"標準偏差が{zone_stats['std']}秒"
+            })
+        
+        output["zones"][zone] = {
+            "stats": {
+                "target": zone_stats["target"],
+                "mean": zone_stats["mean"],
+                "min": zone_stats["min"],
+                "max": zone_stats["max"],
+                "achieve_rate": zone_stats["achieve_rate"],
+                "status": status
+            },
+            "histogram": {
+                "x_min": zone_stats["min"],
+                "x_max": zone_stats["max"],
+                "bins": 30
+            },
+            "timeseries": {
+                "point_count": zone_stats["count"],
+                "notes": "時系列データあり"
+            },
+            "anomalies": anomalies,
+            "evaluation": {
+                "short": evaluation
+            },
+            "recommendations": recommendations
+        }
+    
+    output["requested_additional_data"] = ["作業者情報", "設備保全履歴", "材料ロット情報"]
+    
+    return output
+
+
+def rule_based_report(llm_json, reason):
+    """LLMを利用できない場合の代替レポート（generate_llm_jsonのルールベース推奨事項から作成）"""
+    lines = [f"⚠️ AI分析を利用できないため、ルールベースの評価と推奨事項を表示します（{reason}）", ""]
+    for zone, zone_json in llm_json.get("zones", {}).items():
+        lines.append(f"### {zone}")
+        lines.append(f"- 評価: {zone_json.get('evaluation', {}).get('short', '-')}")
+        anomalies = zone_json.get("anomalies", [])
+        if anomalies:
+            lines.append(f"- 異常値: {len(anomalies)}件（最大 {max(a['value'] for a in anomalies)}秒）")
+        for rec in zone_json.get("recommendations", []):
+            lines.append(f"- **[{rec['priority']}]** {rec['text']}（{rec['reason']}）")
+        if not zone_json.get("recommendations"):
+            lines.append("- 推奨事項はありません")
+        lines.append("")
+    return "\n".join(lines).rstrip()
@@ -0,0 +1,270 @@
+"""
+LLMプロンプトモジュール
+分析依頼プロンプトの組み立てを担当（Streamlit・OpenAIに依存しない）
+
+LLM向けJSONはインデント付きJSONではなく「|」区切りの表形式で埋め込み、
+トークン数が予算を超える場合は異常値リストの要約、優先度の低いゾーンの集約の順に縮める。
+"""
+
+import json
+from constants import (
+    LLM_MODEL, LLM_PROMPT_TOKEN_BUDGET, LLM_MAP_REDUCE_MIN_ZONES, LLM_ZONE_GROUP_SIZE
+)
+
+
+SYSTEM_PROMPT = "あなたは製造ラインの生産性改善を専門とする熟練のデータアナリストです。"
+
+PROMPT_TEMPLATE = """
+あなたは製造ラインの生産性改善を専門とする熟練のデータアナリストです。
+以下は、製造ラインの各ゾーンのサイクルタイムデータの統計分析結果です。
+表は「|」区切りで、各表の見出し行に列名を示しています。
+
+**データ概要:**
+{data}
+
+**分析依頼:**
+1. 各ゾーンの現状を評価してください（達成率、ばらつき、異常値の観点から）
+2. 問題点を優先度順に指摘してください
+3. 具体的な改善提案を3-5個提示してください（数値的根拠を含めて）
+4. 追加で収集すべきデータがあれば提案してください
+
+**回答形式:**
+- 親しみやすく、わかりやすい日本語で回答してください
+- 重要な数値は必ず含めてください
+- 箇条書きや見出しを使って読みやすくしてください
+"""
+
+
+# ========== トークン計測 ==========
+
+_encoder = None
+
+
+def _get_encoder():
+    """tiktokenのエンコーダ（未インストール・取得失敗時はFalse）"""
+    global _encoder
+    if _encoder is None:
+        try:
+            import tiktoken
+            try:
+                _encoder = tiktoken.encoding_for_model(LLM_MODEL)
+            except KeyError:
+                _encoder = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoder = False
+    return _encoder
+
+
+def tokens_estimated():
+    """トークン数が概算か（tiktokenを使えない環境）"""
+    return not _get_encoder()
+
+
+def count_tokens(text):
+    """トークン数（tiktokenが無い場合は概算: 非ASCII文字は1文字1トークン、ASCIIは4文字1トークン）"""
+    encoder = _get_encoder()
+    if encoder:
+        return len(encoder.encode(text))
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return non_ascii + (len(text) - non_ascii + 3) // 4
+
+
+# ========== 表形式エンコード ==========
+
+def _row(*values):
+    return "|".join("" if v is None else str(v) for v in values)
+
+
+def _zone_priority(zone_json):
+    """ゾーンの重要度（推奨事項が多く、達成率が低いほど重要）"""
+    stats = zone_json.get("stats", {})
+    return (len(zone_json.get("recommendations", [])), -stats.get("achieve_rate", 0))
+
+
+def encode_compact(llm_json, summarize_anomalies=False, collapsed_zones=()):
+    """LLM向けJSONを表形式のテキストに変換
+
+    summarize_anomalies=Trueでは異常値をゾーンごとの件数・範囲に要約し、
+    collapsed_zonesのゾーンは個別の行を出さずに1行の集計へまとめる。
+    """
+    zones = llm_json.get("zones", {})
+    detailed = [zone for zone in zones if zone not in collapsed_zones]
+    lines = []
+    
+    comment = llm_json.get("summary", {}).get("overall_comment")
+    if comment:
+        lines.append(comment)
+    
+    lines.append("## ゾーン統計")
+    if detailed:
+        lines.append(_row("zone", "target", "mean", "min", "max", "achieve_rate(%)", "status", "points"))
+    for zone in detailed:
+        stats = zones[zone].get("stats", {})
+        lines.append(_row(zone, stats.get("target"), stats.get("mean"), stats.get("min"),
+                          stats.get("max"), stats.get("achieve_rate"), stats.get("status"),
+                          zones[zone].get("timeseries", {}).get("point_count")))
+    
+    collapsed = [zone for zone in zones if zone in collapsed_zones]
+    if collapsed:
+        rates = [zones[zone].get("stats", {}).get("achieve_rate", 0) for zone in collapsed]
+        means = [zones[zone].get("stats", {}).get("mean", 0) for zone in collapsed]
+        lines.append(f"（他{len(collapsed)}ゾーンは優先度が低いため集約: 達成率{min(rates)}〜{max(rates)}%、"
+                     f"平均{min(means)}〜{max(means)}秒）")
+    
+    anomaly_zones = [zone for zone in detailed if zones[zone].get("anomalies")]
+    if anomaly_zones:
+        if summarize_anomalies:
+            lines.append("## 異常値（要約）")
+            lines.append(_row("zone", "count", "min_value", "max_value", "first", "last"))
+            for zone in anomaly_zones:
+                anomalies = zones[zone]["anomalies"]
+                values = [a["value"] for a in anomalies]
+                lines.append(_row(zone, len(anomalies), min(values), max(values),
+                                  anomalies[0]["timestamp"], anomalies[-1]["timestamp"]))
+        else:
+            lines.append("## 異常値（iqr/zscore: ゾーン全体基準、hampel: 前後サイクルの移動窓基準、1=検出）")
+            lines.append(_row("zone", "timestamp", "value", "iqr", "zscore", "hampel"))
+            for zone in anomaly_zones:
+                for a in zones[zone]["anomalies"]:
+                    lines.append(_row(zone, a["timestamp"], a["value"],
+                                      int(a.get("iqr_flag", False)), int(a.get("zscore_flag", False)),
+                                      int(a.get("hampel_flag", False))))
+    
+    recommendation_zones = [zone for zone in detailed if zones[zone].get("recommendations")]
+    if recommendation_zones:
+        lines.append("## 推奨事項")
+        lines.append(_row("zone", "priority", "text", "reason"))
+        for zone in recommendation_zones:
+            for rec in zones[zone]["recommendations"]:
+                lines.append(_row(zone, rec.get("priority"), rec.get("text"), rec.get("reason")))
+    
+    requested = llm_json.get("requested_additional_data")
+    if requested:
+        lines.append(f"## 追加で収集したいデータ: {', '.join(requested)}")
+    
+    return "\n".join(lines)
+
+
+def build_compact_prompt(llm_json, template=PROMPT_TEMPLATE, token_budget=LLM_PROMPT_TOKEN_BUDGET, **fields):
+    """トークン予算内に収まるよう段階的に縮めたプロンプトを作成
+
+    戻り値: (プロンプト, 計測結果)。計測結果にはインデント付きJSONで埋め込んだ場合との差
+    （saved_tokens）と、異常値の要約・集約したゾーン数、トークン数が概算か（estimated）を含む。
+    """
+    baseline_tokens = count_tokens(template.format(data=json.dumps(llm_json, ensure_ascii=False, indent=2), **fields))
+    
+    # 優先度の低いゾーン（推奨事項なし・達成率が高い）から集約する
+    zones = sorted(llm_json.get("zones", {}), key=lambda z: _zone_priority(llm_json["zones"][z]))
+    step = max(1, len(zones) // 10)
+    summarize, n_collapsed = False, 0
+    while True:
+        prompt = template.format(data=encode_compact(llm_json, summarize, set(zones[:n_collapsed])), **fields)
+        tokens = count_tokens(prompt)
+        if tokens <= token_budget or n_collapsed >= len(zones):
+            break
+        if not summarize:
+            summarize = True
+        else:
+            n_collapsed = min(len(zones), n_collapsed + step)
+    
+    return prompt, {
+        "tokens": tokens,
+        "baseline_tokens": baseline_tokens,
+        "saved_tokens": baseline_tokens - tokens,
+        "token_budget": token_budget,
+        "anomalies_summarized": summarize,
+        "zones_collapsed": n_collapsed,
+        "estimated": tokens_estimated(),
+    }
+
+
+def build_prompt(llm_json, token_budget=LLM_PROMPT_TOKEN_BUDGET):
+    """LLM向けJSONを表形式で埋め込んだ分析依頼プロンプトを作成"""
+    return build_compact_prompt(llm_json, PROMPT_TEMPLATE, token_budget)[0]
+
+
+# ========== マップ・リデュース（多ゾーン向け） ==========
+
+MAP_PROMPT_TEMPLATE = """
+以下は、製造ラインの一部のゾーン（{zones}）のサイクルタイム統計分析結果です。
+表は「|」区切りで、各表の見出し行に列名を示しています。
+
+**データ概要:**
+{data}
+
+**分析依頼:**
+ゾーンごとに、達成率・ばらつき・異常値の観点から現状と問題点を簡潔に評価し、
+数値的根拠を含む改善案を1-2個挙げてください。見出しにはゾーン名を使ってください。
+"""
+
+REDUCE_PROMPT_TEMPLATE = """
+以下は、製造ライン全{zone_count}ゾーンをグループに分けて分析した結果です。
+
+**全体概要:**
+{summary}
+
+**ゾーン別分析:**
+{partials}
+
+**分析依頼:**
+1. ライン全体の現状を評価してください
+2. 問題のあるゾーンを優先度順に指摘してください
+3. ライン全体としての具体的な改善提案を3-5個提示してください（数値的根拠を含めて）
+4. 追加で収集すべきデータがあれば提案してください
+
+**回答形式:**
+- 親しみやすく、わかりやすい日本語で回答してください
+- 重要な数値は必ず含めてください
+- 箇条書きや見出しを使って読みやすくしてください
+"""
+
+
+def zone_groups(llm_json, group_size=LLM_ZONE_GROUP_SIZE):
+    """ゾーンをgroup_size件ずつのグループに分割"""
+    zones = list(llm_json["zones"])
+    return [zones[i:i + group_size] for i in range(0, len(zones), group_size)]
+
+
+def build_map_prompt(llm_json, zones, token_budget=LLM_PROMPT_TOKEN_BUDGET):
+    """指定ゾーンだけを含むゾーン別分析プロンプトを作成"""
+    return _build_map_prompt(llm_json, zones, token_budget)[0]
+
+
+def _build_map_prompt(llm_json, zones, token_budget):
+    subset = {"zones": {zone: llm_json["zones"][zone] for zone in zones}}
+    return build_compact_prompt(subset, MAP_PROMPT_TEMPLATE, token_budget, zones=", ".join(zones))
+
+
+def build_reduce_prompt(llm_json, partials):
+    """ゾーン別分析結果を統合するライン全体レポートのプロンプトを作成"""
+    summary = {key: value for key, value in llm_json.items() if key != "zones"}
+    return REDUCE_PROMPT_TEMPLATE.format(
+        zone_count=len(llm_json["zones"]),
+        summary=json.dumps(summary, ensure_ascii=False, indent=2),
+        partials="\n\n".join(partials)
+    )
+
+
+# ========== 計測 ==========
+
+def prompt_report(llm_json, token_budget=LLM_PROMPT_TOKEN_BUDGET):
+    """分析時に送るプロンプトの計測結果（build_compact_promptと同じ項目）
+
+    ゾーン数がLLM_MAP_REDUCE_MIN_ZONES以上の場合はゾーングループごとのマップ・プロンプトの合計で、
+    件数（map_prompts）と最大のプロンプトのトークン数（max_tokens）を加える
+    （リデュースのプロンプトはマップの応答を含むため事前には数えない）。
+    """
+    if len(llm_json.get("zones", {})) < LLM_MAP_REDUCE_MIN_ZONES:
+        return build_compact_prompt(llm_json, token_budget=token_budget)[1]
+    reports = [_build_map_prompt(llm_json, zones, token_budget)[1] for zones in zone_groups(llm_json)]
+    return {
+        "tokens": sum(r["tokens"] for r in reports),
+        "baseline_tokens": sum(r["baseline_tokens"] for r in reports),
+        "saved_tokens": sum(r["saved_tokens"] for r in reports),
+        "token_budget": token_budget,
+        "anomalies_summarized": any(r["anomalies_summarized"] for r in reports),
+        "zones_collapsed": sum(r["zones_collapsed"] for r in reports),
+        "estimated": tokens_estimated(),
+        "map_prompts": len(reports),
+        "max_tokens": max(r["tokens"] for r in reports),
+    }
@@ -2,6 +2,7 @@
 製造ラインデータ可視化・解析システム - メインアプリケーション
 """
 
+from functools import partial
 import streamlit as st
 import json
 from datetime import datetime
@@ -9,18 +10,26 @@ from pathlib import Path
 
 # モジュールインポート
 from constants import (
-    DEFAULT_CSV_PATH, ZONES, DEFAULT_TARGET,
+    DATA_SOURCE, ZONES, DEFAULT_TARGET,
     DEFAULT_THRESHOLD_GOOD, DEFAULT_THRESHOLD_OK,
-    DEFAULT_BINS, DEFAULT_SHOW_MA, DEFAULT_MA_WINDOW,
+    DEFAULT_BINS, DEFAULT_SHOW_MA, DEFAULT_MA_WINDOW, LIVE_REFRESH_SECONDS,
+    INSTRUMENTATION_ENABLED, ROLLUP_ENABLED, ROLLUP_VIEW_MIN_ROWS,
 )
-from data_processing import (
-    load_csv_data, preprocess_data, analyze_outliers, calculate_statistics
-)
-from llm_handler import init_openai_client, generate_llm_json, analyze_with_llm
+from pipeline import run_pipeline
+from live_tail import LiveAnalysisSession
+from multi_source import MultiSourceLoader, is_multi_source
+from rollup_store import RollupStore
+from zone_store import ZoneStore
+from stage_cache import StageCache
+from disk_cache import make_key
+from llm_cache import LLMResponseCache
+from instrumentation import StageTimer
+from llm_payload import generate_llm_json
+from llm_handler import init_openai_client, analyze_with_llm
 from ui_components import (
     display_preprocess_stats, display_statistics_table,
-    display_histograms, display_timeseries, display_outliers_list,
-    display_llm_analysis
+    display_histograms, display_timeseries, display_time_buckets, display_outliers_list,
+    display_llm_analysis, display_instrumentation
 )
 
 # ページ設定
@@ -36,15 +45,181 @@ st.set_page_config(
 )
 
 
+@st.cache_resource
+def get_stage_cache():
+    """ステージ出力のディスクキャッシュ（全セッションで共有）"""
+    return StageCache()
+
+
+@st.cache_resource
+def get_multi_source_loader(source):
+    """ディレクトリ・glob入力のローダー（マニフェストを保持し、変更のないファイルは読み直さない）"""
+    return MultiSourceLoader(source, stage_cache=get_stage_cache())
+
+
+@st.cache_resource
+def get_rollup_store():
+    """ゾーン×分・時の集計ロールアップ（全セッションで共有、無効時はNone）"""
+    return RollupStore() if ROLLUP_ENABLED else None
+
+
+def view_rollups(rollups, row_count):
+    """大量データのときだけグラフを集計ロールアップから作成する
+
+    集計の件数が全行数と一致しない（start_datetimeを解釈できない行がある）場合は使わない。
+    """
+    if rollups is None or row_count < ROLLUP_VIEW_MIN_ROWS:
+        return None
+    return rollups if rollups.row_count() == row_count else None
+
+
+@st.cache_resource
+def get_llm_cache():
+    """LLM応答のディスクキャッシュ（全セッションで共有）"""
+    return LLMResponseCache()
+
+
+def refresh_live_analysis(target_values, timer):
+    """ライブモード: CSVへの追記分だけを取り込んで解析結果を更新"""
+    session = st.session_state.get("live_session")
+    if session is None or session.file_path != DATA_SOURCE:
+        if session is not None:
+            session.close()
+        session = LiveAnalysisSession(DATA_SOURCE, rollup_store=get_rollup_store())
+        st.session_state.live_session = session
+    
+    with timer.stage("live_poll") as stage:
+        new_rows, error = session.poll()
+        stage.set(rows=new_rows)
+    if error:
+        st.error(f"データ読み込みエラー: {error}")
+        return
+    
+    if session.preprocess_stats["final_rows"] == 0:
+        st.session_state.analysis_done = False
+        st.info("📡 サイクルデータの追記を待っています...")
+        return
+    
+    # 統計は全履歴の逐次集計から、グラフ・異常値は直近データから作成
+    with timer.stage("live_refresh"):
+        df_clean = session.recent_frame()
+        zone_store = ZoneStore.from_frame(df_clean)
+        stats_dict = session.stats_dict(target_values)
+        llm_json = generate_llm_json(
+            df_clean, stats_dict, DEFAULT_THRESHOLD_GOOD, DEFAULT_THRESHOLD_OK, zone_store=zone_store
+        )
+    st.session_state.df_clean = df_clean
+    st.session_state.zone_store = zone_store
+    st.session_state.stats_dict = stats_dict
+    st.session_state.llm_json = llm_json
+    st.session_state.preprocess_stats = dict(session.preprocess_stats)
+    st.session_state.target_values = target_values
+    st.session_state.data_version = make_key("live", *session.data_version())
+    st.session_state.rollups = view_rollups(session.rollups(), session.preprocess_stats["final_rows"])
+    st.session_state.analysis_done = True
+
+
+def display_results(timer, live_mode=False, analyze_button=False):
+    """セッションに保存した分析結果（前処理統計・グラフ・AI分析・処理時間）を表示"""
+    if not st.session_state.analysis_done:
+        if not live_mode:
+            st.info("👈 サイドバーの「🚀 分析を実行」ボタンをクリックして分析を開始してください")
+        return
+    
+    df_clean = st.session_state.df_clean
+    zone_store = st.session_state.zone_store
+    preprocess_stats = st.session_state.preprocess_stats
+    stats_dict = st.session_state.stats_dict
+    llm_json = st.session_state.llm_json
+    target_values = st.session_state.target_values
+    data_version = st.session_state.data_version
+    rollups = st.session_state.get("rollups")
+    
+    # 前処理統計表示（処理時間はグラフ・AI分析の計測後に表示）
+    display_preprocess_stats(preprocess_stats)
+    timing_panel = st.empty()
+    
+    # ========== 4ゾーングラフエリア ==========
+    st.header("📊 4ゾーン可視化")
+    
+    viz_type = st.radio(
+        "表示タイプを選択",
+        ["統計表", "ヒストグラム", "時系列グラフ", "時間帯別", "異常値リスト"],
+        horizontal=True
+    )
+    
+    with timer.stage("chart", view=viz_type):
+        if viz_type == "統計表":
+            display_statistics_table(stats_dict, DEFAULT_THRESHOLD_GOOD, DEFAULT_THRESHOLD_OK,
+                                     target_values, data_version, rollups)
+    
+        elif viz_type == "ヒストグラム":
+            display_histograms(df_clean, target_values, DEFAULT_BINS, zone_store, data_version,
+                               rollups)
+    
+        elif viz_type == "時系列グラフ":
+            display_timeseries(df_clean, target_values, DEFAULT_SHOW_MA, DEFAULT_MA_WINDOW,
+                               zone_store, data_version, rollups)
+    
+        elif viz_type == "時間帯別":
+            display_time_buckets(df_clean, target_values, zone_store, data_version,
+                                 DEFAULT_THRESHOLD_GOOD)
+    
+        elif viz_type == "異常値リスト":
+            display_outliers_list(df_clean, data_version)
+    
+    # ========== LLM分析結果 ==========
+    if live_mode:
+        st.caption("📡 ライブモード中はAI分析を自動実行しません（ライブモードを停止して「🚀 分析を実行」）")
+    else:
+        with timer.stage("llm"):
+            # OpenAIクライアント（.env・secrets・openaiの読み込み）はAI分析を表示するときに初期化する
+            client, client_error = init_openai_client()
+            if client_error:
+                st.warning(f"⚠️ {client_error}")
+                st.info("💡 .envファイルにOPENAI_API_KEYを設定するか、Streamlit CloudのSecretsに設定してください")
+            display_llm_analysis(client, llm_json,
+                                 partial(analyze_with_llm, response_cache=get_llm_cache()),
+                                 data_version, target_values)
+    
+    # ========== 処理時間 ==========
+    if timer.enabled:
+        # 解析（パイプライン）の計測は実行時のもの、グラフ・AI分析は今回の再描画のもの
+        records = list(timer.records)
+        if not analyze_button and not live_mode:
+            records = st.session_state.get("pipeline_timings", []) + records
+        with timing_panel.container():
+            display_instrumentation(records)
+
+
+def export_timings(timer):
+    """計測記録を出力する
+
+    前回の出力から内容が変わった再実行のときだけ書き込む
+    （同じ表示の再描画・追記の無いライブ更新のたびに書き込まない）。
+    """
+    signature = timer.signature()
+    if timer.records and signature != st.session_state.get("exported_timings"):
+        timer.export()
+        st.session_state.exported_timings = signature
+
+
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def live_section(target_values, instrument):
+    """ライブモード: 追記分の取り込みと結果表示をLIVE_REFRESH_SECONDSごとに再実行する
+
+    フラグメントとして再実行するため、サイドバーを含むページ全体は再実行せず、
+    待機中もスクリプトの実行を止めない（表示タイプの切り替え等はすぐに反映される）。
+    """
+    timer = StageTimer(enabled=instrument)
+    refresh_live_analysis(target_values, timer)
+    display_results(timer, live_mode=True)
+    export_timings(timer)
+
+
 def main():
     st.title("CycleEye -製造ラインデータ可視化・解析システム-")
     
-    # OpenAIクライアント初期化
-    client, client_error = init_openai_client()
-    if client_error:
-        st.warning(f"⚠️ {client_error}")
-        st.info("💡 .envファイルにOPENAI_API_KEYを設定するか、Streamlit CloudのSecretsに設定してください")
-    
     # ========== サイドバー設定 ==========
     st.sidebar.header("⚙️ 設定")
     
@@ -59,6 +234,18 @@ def main():
     # 分析実行ボタン
     st.sidebar.markdown("---")
     analyze_button = st.sidebar.button("🚀 分析を実行", type="primary", use_container_width=True)
+    multi_source = is_multi_source(DATA_SOURCE)
+    live_mode = st.sidebar.toggle(
+        "📡 ライブモード",
+        disabled=multi_source,
+        help=f"CSVに追記されたサイクルを{LIVE_REFRESH_SECONDS}秒ごとに取り込みます"
+             + ("（複数ファイル入力では使用できません）" if multi_source else "")
+    )
+    instrument = st.sidebar.checkbox(
+        "⏱ 処理時間を計測", value=INSTRUMENTATION_ENABLED,
+        help="ステージ別の処理時間・メモリ・キャッシュ状態を表示します"
+    )
+    timer = StageTimer(enabled=instrument)
     
     # ========== セッションステートの初期化 ==========
     if 'analysis_done' not in st.session_state:
@@ -66,85 +253,53 @@ def main():
     if 'llm_response' not in st.session_state:
         st.session_state.llm_response = None
     
+    # ========== ライブモード ==========
+    if live_mode:
+        live_section(target_values, instrument)
+        return
+    if "live_session" in st.session_state:
+        # ライブモード終了時は直近データの表示と集計をリセット
+        st.session_state.live_session.close()
+        del st.session_state.live_session
+        st.session_state.analysis_done = False
+    
     # ========== 分析実行 ==========
     if analyze_button:
         st.session_state.analysis_done = False
         st.session_state.llm_response = None
         
         with st.spinner("データを前処理中..."):
-            # データ読み込み
-            df, error = load_csv_data(DEFAULT_CSV_PATH)
-            
-            if error:
-                st.error(f"データ読み込みエラー: {error}")
-                return
-            
-            if df is None:
-                st.error("CSVファイルが見つかりません")
-                return
-            
-            # 前処理
-            df_clean, preprocess_stats, preprocess_error = preprocess_data(df)
-            
-            if preprocess_error:
-                st.error(f"前処理エラー: {preprocess_error}")
-                return
-            
-            # 異常値検出
-            df_clean = analyze_outliers(df_clean)
-            
-            # 統計計算
-            stats_dict = calculate_statistics(df_clean, target_values)
-            
-            # LLM向けJSON生成
-            llm_json = generate_llm_json(
-                df_clean, stats_dict, DEFAULT_THRESHOLD_GOOD, DEFAULT_THRESHOLD_OK
+            result, error = run_pipeline(
+                DATA_SOURCE, target_values,
+                DEFAULT_THRESHOLD_GOOD, DEFAULT_THRESHOLD_OK,
+                stage_cache=get_stage_cache(), timer=timer, rollup_store=get_rollup_store(),
+                loader=get_multi_source_loader(DATA_SOURCE) if multi_source else None
             )
         
+        if error:
+            st.error(error)
+            return
+        
+        df_clean = result["df_clean"]
+        zone_store = result["zone_store"]
+        preprocess_stats = result["preprocess_stats"]
+        stats_dict = result["stats_dict"]
+        llm_json = result["llm_json"]
+        
         st.session_state.df_clean = df_clean
+        st.session_state.zone_store = zone_store
         st.session_state.preprocess_stats = preprocess_stats
         st.session_state.stats_dict = stats_dict
         st.session_state.llm_json = llm_json
         st.session_state.target_values = target_values
+        st.session_state.data_version = make_key(result["source"])
+        st.session_state.rollups = view_rollups(result["rollups"], preprocess_stats["final_rows"])
+        st.session_state.pipeline_timings = list(timer.records)
         st.session_state.analysis_done = True
     
     # ========== 分析結果表示 ==========
-    if st.session_state.analysis_done:
-        df_clean = st.session_state.df_clean
-        preprocess_stats = st.session_state.preprocess_stats
-        stats_dict = st.session_state.stats_dict
-        llm_json = st.session_state.llm_json
-        target_values = st.session_state.target_values
-        
-        # 前処理統計表示
-        display_preprocess_stats(preprocess_stats)
-        
-        # ========== 4ゾーングラフエリア ==========
-        st.header("📊 4ゾーン可視化")
-        
-        viz_type = st.radio(
-            "表示タイプを選択",
-            ["統計表", "ヒストグラム", "時系列グラフ", "異常値リスト"],
-            horizontal=True
-        )
-        
-        if viz_type == "統計表":
-            display_statistics_table(stats_dict, DEFAULT_THRESHOLD_GOOD, DEFAULT_THRESHOLD_OK)
-            
-        elif viz_type == "ヒストグラム":
-            display_histograms(df_clean, target_values, DEFAULT_BINS)
-            
-        elif viz_type == "時系列グラフ":
-            display_timeseries(df_clean, target_values, DEFAULT_SHOW_MA, DEFAULT_MA_WINDOW)
-            
-        elif viz_type == "異常値リスト":
-            display_outliers_list(df_clean)
-        
-        # ========== LLM分析結果 ==========
-        display_llm_analysis(client, llm_json, analyze_with_llm)
-        
-    else:
-        st.info("👈 サイドバーの「🚀 分析を実行」ボタンをクリックして分析を開始してください")
+    display_results(timer, analyze_button=analyze_button)
+    export_timings(timer)
 
 
 if __name__ == "__main__":
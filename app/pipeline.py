@@ -0,0 +1,216 @@
+"""
+解析パイプラインモジュール
+読み込み→前処理→異常値検出→統計→LLM向けJSON生成をStreamlitなしで実行する
+"""
+
+import os
+from constants import (
+    DEFAULT_THRESHOLD_GOOD, DEFAULT_THRESHOLD_OK, CHUNKED_THRESHOLD_BYTES, ROLLUP_VIEW_MIN_ROWS
+)
+from data_processing import (
+    ChunkedAnalysis, load_columnar_data, preprocess_data, iter_preprocessed_chunks,
+    analyze_outliers, calculate_statistics
+)
+from disk_cache import make_key
+from instrumentation import StageTimer
+from llm_payload import generate_llm_json
+from multi_source import MultiSourceLoader, is_multi_source
+from stage_cache import source_fingerprint
+from streaming import ZoneStatsAccumulator
+from zone_store import ZoneStore
+
+
+def load_and_preprocess(file_path, timer=None):
+    """データ読み込みと前処理"""
+    timer = timer or StageTimer(enabled=False)
+    # データ読み込み
+    with timer.stage("load"):
+        df, error = load_columnar_data(file_path)
+    
+    if error:
+        return None, None, f"データ読み込みエラー: {error}"
+    
+    if df is None:
+        return None, None, "CSVファイルが見つかりません"
+    
+    # 前処理
+    with timer.stage("preprocess"):
+        df_clean, preprocess_stats, preprocess_error = preprocess_data(df)
+    
+    if preprocess_error:
+        return None, preprocess_stats, f"前処理エラー: {preprocess_error}"
+    return df_clean, preprocess_stats, None
+
+
+def load_and_analyze_chunked(file_path, timer=None, rollup_store=None, rollup_version=None):
+    """大容量ファイルをチャンク単位で前処理・異常値検出・統計集計する（全行を連結しない）
+
+    rollup_storeを渡すと、取り込み済みの版数がrollup_versionと異なる場合に
+    チャンクごとに集計ロールアップへ加算する。
+    戻り値は (直近データ, 前処理統計, 全行の逐次集計器, エラー)。
+    """
+    timer = timer or StageTimer(enabled=False)
+    preprocess_stats = {
+        "original_rows": 0,
+        "removed_missing": 0,
+        "removed_invalid": 0,
+        "final_rows": 0
+    }
+    analysis = ChunkedAnalysis()
+    with timer.stage("load_analyze_chunked") as stage:
+        try:
+            chunks = analysis.consume(iter_preprocessed_chunks(file_path, preprocess_stats))
+            rollup_source = os.path.abspath(file_path)
+            if rollup_store is not None and rollup_store.version(rollup_source) != rollup_version:
+                rollup_store.ingest_chunks(rollup_source, chunks, rollup_version)
+            for _ in chunks:
+                pass
+        except ValueError as e:
+            return None, preprocess_stats, None, f"前処理エラー: {str(e)}"
+        except Exception as e:
+            return None, preprocess_stats, None, f"前処理エラー: チャンク読み込みエラー: {str(e)}"
+        df_recent = analysis.recent_frame()
+        stage.set(rows=preprocess_stats["final_rows"], window_rows=len(df_recent))
+    return df_recent, preprocess_stats, analysis.accumulator, None
+
+
+def load_multi_source(loader, manifest, timer=None):
+    """複数ファイルを並列に読み込んで前処理（変更のないファイルは再利用）"""
+    timer = timer or StageTimer(enabled=False)
+    with timer.stage("load_multi_source") as stage:
+        df_clean, preprocess_stats, error = loader.load(manifest)
+        stage.set(files=loader.last_load.get("files", 0), read=loader.last_load.get("read", 0),
+                  skipped=loader.last_load.get("skipped", 0))
+    if error:
+        return None, preprocess_stats, f"データ読み込みエラー: {error}"
+    return df_clean, preprocess_stats, None
+
+
+def run_pipeline(file_path, target_values,
+                 threshold_good=DEFAULT_THRESHOLD_GOOD, threshold_ok=DEFAULT_THRESHOLD_OK,
+                 stage_cache=None, timer=None, loader=None, rollup_store=None):
+    """1ファイル（またはディレクトリ・glob配下の全ファイル）分の解析を実行
+
+    stage_cacheを渡すと、入力ファイルが変わっていない限り
+    前処理・異常値検出・統計の出力をキャッシュから復元する。
+    timer（StageTimer）を渡すと、ステージ別の時間・メモリ・キャッシュ状態を記録する。
+    file_pathがディレクトリ・globのときはMultiSourceLoaderで統合して解析する
+    （loaderを使い回すと、変更のないファイルは読み直さない）。
+    CHUNKED_THRESHOLD_BYTESを超えるファイルはチャンク単位で解析し、"df_clean"は
+    直近CHUNKED_WINDOW_ROWS行、"stats_dict"は全行の統計になる。
+    rollup_store（RollupStore）を渡すと、入力が変わったときにゾーン×分・時の集計を更新し、
+    結果の"rollups"から問い合わせられるようにする（ROLLUP_VIEW_MIN_ROWS行以上では統計も集計から求める）。
+    start_datetimeの無い・解釈できない行があり集計が全行を表さない場合、"rollups"はNoneになる。
+    戻り値は (結果の辞書, エラー)。
+    """
+    timer = timer or StageTimer(enabled=False)
+    if loader is None and is_multi_source(file_path):
+        loader = MultiSourceLoader(file_path, stage_cache=stage_cache)
+    
+    manifest = None
+    try:
+        if loader is not None:
+            manifest = loader.scan()
+            if not manifest:
+                return None, "対象ファイルが見つかりません"
+            source = loader.fingerprint(manifest)
+        else:
+            source = source_fingerprint(file_path)
+    except OSError:
+        return None, "CSVファイルが見つかりません"
+    
+    preprocess_stats = None
+    df_clean = None
+    # 大容量の単一ファイルはチャンク単位で解析し、統計は全行の逐次集計器から求める
+    chunked = loader is None and os.path.getsize(file_path) > CHUNKED_THRESHOLD_BYTES
+    accumulator = None
+    partial = False
+    if stage_cache is not None:
+        with timer.stage("stage_cache_lookup") as stage:
+            preprocess_stats = stage_cache.get_json("preprocess", source)
+            df_clean = stage_cache.get_frame("outliers", source) if preprocess_stats else None
+            if df_clean is not None and chunked:
+                moments = stage_cache.get_json("moments", source)
+                accumulator = ZoneStatsAccumulator.from_dict(moments) if moments is not None else None
+                df_clean = df_clean if accumulator is not None else None
+            stage.set(cache="hit" if df_clean is not None else "miss")
+    
+    if df_clean is None:
+        if loader is not None:
+            df_clean, preprocess_stats, error = load_multi_source(loader, manifest, timer)
+        elif chunked:
+            # 集計ロールアップも読み込みながらチャンクごとに加算する
+            df_clean, preprocess_stats, accumulator, error = load_and_analyze_chunked(
+                file_path, timer, rollup_store, make_key(source)
+            )
+        else:
+            df_clean, preprocess_stats, error = load_and_preprocess(file_path, timer)
+        if error:
+            return None, error
+        
+        # 異常値検出（チャンク処理では読み込み時に判定済み）
+        if not chunked:
+            with timer.stage("analyze_outliers"):
+                df_clean = analyze_outliers(df_clean)
+        # 一部のファイルを読み込めなかった統合結果はキャッシュしない（次回は読み直す）
+        partial = bool(preprocess_stats.get("failed_files"))
+        if stage_cache is not None and not partial:
+            with timer.stage("stage_cache_store"):
+                stage_cache.put_json("preprocess", source, preprocess_stats)
+                stage_cache.put_frame("outliers", source, df_clean)
+                if accumulator is not None:
+                    stage_cache.put_json("moments", source, accumulator.to_dict())
+    
+    # 集計ロールアップ（入力の版数が変わったときだけ作り直す、チャンク処理では読み込み時に作成済み）
+    row_count = preprocess_stats["final_rows"]
+    rollups = None
+    if rollup_store is not None:
+        rollup_source = os.path.abspath(file_path)
+        with timer.stage("rollup_ingest") as stage:
+            if not chunked:
+                # 部分的な統合結果は別の版数にし、全ファイルを読めたときに作り直す
+                version = make_key(source, sorted(preprocess_stats["failed_files"])) if partial else make_key(source)
+                updated = rollup_store.ingest(rollup_source, df_clean, version)
+                stage.set(cache="miss" if updated else "hit")
+            rollups = rollup_store.view(rollup_source)
+            # start_datetimeが無い・解釈できない行がある場合は集計が全行を表さないため使わない
+            if rollups.row_count() != row_count:
+                rollups = None
+                stage.set(complete=False)
+    
+    # ゾーン別配列ストア（以降の統計・JSON生成・グラフで共有）
+    with timer.stage("zone_store"):
+        zone_store = ZoneStore.from_frame(df_clean)
+    
+    # 統計計算（目標値ごとにキャッシュ、大規模データは集計ロールアップから求める）
+    def compute_statistics():
+        if rollups is not None and row_count >= ROLLUP_VIEW_MIN_ROWS:
+            return calculate_statistics(df_clean, target_values, rollups=rollups)
+        if accumulator is not None:
+            return accumulator.to_stats_dict(target_values)
+        return calculate_statistics(df_clean, target_values, zone_store)
+    
+    with timer.stage("calculate_statistics") as stage:
+        if stage_cache is not None and not partial:
+            stats_dict, hit = stage_cache.get_or_compute_json(
+                "statistics", source, compute_statistics, params=target_values
+            )
+            stage.set(cache="hit" if hit else "miss")
+        else:
+            stats_dict = compute_statistics()
+    
+    # LLM向けJSON生成
+    with timer.stage("generate_llm_json"):
+        llm_json = generate_llm_json(
+            df_clean, stats_dict, threshold_good, threshold_ok, zone_store=zone_store
+        )
+    
+    return {
+        "source": source,
+        "df_clean": df_clean,
+        "zone_store": zone_store,
+        "preprocess_stats": preprocess_stats,
+        "stats_dict": stats_dict,
+        "llm_json": llm_json,
+        "rollups": rollups
+    }, None
@@ -0,0 +1,341 @@
+"""
+集計ロールアップモジュール
+ゾーン×分・時・日ごとの件数・合計・偏差平方和・最小・最大・異常値件数をSQLiteに保存し、
+統計・時系列・ヒストグラムを生データではなく集計から求める
+"""
+
+import os
+import math
+import sqlite3
+import time
+from contextlib import closing
+import numpy as np
+import pandas as pd
+from constants import (
+    ROLLUP_DB_PATH, ROLLUP_RESOLUTIONS, ROLLUP_HISTOGRAM_RESOLUTIONS, ROLLUP_HISTOGRAM_BIN_WIDTH,
+    TIMESERIES_MAX_POINTS
+)
+from streaming import RunningMoments, ZoneStatsAccumulator
+from zone_store import FLAG_COLUMNS, order_zones
+
+OUTLIER_COLUMNS = [name.replace("_flag", "_outliers") for name in FLAG_COLUMNS]
+MEASURES = ["count", "sum", "m2", "min", "max"] + OUTLIER_COLUMNS
+
+# 表の構成の版数（変えたときは既存ファイルの集計を作り直す）
+SCHEMA_VERSION = 2
+
+# 期間での絞り込みが索引の範囲検索になるよう、bucketをzoneより前に置く
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS sources (
+    source TEXT PRIMARY KEY,
+    version TEXT,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS rollups (
+    source TEXT, resolution INTEGER, bucket INTEGER, zone TEXT,
+    count INTEGER, sum REAL, m2 REAL, min REAL, max REAL,
+    {", ".join(f"{col} INTEGER" for col in OUTLIER_COLUMNS)},
+    PRIMARY KEY (source, resolution, bucket, zone)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS histogram_rollups (
+    source TEXT, resolution INTEGER, bucket INTEGER, zone TEXT, bin INTEGER, count INTEGER,
+    PRIMARY KEY (source, resolution, bucket, zone, bin)
+) WITHOUT ROWID;
+"""
+
+
+def _epoch_seconds(timestamps):
+    """datetime64配列をUNIX秒（整数）に変換"""
+    return np.asarray(timestamps, dtype="datetime64[ns]").view("int64") // 10**9
+
+
+def aggregate_frame(df, resolution, bin_width=None):
+    """DataFrameをゾーン×時間区間（×ビン）で集計（start_datetimeの無い行は除く）"""
+    timestamps = df["start_datetime"].to_numpy(dtype="datetime64[ns]")
+    valid = ~np.isnat(timestamps)
+    values = df["adjusted_time_seconds"].to_numpy(dtype="float64")[valid]
+    frame = pd.DataFrame({
+        "bucket": _epoch_seconds(timestamps[valid]) // resolution,
+        "zone": df["zone_name"].astype("object").to_numpy()[valid],
+    })
+    if bin_width is not None:
+        frame["bin"] = np.floor(values / bin_width).astype("int64")
+        return frame.groupby(["bucket", "zone", "bin"], sort=False).size().rename("count").reset_index()
+
+    frame["value"] = values
+    for name, col in zip(FLAG_COLUMNS, OUTLIER_COLUMNS):
+        frame[col] = df[name].to_numpy(dtype="int64")[valid] if name in df.columns else 0
+    aggregated = frame.groupby(["bucket", "zone"], sort=False).agg(
+        count=("value", "size"), sum=("value", "sum"), var=("value", "var"),
+        min=("value", "min"), max=("value", "max"),
+        **{col: (col, "sum") for col in OUTLIER_COLUMNS}
+    )
+    # 二乗和ではなく区間平均からの偏差平方和を持つ（平均が大きく分散が小さい値でも桁落ちしない）
+    aggregated["m2"] = (aggregated.pop("var") * (aggregated["count"] - 1)).fillna(0.0)
+    return aggregated.reset_index()
+
+
+def cover_range(start, stop, resolutions):
+    """[start, stop) 秒を、できるだけ粗い集計単位の区間の組み合わせで過不足なく覆う
+
+    中央は日単位、端は時・分単位になるため、問い合わせる行数は期間の長さにほぼ依存しない。
+    戻り値は (集計単位, 先頭区間番号, 末尾区間番号) のリスト。
+    """
+    ranges = []
+
+    def cover(start, stop, level):
+        if start >= stop:
+            return
+        resolution = resolutions[level]
+        if level == 0:
+            ranges.append((resolution, start // resolution, (stop - 1) // resolution))
+            return
+        lo = -(-start // resolution) * resolution
+        hi = stop // resolution * resolution
+        if lo >= hi:
+            cover(start, stop, level - 1)
+            return
+        ranges.append((resolution, lo // resolution, hi // resolution - 1))
+        cover(start, lo, level - 1)
+        cover(hi, stop, level - 1)
+
+    cover(start, stop, len(resolutions) - 1)
+    return ranges
+
+
+def _rows(frame, columns, *prefix):
+    """SQLiteへ渡す行（NumPyの数値型をPythonの型に変換）"""
+    return (prefix + row for row in zip(*(frame[col].tolist() for col in columns)))
+
+
+class RollupStore:
+    """ゾーン×分・時・日の集計を保持するSQLiteファイル
+
+    取り込み（ingest・append）は集計済みの行だけを書き込むため、
+    表示時の問い合わせ量は生データの行数ではなく表示する期間の区切り方で決まる。
+    ファイルは全セッション・プロセスで共有できる（WALモード）。
+    """
+
+    def __init__(self, path=ROLLUP_DB_PATH, resolutions=ROLLUP_RESOLUTIONS,
+                 histogram_resolutions=ROLLUP_HISTOGRAM_RESOLUTIONS, bin_width=ROLLUP_HISTOGRAM_BIN_WIDTH):
+        self.path = path
+        self.resolutions = tuple(sorted(resolutions))
+        self.histogram_resolutions = tuple(sorted(histogram_resolutions))
+        self.bin_width = bin_width
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                conn.executescript(
+                    "DROP TABLE IF EXISTS sources; DROP TABLE IF EXISTS rollups; "
+                    "DROP TABLE IF EXISTS histogram_rollups;"
+                )
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def version(self, source):
+        """取り込み済みデータの版数（未取り込みはNone）"""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT version FROM sources WHERE source = ?", (source,)).fetchone()
+        return row[0] if row else None
+
+    def ingest(self, source, df, version):
+        """sourceの集計を作り直す（versionが取り込み済みと同じなら何もしない）
+
+        戻り値は書き込んだかどうか。start_datetimeが無いデータは集計せず、
+        以前の版数の集計が残らないよう消す。
+        """
+        if "start_datetime" not in df.columns:
+            self.clear(source)
+            return False
+        if self.version(source) == version:
+            return False
+        with closing(self._connect()) as conn, conn:
+            self._clear(conn, source)
+            self._write(conn, source, df, upsert=False)
+            conn.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?)", (source, version, time.time()))
+        return True
+
+    def ingest_chunks(self, source, chunks, version):
+        """チャンクごとに加算しながらsourceの集計を作り直す（全行を連結しない大容量データ用）
+
+        チャンクごとに書き込みを確定し、版数は全チャンクを書き終えてから記録する
+        （途中で止まった集計は次回作り直す）。chunksは最後まで読み進める。
+        """
+        self.clear(source)
+        for chunk in chunks:
+            self.append(source, chunk)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?)", (source, version, time.time()))
+
+    def append(self, source, df):
+        """追記分の集計を既存の集計に加算する（ライブ取り込み用）"""
+        if "start_datetime" not in df.columns or len(df) == 0:
+            return
+        with closing(self._connect()) as conn, conn:
+            self._write(conn, source, df, upsert=True)
+            conn.execute("INSERT OR REPLACE INTO sources VALUES (?, NULL, ?)", (source, time.time()))
+
+    def clear(self, source):
+        with closing(self._connect()) as conn, conn:
+            self._clear(conn, source)
+
+    def view(self, source):
+        return RollupView(self, source)
+
+    def _clear(self, conn, source):
+        for table in ("rollups", "histogram_rollups", "sources"):
+            conn.execute(f"DELETE FROM {table} WHERE source = ?", (source,))
+
+    def _write(self, conn, source, df, upsert):
+        conflict = ""
+        if upsert:
+            updates = ["count = count + excluded.count", "sum = sum + excluded.sum",
+                       # 偏差平方和はChan法で統合（区間平均の差 × 件数の重み）
+                       "m2 = m2 + excluded.m2 + (excluded.sum * count - sum * excluded.count)"
+                       " * (excluded.sum * count - sum * excluded.count)"
+                       " / (count * excluded.count * (count + excluded.count))",
+                       "min = min(min, excluded.min)", "max = max(max, excluded.max)"]
+            updates += [f"{col} = {col} + excluded.{col}" for col in OUTLIER_COLUMNS]
+            conflict = f" ON CONFLICT (source, resolution, bucket, zone) DO UPDATE SET {', '.join(updates)}"
+        placeholders = ", ".join("?" * (len(MEASURES) + 4))
+        for resolution in self.resolutions:
+            conn.executemany(
+                f"INSERT INTO rollups (source, resolution, bucket, zone, {', '.join(MEASURES)}) "
+                f"VALUES ({placeholders}){conflict}",
+                _rows(aggregate_frame(df, resolution), ["bucket", "zone"] + MEASURES, source, resolution)
+            )
+
+        conflict = " ON CONFLICT (source, resolution, bucket, zone, bin) " \
+                   "DO UPDATE SET count = count + excluded.count" if upsert else ""
+        for resolution in self.histogram_resolutions:
+            conn.executemany(
+                f"INSERT INTO histogram_rollups VALUES (?, ?, ?, ?, ?, ?){conflict}",
+                _rows(aggregate_frame(df, resolution, self.bin_width),
+                      ["bucket", "zone", "bin", "count"], source, resolution)
+            )
+
+
+class RollupView:
+    """1つのデータ（source）の集計への問い合わせ
+
+    time_rangeは (開始, 終了) の日時（Noneは全期間）で、統計は分単位、
+    ヒストグラムは時単位に丸めた範囲を集計する。
+    """
+
+    def __init__(self, store, source):
+        self.store = store
+        self.source = source
+
+    def _query(self, sql, params):
+        with closing(self.store._connect()) as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def _ranges(self, resolutions, time_range):
+        """期間を覆う (集計単位, 先頭, 末尾) のリスト（全期間は最も粗い単位の全区間）"""
+        if time_range is None:
+            return [(resolutions[-1], -2**62, 2**62)]
+        start, end = (int(pd.Timestamp(t).value // 10**9) for t in time_range)
+        finest = resolutions[0]
+        return cover_range(start // finest * finest, (end // finest + 1) * finest, resolutions)
+
+    def _union(self, table, columns, resolutions, time_range):
+        """期間を覆う各区間の行をUNION ALLでまとめる副問い合わせとパラメータ"""
+        ranges = self._ranges(resolutions, time_range)
+        sql = " UNION ALL ".join(
+            f"SELECT {columns} FROM {table} WHERE source = ? AND resolution = ? AND bucket BETWEEN ? AND ?"
+            for _ in ranges
+        )
+        params = [value for resolution, lo, hi in ranges for value in (self.source, resolution, lo, hi)]
+        return sql, params
+
+    def span(self):
+        """集計済みの期間 (開始, 終了) をdatetime64で返す（未取り込みはNone）"""
+        resolution = self.store.resolutions[0]
+        # min・maxを別々に問い合わせると、どちらも索引の端を読むだけで済む
+        lo, hi = (
+            self._query(f"SELECT {func}(bucket) FROM rollups WHERE source = ? AND resolution = ?",
+                        (self.source, resolution))[0][0]
+            for func in ("min", "max")
+        )
+        if lo is None:
+            return None
+        return (np.datetime64(lo * resolution, "s").astype("datetime64[ns]"),
+                np.datetime64((hi + 1) * resolution - 1, "s").astype("datetime64[ns]"))
+
+    def row_count(self):
+        """集計済みの行数（start_datetimeを解釈できた行の件数）"""
+        resolution = self.store.resolutions[-1]
+        return self._query("SELECT coalesce(sum(count), 0) FROM rollups WHERE source = ? AND resolution = ?",
+                           (self.source, resolution))[0][0]
+
+    def statistics(self, target_values, time_range=None):
+        """calculate_statisticsと同じ形式のゾーン別統計"""
+        sql, params = self._union("rollups", "zone, count, sum, m2, min, max",
+                                  self.store.resolutions, time_range)
+        # 期間を覆う区間の行（ゾーンごとに日数＋端の時・分の数）をChan法で統合する
+        accumulator = ZoneStatsAccumulator()
+        for zone, count, total, m2, min_val, max_val in self._query(sql, params):
+            moments = RunningMoments.from_dict({"count": count, "mean": total / count, "m2": m2,
+                                                "min": min_val, "max": max_val})
+            accumulator.moments.setdefault(zone, RunningMoments()).merge(moments)
+        return accumulator.to_stats_dict(target_values)
+
+    def timeseries(self, time_range=None, max_points=TIMESERIES_MAX_POINTS):
+        """ゾーン別の時系列（区間ごとの平均・最小・最大・件数）
+
+        区間幅は表示期間をmax_points個に分ける幅（集計単位の倍数）に揃えるため、
+        表示する点数は期間の長さによらずmax_points以下になる。
+        戻り値は {ゾーン: DataFrame(time, mean, min, max, count)}。
+        """
+        span = self.span() if time_range is None else tuple(pd.Timestamp(t).to_datetime64() for t in time_range)
+        if span is None:
+            return {}
+        start, end = span
+        seconds = max(int((end - start) / np.timedelta64(1, "s")), 1)
+        resolution = self.store.resolutions[0]
+        for candidate in self.store.resolutions:
+            if seconds / max_points >= candidate:
+                resolution = candidate
+        step = max(1, math.ceil(seconds / max_points / resolution))
+        lo, hi = (int(pd.Timestamp(t).value // 10**9) // resolution for t in (start, end))
+        rows = self._query(
+            "SELECT zone, bucket / ? AS b, sum(count), sum(sum), min(min), max(max) FROM rollups "
+            "WHERE source = ? AND resolution = ? AND bucket BETWEEN ? AND ? GROUP BY zone, b ORDER BY zone, b",
+            (step, self.source, resolution, lo, hi)
+        )
+        frame = pd.DataFrame(rows, columns=["zone", "b", "count", "sum", "min", "max"])
+        frame["time"] = pd.to_datetime(frame["b"] * step * resolution, unit="s")
+        frame["mean"] = frame["sum"] / frame["count"]
+        return {
+            zone: group[["time", "mean", "min", "max", "count"]].reset_index(drop=True)
+            for zone, group in frame.groupby("zone", sort=False)
+        }
+
+    def histogram(self, bins=30, time_range=None):
+        """histogram_countsと同じ (ビン境界, ゾーン別度数) を集計から作成
+
+        表示用のビンは保存した細かいビンの整数倍の幅にまとめるため、
+        ビン数はbins以下になることがある（境界のずれによる度数のばらつきを避ける）。
+        """
+        sql, params = self._union("histogram_rollups", "zone, bin, count",
+                                  self.store.histogram_resolutions, time_range)
+        rows = self._query(f"SELECT zone, bin, sum(count) FROM ({sql}) GROUP BY zone, bin", params)
+        if not rows:
+            return np.linspace(0.0, 1.0, bins + 1), {}
+        frame = pd.DataFrame(rows, columns=["zone", "bin", "count"])
+        first, last = int(frame["bin"].min()), int(frame["bin"].max())
+        per_bin = math.ceil((last - first + 1) / bins)
+        n_bins = (last - first) // per_bin + 1
+        edges = (first + np.arange(n_bins + 1) * per_bin) * self.store.bin_width
+
+        positions = (frame["bin"].to_numpy() - first) // per_bin
+        counts = {}
+        for zone in order_zones(frame["zone"].unique()):
+            mask = (frame["zone"] == zone).to_numpy()
+            counts[zone] = np.bincount(positions[mask], weights=frame["count"].to_numpy()[mask],
+                                       minlength=n_bins).astype("int64")
+        return edges, counts
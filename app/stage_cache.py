@@ -0,0 +1,75 @@
+"""
+解析ステージキャッシュモジュール
+入力ファイルの同一性とパラメータをキーに、各ステージの出力をディスクへ保存する
+"""
+
+import os
+import hashlib
+import pandas as pd
+from constants import (
+    STAGE_CACHE_DIR, STAGE_CACHE_VERSION, STAGE_CACHE_MAX_BYTES, STAGE_CACHE_CONTENT_HASH
+)
+from disk_cache import DiskCache, make_key
+
+
+def source_fingerprint(file_path, content_hash=STAGE_CACHE_CONTENT_HASH):
+    """入力ファイルの同一性（パス・サイズ・更新時刻、または内容ハッシュ）"""
+    stat = os.stat(file_path)
+    fingerprint = {
+        "path": os.path.abspath(file_path),
+        "size": stat.st_size,
+    }
+    if content_hash:
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        fingerprint["sha256"] = digest.hexdigest()
+    else:
+        fingerprint["mtime_ns"] = stat.st_mtime_ns
+    return fingerprint
+
+
+class StageCache:
+    """ステージ出力のディスクキャッシュ（DataFrameはParquet、辞書はJSON）"""
+
+    def __init__(self, directory=STAGE_CACHE_DIR, max_bytes=STAGE_CACHE_MAX_BYTES):
+        self.disk = DiskCache(directory, max_bytes)
+
+    @staticmethod
+    def key(stage, source, params=None):
+        return make_key(STAGE_CACHE_VERSION, stage, source, params)
+
+    def get_frame(self, stage, source, params=None):
+        path = self.disk.lookup(self.key(stage, source, params), ".parquet")
+        if path is None:
+            return None
+        try:
+            return pd.read_parquet(path)
+        except Exception:
+            return None
+
+    def put_frame(self, stage, source, df, params=None):
+        try:
+            self.disk.store(self.key(stage, source, params), ".parquet",
+                            lambda tmp_path: df.to_parquet(tmp_path))
+        except Exception:
+            pass  # キャッシュできなくても解析結果はそのまま使う
+
+    def get_json(self, stage, source, params=None):
+        return self.disk.read_json(self.key(stage, source, params))
+
+    def put_json(self, stage, source, data, params=None):
+        try:
+            self.disk.write_json(self.key(stage, source, params), data)
+        except (OSError, TypeError):
+            pass
+
+    def get_or_compute_json(self, stage, source, compute, params=None):
+        """キャッシュがあれば返し、無ければ計算して保存（戻り値: (結果, ヒットしたか)）"""
+        cached = self.get_json(stage, source, params)
+        if cached is not None:
+            return cached, True
+        result = compute()
+        self.put_json(stage, source, result, params)
+        return result, False
@@ -0,0 +1,80 @@
+"""
+ストリーミング表示モジュール
+LLMの応答チャンクをバッファし、一定の更新間隔・チャンク数ごとにまとめて表示する
+"""
+
+import time
+from constants import LLM_STREAM_FPS, LLM_STREAM_FLUSH_CHUNKS
+
+
+class StreamRenderer:
+    """応答チャンクをまとめて表示し、初回トークンまでの時間と生成速度を計測
+
+    placeholder は markdown(text) を持つ表示先（st.empty() など）。
+    表示の更新は最大 fps 回/秒、または max_chunks 個溜まった時点で行い、
+    確定後の全文は finish() で1回だけ組み立てる。
+    """
+
+    def __init__(self, placeholder, fps=LLM_STREAM_FPS, max_chunks=LLM_STREAM_FLUSH_CHUNKS,
+                 cursor="▌", clock=time.perf_counter):
+        self.placeholder = placeholder
+        self.interval = 1.0 / fps if fps > 0 else 0.0
+        self.max_chunks = max_chunks
+        self.cursor = cursor
+        self.clock = clock
+        self.started_at = clock()
+        self.first_chunk_at = None
+        self.finished_at = None
+        self.chunks = 0
+        self.flushes = 0
+        self._text = ""
+        self._pending = []
+        self._last_flush = self.started_at
+
+    def feed(self, content):
+        """受信したチャンクを追加（更新間隔・チャンク数に達したら表示）"""
+        if not content:
+            return
+        now = self.clock()
+        if self.first_chunk_at is None:
+            self.first_chunk_at = now
+        self.chunks += 1
+        self._pending.append(content)
+        if len(self._pending) >= self.max_chunks or now - self._last_flush >= self.interval:
+            self.flush(now)
+
+    def flush(self, now=None):
+        """溜まったチャンクを表示に反映"""
+        if self._pending:
+            self._text += "".join(self._pending)
+            self._pending = []
+        self.placeholder.markdown(self._text + self.cursor)
+        self.flushes += 1
+        self._last_flush = self.clock() if now is None else now
+
+    def finish(self):
+        """全文を確定して表示し、返す"""
+        if self._pending:
+            self._text += "".join(self._pending)
+            self._pending = []
+        self.finished_at = self.clock()
+        self.placeholder.markdown(self._text)
+        self.flushes += 1
+        return self._text
+
+    @property
+    def text(self):
+        return self._text + "".join(self._pending)
+
+    def metrics(self):
+        """計測結果（TTFT・チャンク数≒トークン数・トークン/秒・表示更新回数）"""
+        end = self.finished_at if self.finished_at is not None else self.clock()
+        ttft = None if self.first_chunk_at is None else self.first_chunk_at - self.started_at
+        generating = None if self.first_chunk_at is None else end - self.first_chunk_at
+        return {
+            "ttft_seconds": None if ttft is None else round(ttft, 3),
+            "total_seconds": round(end - self.started_at, 3),
+            "tokens": self.chunks,
+            "tokens_per_second": round(self.chunks / generating, 1) if generating else None,
+            "flushes": self.flushes,
+        }
@@ -0,0 +1,340 @@
+"""
+ストリーミング集計モジュール
+全履歴を保持せずに分位点・平均・分散を逐次更新し、異常値を判定する
+"""
+
+import json
+import math
+import numpy as np
+import pandas as pd
+from constants import DEFAULT_TARGET, TDIGEST_COMPRESSION, TDIGEST_BUFFER_SIZE
+from zone_store import order_zones
+
+
+class TDigest:
+    """マージ可能な分位点スケッチ（merging t-digest）
+
+    値はバッファに追記し、一定件数たまったらまとめて重心へ圧縮する。
+    1件あたりの更新コストは償却でほぼ定数、重心数はcompressionで上限が決まる。
+    分位点は値が追加されるまでキャッシュし、未圧縮の値がある場合だけ圧縮して求め直す。
+    """
+
+    def __init__(self, compression=TDIGEST_COMPRESSION, buffer_size=TDIGEST_BUFFER_SIZE):
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._means = np.empty(0)
+        self._weights = np.empty(0)
+        self._buffer = []
+        self._buffered = 0
+        self._quantiles = {}
+
+    def update(self, values):
+        """値をまとめて追加"""
+        values = np.asarray(values, dtype="float64").ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._buffer.append(values)
+        self._buffered += len(values)
+        self._quantiles.clear()
+        if self._buffered >= self.buffer_size:
+            self._compress()
+
+    def merge(self, other):
+        """他のスケッチを取り込む（並列ワーカーの結果統合用）"""
+        other._compress()
+        self._compress()
+        self._merge_centroids(
+            np.concatenate([self._means, other._means]),
+            np.concatenate([self._weights, other._weights])
+        )
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._quantiles.clear()
+        return self
+
+    def quantile(self, q):
+        """分位点を推定（pandasのlinear補間に合わせた位置で補間）"""
+        if q not in self._quantiles:
+            self._quantiles[q] = self._estimate(q)
+        return self._quantiles[q]
+
+    def _estimate(self, q):
+        self._compress()
+        if self.count == 0:
+            return math.nan
+        if len(self._means) == 1:
+            return float(self._means[0])
+        centers = np.cumsum(self._weights) - self._weights / 2
+        rank = q * (self.count - 1) + 0.5
+        xp = np.concatenate([[0.0], centers, [float(self.count)]])
+        fp = np.concatenate([[self.min], self._means, [self.max]])
+        return float(np.interp(rank, xp, fp))
+
+    def _compress(self):
+        """バッファの値を重心にまとめる"""
+        if self._buffered == 0:
+            return
+        buffered = np.concatenate(self._buffer)
+        self._buffer = []
+        self._buffered = 0
+        self._merge_centroids(
+            np.concatenate([self._means, buffered]),
+            np.concatenate([self._weights, np.ones(len(buffered))])
+        )
+
+    def _merge_centroids(self, means, weights):
+        """スケール関数k1の単位幅ごとに重心をまとめる（ベクトル化）"""
+        if len(means) == 0:
+            return
+        order = np.argsort(means, kind="mergesort")
+        means = means[order]
+        weights = weights[order]
+
+        total = weights.sum()
+        q_mid = (np.cumsum(weights) - weights / 2) / total
+        k = self.compression / (2 * math.pi) * np.arcsin(2 * q_mid - 1)
+        bucket = np.floor(k - k[0]).astype("int64")
+        starts = np.flatnonzero(np.diff(bucket, prepend=bucket[0] - 1))
+
+        merged_weights = np.add.reduceat(weights, starts)
+        self._means = np.add.reduceat(means * weights, starts) / merged_weights
+        self._weights = merged_weights
+
+
+class RunningMoments:
+    """件数・平均・分散・最小・最大の逐次計算（Welford法、並列統合はChan法）"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, values):
+        """値をまとめて追加"""
+        values = np.asarray(values, dtype="float64").ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        batch_mean = float(values.mean())
+        batch_m2 = float(((values - batch_mean) ** 2).sum())
+        self._combine(len(values), batch_mean, batch_m2,
+                      float(values.min()), float(values.max()))
+
+    def merge(self, other):
+        """他の集計結果を取り込む"""
+        if other.count:
+            self._combine(other.count, other.mean, other.m2, other.min, other.max)
+        return self
+
+    def to_dict(self):
+        return {"count": self.count, "mean": self.mean, "m2": self.m2,
+                "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        moments = cls()
+        moments.count = int(data["count"])
+        moments.mean = float(data["mean"])
+        moments.m2 = float(data["m2"])
+        moments.min = float(data["min"])
+        moments.max = float(data["max"])
+        return moments
+
+    @property
+    def variance(self):
+        """不偏分散（pandasのstdと同じddof=1）"""
+        return self.m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance) if self.count > 1 else math.nan
+
+    def _combine(self, count, mean, m2, min_val, max_val):
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.min = min(self.min, min_val)
+        self.max = max(self.max, max_val)
+
+
+class ZoneStatsAccumulator:
+    """ゾーン別統計の逐次集計
+
+    バッチを追加するたびにO(バッチ件数)で更新し、calculate_statisticsと
+    同じ形式のstats_dictを返す。日次の結果をmergeして週次にまとめられる。
+    """
+
+    def __init__(self):
+        self.moments = {}
+
+    def update(self, df):
+        """バッチを取り込む（ゾーン別の件数・平均・分散をgroupbyの1パスで集計）"""
+        values = df["adjusted_time_seconds"].astype("float64")
+        summary = values.groupby(df["zone_name"], observed=True).agg(
+            ["count", "mean", "var", "min", "max"]
+        )
+        for zone, row in summary.iterrows():
+            count = int(row["count"])
+            if count == 0:
+                continue
+            m2 = row["var"] * (count - 1) if count > 1 else 0.0
+            self._moments_for(zone)._combine(
+                count, float(row["mean"]), float(m2), float(row["min"]), float(row["max"])
+            )
+        return self
+
+    def update_zone(self, zone, values):
+        """1ゾーン分の値を取り込む"""
+        self._moments_for(zone).update(values)
+        return self
+
+    def merge(self, other):
+        """他の集計結果（別の日・別ワーカー）を統合"""
+        for zone, moments in other.moments.items():
+            self._moments_for(zone).merge(moments)
+        return self
+
+    def zones(self):
+        """集計済みゾーン（ZONES定義順、未定義のゾーンは名前順で後ろ）"""
+        return order_zones(self.moments)
+
+    def to_stats_dict(self, target_values):
+        """calculate_statisticsと同じ形式のゾーン別統計を返す"""
+        stats_dict = {}
+        for zone in self.zones():
+            moments = self.moments[zone]
+            if moments.count == 0:
+                continue
+            
+            target = target_values.get(zone, DEFAULT_TARGET)
+            achieve_rate = (target / moments.mean * 100) if moments.mean > 0 else 0
+            
+            stats_dict[zone] = {
+                "target": round(target, 1),
+                "mean": round(moments.mean, 1),
+                "min": round(moments.min, 1),
+                "max": round(moments.max, 1),
+                "std": round(moments.std, 1),
+                "achieve_rate": round(achieve_rate, 1),
+                "count": moments.count
+            }
+        return stats_dict
+
+    def to_dict(self):
+        """JSONへ保存できる辞書に変換"""
+        return {str(zone): moments.to_dict() for zone, moments in self.moments.items()}
+
+    @classmethod
+    def from_dict(cls, data):
+        accumulator = cls()
+        accumulator.moments = {
+            zone: RunningMoments.from_dict(values) for zone, values in data.items()
+        }
+        return accumulator
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    def _moments_for(self, zone):
+        zone = str(zone)
+        if zone not in self.moments:
+            self.moments[zone] = RunningMoments()
+        return self.moments[zone]
+
+
+class StreamingOutlierDetector:
+    """ゾーン別のt-digestと逐次モーメントによる異常値検出
+
+    analyze_outliersと同じIQR法・Z-score法の判定を、
+    全履歴を並べ直さずに新しいバッチへ適用する。
+    しきい値は次のupdate・mergeまでキャッシュする。
+    """
+
+    def __init__(self, compression=TDIGEST_COMPRESSION):
+        self.compression = compression
+        self.digests = {}
+        self.moments = {}
+        self._bounds = None
+
+    def update(self, df):
+        """バッチを取り込み、そのバッチに異常値フラグを付けて返す"""
+        values = df["adjusted_time_seconds"].astype("float64")
+        for zone, zone_values in values.groupby(df["zone_name"], observed=True, sort=False):
+            if zone not in self.digests:
+                self.digests[zone] = TDigest(self.compression)
+                self.moments[zone] = RunningMoments()
+            self.digests[zone].update(zone_values.to_numpy())
+            self.moments[zone].update(zone_values.to_numpy())
+        self._bounds = None
+        return self.flag(df)
+
+    def merge(self, other):
+        """他のワーカーの検出器を統合"""
+        for zone, digest in other.digests.items():
+            if zone in self.digests:
+                self.digests[zone].merge(digest)
+                self.moments[zone].merge(other.moments[zone])
+            else:
+                self.digests[zone] = TDigest(self.compression).merge(digest)
+                self.moments[zone] = RunningMoments().merge(other.moments[zone])
+        self._bounds = None
+        return self
+
+    def bounds(self):
+        """ゾーン別の判定しきい値をDataFrameで返す"""
+        if self._bounds is None:
+            self._bounds = self._compute_bounds()
+        return self._bounds
+
+    def _compute_bounds(self):
+        rows = {}
+        for zone, digest in self.digests.items():
+            q1 = digest.quantile(0.25)
+            q3 = digest.quantile(0.75)
+            iqr = q3 - q1
+            moments = self.moments[zone]
+            rows[zone] = {
+                "q1": q1,
+                "q3": q3,
+                "lower": q1 - 1.5 * iqr,
+                "upper": q3 + 1.5 * iqr,
+                "mean": moments.mean,
+                "std": moments.std,
+                "count": moments.count
+            }
+        return pd.DataFrame.from_dict(
+            rows, orient="index",
+            columns=["q1", "q3", "lower", "upper", "mean", "std", "count"]
+        )
+
+    def flag(self, df):
+        """現在のしきい値でDataFrameに異常値フラグを付ける（状態は更新しない）"""
+        bounds = self.bounds().reindex(df["zone_name"].astype("object"))
+        values = df["adjusted_time_seconds"].to_numpy(dtype="float64")
+        lower = bounds["lower"].to_numpy()
+        upper = bounds["upper"].to_numpy()
+        mean = bounds["mean"].to_numpy()
+        std = bounds["std"].to_numpy()
+
+        iqr_flag = (values < lower) | (values > upper)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            zscore_flag = (std != 0) & (np.abs(values - mean) / std > 3)
+        return df.assign(iqr_flag=iqr_flag, zscore_flag=zscore_flag)
@@ -0,0 +1,152 @@
+"""
+時間帯別集計モジュール
+start_datetimeを時刻・シフト・日などの区間に割り当て、ゾーン×区間の統計をNumPyの1パス集計で求める
+"""
+
+import numpy as np
+import pandas as pd
+from constants import DEFAULT_TARGET, SHIFT_CALENDAR, TIME_BUCKETS
+from zone_store import FLAG_COLUMNS
+
+NS_PER_MINUTE = 60 * 10**9
+NS_PER_DAY = 24 * 60 * NS_PER_MINUTE
+
+
+def parse_shift_calendar(calendar=SHIFT_CALENDAR):
+    """シフト表（「名前=HH:MM」のカンマ区切り、または(名前, "HH:MM")のリスト）を開始時刻順に並べる
+
+    戻り値は (シフト名のリスト, 開始時刻（0時からの分）の配列)。
+    """
+    if isinstance(calendar, str):
+        calendar = [item.split("=", 1) for item in calendar.split(",") if item.strip()]
+    shifts = []
+    for name, start in calendar:
+        hour, _, minute = str(start).strip().partition(":")
+        minutes = int(hour) * 60 + int(minute or 0)
+        if not 0 <= minutes < 24 * 60:
+            raise ValueError(f"シフト開始時刻が不正です: {name}={start}")
+        shifts.append((minutes, str(name).strip()))
+    if not shifts:
+        raise ValueError("シフト表が空です")
+    shifts.sort()
+    return [name for _, name in shifts], np.array([minutes for minutes, _ in shifts], dtype="int64")
+
+
+def _dense_codes(keys, valid):
+    """整数キーを出現するものだけの連番に詰める（戻り値: (連番、無効は-1), 出現したキー）"""
+    codes = np.full(len(keys), -1, dtype="int64")
+    if not valid.any():
+        return codes, np.array([], dtype="int64")
+    keys = keys[valid]
+    lo = keys.min()
+    span = int(keys.max() - lo) + 1
+    if span > 4 * len(keys) + 1024:
+        # キーがまばらな場合のみソートで詰める
+        present, inverse = np.unique(keys, return_inverse=True)
+        codes[valid] = inverse
+        return codes, present
+    # 通常は範囲内の出現表（O(件数+範囲)）で詰める
+    seen = np.bincount(keys - lo, minlength=span) > 0
+    codes[valid] = (np.cumsum(seen) - 1)[keys - lo]
+    return codes, np.flatnonzero(seen) + lo
+
+
+def bucket_codes(timestamps, by="hour", shifts=SHIFT_CALENDAR):
+    """各時刻の区間番号とラベルを返す（NaTは-1）
+
+    by: "hour"（時刻）・"shift"（シフト）・"day"（日）・"day_shift"（日×シフト）
+    またはpandasの期間文字列（"30min"・"4h"など、0時起点の固定幅）。
+    夜勤など日付をまたぐシフトは開始した日に含める。
+    """
+    timestamps = np.asarray(timestamps, dtype="datetime64[ns]")
+    valid = ~np.isnat(timestamps)
+    ns = timestamps.view("int64")
+    day = ns // NS_PER_DAY
+    minute_of_day = (ns % NS_PER_DAY) // NS_PER_MINUTE
+
+    if by == "hour":
+        codes = np.where(valid, minute_of_day // 60, -1)
+        return codes, [f"{hour:02d}:00" for hour in range(24)]
+
+    if by in ("shift", "day_shift"):
+        names, starts = parse_shift_calendar(shifts)
+        shift = np.searchsorted(starts, minute_of_day, side="right") - 1
+        # 最初のシフト開始より前は前日の最後のシフト
+        overnight = shift < 0
+        shift[overnight] = len(names) - 1
+        if by == "shift":
+            return np.where(valid, shift, -1), names
+        codes, present = _dense_codes((day - overnight) * len(names) + shift, valid)
+        labels = [
+            f"{np.datetime64(int(key // len(names)), 'D')} {names[key % len(names)]}"
+            for key in present
+        ]
+        return codes, labels
+
+    if by == "day":
+        codes, present = _dense_codes(day, valid)
+        return codes, [str(np.datetime64(int(key), "D")) for key in present]
+
+    try:
+        width = pd.to_timedelta(by).value
+    except ValueError:
+        raise ValueError(f"未対応の集計区間です: {by}（{', '.join(TIME_BUCKETS)} または 30min などの期間）")
+    if width <= 0:
+        raise ValueError(f"集計区間の幅が不正です: {by}")
+    codes, present = _dense_codes(ns // width, valid)
+    return codes, [str(pd.Timestamp(int(key) * width)) for key in present]
+
+
+def bucket_statistics(zone_store, target_values, by="hour", shifts=SHIFT_CALENDAR):
+    """ゾーン×区間ごとの件数・平均・標準偏差・達成率・異常値件数
+
+    ゾーン番号と区間番号を1つの整数キーにまとめ、np.bincountで全区間を同時に集計する
+    （区間数に比例するPythonループは持たない）。
+    戻り値はゾーン・区間の順に並んだDataFrame（件数0の組み合わせは含めない）。
+    start_datetimeが無いデータではNoneを返す。
+    """
+    timestamps = zone_store.timestamps()
+    if timestamps is None:
+        return None
+
+    codes, labels = bucket_codes(timestamps, by, shifts)
+    n_zones, n_buckets = len(zone_store.zones), len(labels)
+    zone_index = np.repeat(np.arange(n_zones, dtype="int64"), np.diff(zone_store.offsets))
+    valid = codes >= 0
+    keys = zone_index[valid] * n_buckets + codes[valid]
+    values = zone_store.values()[valid]
+    size = n_zones * n_buckets
+
+    count = np.bincount(keys, minlength=size)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.bincount(keys, weights=values, minlength=size) / count
+        # 平均からの偏差で二乗和を取り、大きな値でも桁落ちしないようにする
+        m2 = np.bincount(keys, weights=(values - mean[keys]) ** 2, minlength=size)
+        std = np.sqrt(m2 / (count - 1))
+    std[count < 2] = np.nan
+
+    targets = np.array([target_values.get(zone, DEFAULT_TARGET) for zone in zone_store.zones],
+                       dtype="float64")
+    target = np.repeat(targets, n_buckets)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        achieve_rate = np.where(mean > 0, target / mean * 100, 0.0)
+
+    outliers = {}
+    any_flag = np.zeros(int(valid.sum()), dtype="bool")
+    for name in FLAG_COLUMNS:
+        flag = zone_store.flag(None, name)[valid]
+        any_flag |= flag
+        outliers[name] = np.bincount(keys[flag], minlength=size)
+
+    result = pd.DataFrame({
+        "zone": np.repeat(np.array(zone_store.zones, dtype=object), n_buckets),
+        "bucket": np.tile(np.array(labels, dtype=object), n_zones),
+        "count": count,
+        "mean": np.round(mean, 2),
+        "std": np.round(std, 2),
+        "achieve_rate": np.round(achieve_rate, 1),
+        "outliers": np.bincount(keys[any_flag], minlength=size),
+        **{name.replace("_flag", "_outliers"): counts for name, counts in outliers.items()},
+    })
+    result["bucket"] = pd.Categorical(result["bucket"], categories=labels, ordered=True)
+    return result[result["count"] > 0].reset_index(drop=True)
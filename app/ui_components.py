@@ -4,11 +4,23 @@ Streamlitのウィジェットと画面表示を担当
 """
 
 import os
+from datetime import timedelta
+import numpy as np
 import streamlit as st
 import pandas as pd
-from constants import ICON_PATH
-from data_processing import get_status
-from visualizations import plot_histograms, plot_timeseries
+from constants import (
+    ICON_PATH, VIEW_CACHE_MAX_ENTRIES, TIME_BUCKETS, DEFAULT_TIME_BUCKET, DEFAULT_THRESHOLD_GOOD,
+    LLM_PROMPT_TOKEN_BUDGET
+)
+from data_processing import calculate_statistics, get_status
+from instrumentation import NULL_STAGE, current_stage
+from llm_prompts import prompt_report
+from time_buckets import bucket_statistics
+from visualizations import (
+    plot_histograms, plot_timeseries, plot_timeseries_rollups, timeseries_span,
+    plot_bucket_heatmap, HEATMAP_METRICS
+)
+from zone_store import ZoneStore
 
 
 def display_preprocess_stats(preprocess_stats):
@@ -19,71 +31,220 @@ def display_preprocess_stats(preprocess_stats):
         col2.metric("欠損値除外", preprocess_stats["removed_missing"])
         col3.metric("無効値除外", preprocess_stats["removed_invalid"])
         col4.metric("処理後行数", preprocess_stats["final_rows"])
+        if "files" in preprocess_stats:
+            st.caption(f"📁 {preprocess_stats['files']}ファイルを統合")
+    failed_files = preprocess_stats.get("failed_files")
+    if failed_files:
+        st.warning(f"⚠️ {len(failed_files)}ファイルを読み込めなかったため除外しました\n\n" +
+                   "\n".join(f"- {os.path.basename(path)}: {error}" for path, error in failed_files.items()))
 
 
-def display_statistics_table(stats_dict, threshold_good, threshold_ok):
-    """統計表を表示"""
+# ========== 表示用キャッシュ ==========
+# 図・表は (表示タイプ, データ版数, 表示設定) をキーに全セッションで共有する。
+# データ本体は版数で識別するため、builder はハッシュ対象外（引数名の先頭 _）。
+
+@st.cache_resource(max_entries=VIEW_CACHE_MAX_ENTRIES, show_spinner=False)
+def _cached_view(view, data_version, params, _build):
+    return _build()
+
+
+def cached_view(view, data_version, params, build, record=True):
+    """表示用の図・表を作成（data_versionがNoneの場合はキャッシュしない）
+
+    record=Falseでは実行中のステージにキャッシュ状態を記録しない
+    （AI分析ステージのキャッシュ状態は応答キャッシュのものを記録するため）。
+    """
+    stage = current_stage() if record else NULL_STAGE
+    if data_version is None:
+        return build()
+    
+    def build_on_miss():
+        stage.set(cache="miss")
+        return build()
+    
+    stage.set(cache="hit")
+    return _cached_view(view, data_version, params, build_on_miss)
+
+
+def build_statistics_table(stats_dict, threshold_good, threshold_ok):
+    """統計表の表示用DataFrameを作成"""
     stats_df = pd.DataFrame(stats_dict).T
     stats_df["status"] = stats_df["achieve_rate"].apply(
         lambda x: get_status(x, threshold_good, threshold_ok)
     )
     stats_df = stats_df[["target", "mean", "min", "max", "achieve_rate", "status", "count"]]
     stats_df.columns = ["目標", "平均", "最小", "最大", "達成率(%)", "ステータス", "データ数"]
-    
+    return stats_df
+
+
+def display_instrumentation(records):
+    """ステージ別の処理時間・メモリ・キャッシュ状態を表示"""
+    if not records:
+        return
+    with st.expander("⏱ 処理時間（ステージ別）", expanded=False):
+        timing_df = pd.DataFrame(records)
+        columns = [c for c in ["stage", "view", "seconds", "cache", "rss_delta_mb", "rss_mb",
+                               "ttft_seconds", "tokens_per_second", "error"] if c in timing_df.columns]
+        timing_df = timing_df[columns].rename(columns={
+            "stage": "ステージ", "view": "表示", "seconds": "時間(秒)", "cache": "キャッシュ",
+            "rss_delta_mb": "メモリ増減(MB)", "rss_mb": "常駐メモリ(MB)",
+            "ttft_seconds": "初回トークン(秒)", "tokens_per_second": "トークン/秒", "error": "エラー"
+        })
+        st.dataframe(timing_df, use_container_width=True, hide_index=True)
+        st.caption(f"合計 {sum(r['seconds'] for r in records):.3f}秒")
+
+
+def display_statistics_table(stats_dict, threshold_good, threshold_ok, target_values=None,
+                             data_version=None, rollups=None):
+    """統計表を表示（rollupsがあれば表示範囲を選べ、範囲内の統計を集計ロールアップから求める）"""
+    time_range = select_time_range(rollups.span()) if rollups is not None else None
+    if time_range is not None:
+        stats_dict = calculate_statistics(None, target_values or {}, rollups=rollups, time_range=time_range)
+    stats_df = cached_view(
+        "statistics", data_version, (target_values, threshold_good, threshold_ok, time_range),
+        lambda: build_statistics_table(stats_dict, threshold_good, threshold_ok)
+    )
     st.dataframe(stats_df, use_container_width=True)
 
 
-def display_histograms(df_clean, target_values, bins):
-    """ヒストグラムを表示"""
-    fig = plot_histograms(df_clean, target_values, bins=bins)
+def display_histograms(df_clean, target_values, bins, zone_store=None, data_version=None,
+                       rollups=None):
+    """ヒストグラムを表示（rollupsがあれば集計ロールアップから作成）"""
+    fig = cached_view(
+        "histogram", data_version, (target_values, bins, rollups is not None),
+        lambda: plot_histograms(df_clean, target_values, bins=bins, zone_store=zone_store,
+                                rollups=rollups)
+    )
     st.plotly_chart(fig, use_container_width=True)
 
 
-def display_timeseries(df_clean, target_values, show_ma, ma_window):
-    """時系列グラフを表示"""
-    fig = plot_timeseries(df_clean, target_values, show_ma=show_ma, ma_window=ma_window)
+def select_time_range(span):
+    """時系列グラフの表示範囲スライダー（spanは全体範囲、全範囲選択時はNone）"""
+    if span is None or span[0] == span[1]:
+        return None
+    
+    lo, hi = span
+    if isinstance(lo, np.datetime64):
+        lo, hi = pd.Timestamp(lo).to_pydatetime(), pd.Timestamp(hi).to_pydatetime()
+        selected = st.slider("🔍 表示範囲（狭めると詳細を表示）", min_value=lo, max_value=hi,
+                             value=(lo, hi), step=timedelta(seconds=1), format="MM/DD HH:mm:ss")
+    else:
+        lo, hi = int(lo), int(hi)
+        selected = st.slider("🔍 表示範囲（狭めると詳細を表示）", min_value=lo, max_value=hi,
+                             value=(lo, hi))
+    
+    if selected == (lo, hi):
+        return None
+    return selected
+
+
+def display_timeseries(df_clean, target_values, show_ma, ma_window, zone_store=None,
+                       data_version=None, rollups=None):
+    """時系列グラフを表示（表示範囲に応じて間引き描画、rollupsがあれば集計から作成）"""
+    if rollups is not None:
+        time_range = select_time_range(rollups.span())
+        fig = cached_view(
+            "timeseries_rollups", data_version, (target_values, time_range),
+            lambda: plot_timeseries_rollups(rollups, target_values, time_range=time_range)
+        )
+        st.plotly_chart(fig, use_container_width=True)
+        return
+    
+    if zone_store is None:
+        zone_store = ZoneStore.from_frame(df_clean)
+    
+    time_range = select_time_range(timeseries_span(zone_store))
+    fig = cached_view(
+        "timeseries", data_version, (target_values, show_ma, ma_window, time_range),
+        lambda: plot_timeseries(df_clean, target_values, show_ma=show_ma, ma_window=ma_window,
+                                zone_store=zone_store, time_range=time_range)
+    )
     st.plotly_chart(fig, use_container_width=True)
 
 
-def display_outliers_list(df_clean):
-    """異常値リストを表示"""
-    st.subheader("🚨 検出された異常値")
+def display_time_buckets(df_clean, target_values, zone_store=None, data_version=None,
+                         threshold_good=DEFAULT_THRESHOLD_GOOD):
+    """時間帯別（時刻・シフト・日）の統計をヒートマップで表示"""
+    if zone_store is None:
+        zone_store = ZoneStore.from_frame(df_clean)
+    if zone_store.timestamps() is None:
+        st.info("start_datetime列が無いため時間帯別の集計はできません")
+        return
     
-    # 信頼度別に分類
+    col1, col2 = st.columns(2)
+    bucket_labels = {label: key for key, label in TIME_BUCKETS.items()}
+    metric_labels = {label: key for key, label in HEATMAP_METRICS.items()}
+    by = bucket_labels[col1.selectbox("集計区間", list(bucket_labels),
+                                      index=list(TIME_BUCKETS).index(DEFAULT_TIME_BUCKET))]
+    metric = metric_labels[col2.selectbox("表示する指標", list(metric_labels))]
+    
+    bucket_stats = cached_view("time_bucket_stats", data_version, (target_values, by),
+                               lambda: bucket_statistics(zone_store, target_values, by))
+    fig = cached_view(
+        "time_bucket_heatmap", data_version, (target_values, by, metric, threshold_good),
+        lambda: plot_bucket_heatmap(bucket_stats, metric, threshold_good)
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    with st.expander("📋 区間別統計", expanded=False):
+        st.dataframe(bucket_stats, use_container_width=True, hide_index=True)
+
+
+def classify_outliers(df_clean):
+    """異常値を信頼度別に分類（高信頼: IQRとZ-score両方、低信頼: 片方のみ、局所: Hampel法）"""
     high_conf = df_clean[df_clean["iqr_flag"] & df_clean["zscore_flag"]]
     low_conf = df_clean[(df_clean["iqr_flag"] | df_clean["zscore_flag"]) & 
                        ~(df_clean["iqr_flag"] & df_clean["zscore_flag"])]
+    local = df_clean[df_clean["hampel_flag"]] if "hampel_flag" in df_clean.columns else df_clean.iloc[:0]
+    return high_conf, low_conf, local
+
+
+def display_outliers_list(df_clean, data_version=None):
+    """異常値リストを表示"""
+    st.subheader("🚨 検出された異常値")
     
-    col1, col2 = st.columns(2)
+    # 信頼度別に分類
+    high_conf, low_conf, local = cached_view("outliers", data_version, (),
+                                             lambda: classify_outliers(df_clean))
+    
+    col1, col2, col3 = st.columns(3)
     with col1:
         st.metric("高信頼異常値", len(high_conf))
     with col2:
         st.metric("低信頼異常値", len(low_conf))
+    with col3:
+        st.metric("局所異常値", len(local), help="前後のサイクルの移動中央値から外れた値（Hampel法）")
     
     # タブで分類表示
-    tab1, tab2 = st.tabs(["高信頼異常値", "低信頼異常値"])
+    tab1, tab2, tab3 = st.tabs(["高信頼異常値", "低信頼異常値", "局所異常値"])
+    display_cols = [col for col in ["zone_name", "start_datetime", "adjusted_time_seconds",
+                                    "iqr_flag", "zscore_flag", "hampel_flag", "is_outlier"]
+                    if col in df_clean.columns]
     
     with tab1:
         if len(high_conf) > 0:
-            display_cols = ["zone_name", "adjusted_time_seconds", "iqr_flag", "zscore_flag"]
-            if "is_outlier" in high_conf.columns:
-                display_cols.append("is_outlier")
             st.dataframe(high_conf[display_cols].head(50).reset_index(drop=True), use_container_width=True, hide_index=True)
         else:
             st.info("高信頼異常値は検出されませんでした")
     
     with tab2:
         if len(low_conf) > 0:
-            display_cols = ["zone_name", "adjusted_time_seconds", "iqr_flag", "zscore_flag"]
-            if "is_outlier" in low_conf.columns:
-                display_cols.append("is_outlier")
-            st.dataframe(high_conf[display_cols].head(50).reset_index(drop=True), use_container_width=True, hide_index=True)
+            st.dataframe(low_conf[display_cols].head(50).reset_index(drop=True), use_container_width=True, hide_index=True)
         else:
             st.info("低信頼異常値は検出されませんでした")
+    
+    with tab3:
+        if len(local) > 0:
+            st.dataframe(local[display_cols].head(50).reset_index(drop=True), use_container_width=True, hide_index=True)
+        else:
+            st.info("局所異常値は検出されませんでした")
+
 
+# AI分析ステージの計測記録（処理時間パネル・Prometheus/NDJSON出力）に含める項目
+LLM_STAGE_FIELDS = ("cache", "ttft_seconds", "total_seconds", "tokens", "tokens_per_second", "fallback")
 
-def display_llm_analysis(client, llm_json, analyze_with_llm_func):
-    """LLM分析結果を表示"""
+
+def display_llm_analysis(client, llm_json, analyze_with_llm_func, data_version=None, target_values=None):
+    """LLM分析結果を表示（プロンプトの計測はdata_version・target_valuesごとにキャッシュ）"""
     st.header("🤖 AI分析結果")
     
     # LLM分析実行
@@ -99,15 +260,19 @@ def display_llm_analysis(client, llm_json, analyze_with_llm_func):
             # 全角2文字分の余白を追加
             st.markdown('<div style="padding-left: 2em;">', unsafe_allow_html=True)
             stream_placeholder = st.empty()
+            stream_metrics = {}
             with st.spinner("AIが分析中..."):
                 llm_response, llm_error = analyze_with_llm_func(
-                    client, llm_json, stream_placeholder
+                    client, llm_json, stream_placeholder, stream_metrics=stream_metrics
                 )
                 
+                current_stage().set(**{key: stream_metrics[key] for key in LLM_STAGE_FIELDS
+                                       if key in stream_metrics})
                 if llm_error:
                     st.error(llm_error)
                 else:
                     st.session_state.llm_response = llm_response
+                    st.session_state.llm_stream_metrics = stream_metrics
             st.markdown('</div>', unsafe_allow_html=True)
     
     elif st.session_state.llm_response:
@@ -124,4 +289,41 @@ def display_llm_analysis(client, llm_json, analyze_with_llm_func):
                        unsafe_allow_html=True)
     
     elif not client:
-        st.warning("⚠️ OpenAI APIキーが設定されていないため、AI分析を実行できません")
\ No newline at end of file
+        st.warning("⚠️ OpenAI APIキーが設定されていないため、AI分析を実行できません")
+    
+    if st.session_state.llm_response:
+        display_prompt_report(llm_json, st.session_state.get("llm_stream_metrics"), data_version, target_values)
+
+
+def display_prompt_report(llm_json, stream_metrics=None, data_version=None, target_values=None):
+    """プロンプトのトークン数（表形式化・縮約による削減量）と応答のストリーミング計測を表示
+
+    多ゾーン（マップ・リデュース分析）ではゾーングループごとのプロンプトの合計を表示する。
+    """
+    report = cached_view("prompt_report", data_version, (target_values, LLM_PROMPT_TOKEN_BUDGET),
+                         lambda: prompt_report(llm_json), record=False)
+    approx = "約" if report["estimated"] else ""
+    notes = [f"JSON埋め込み比 {approx}{report['saved_tokens']:,}トークン削減"]
+    if "map_prompts" in report:
+        head = f"マップ・プロンプト {report['map_prompts']}件 計{approx}{report['tokens']:,}トークン"
+        notes.insert(0, f"1件あたり最大{approx}{report['max_tokens']:,}トークン")
+    else:
+        head = f"プロンプト {approx}{report['tokens']:,}トークン"
+    if report["anomalies_summarized"]:
+        notes.append("異常値を要約")
+    if report["zones_collapsed"]:
+        notes.append(f"{report['zones_collapsed']}ゾーンを集約")
+    if report["estimated"]:
+        notes.append("tiktoken未導入のため概算")
+    caption = f"📝 {head}（{'、'.join(notes)}）"
+    if stream_metrics and stream_metrics.get("fallback"):
+        caption += " ／ ⚠️ AI分析の代わりにルールベースの推奨事項を表示"
+    elif stream_metrics and stream_metrics.get("ttft_seconds") is not None:
+        caption += (
+            f" ／ ⏱ 初回トークン {stream_metrics['ttft_seconds']:.2f}秒・"
+            f"{stream_metrics['tokens_per_second'] or 0:.1f}トークン/秒"
+            f"（表示更新 {stream_metrics['flushes']}回）"
+        )
+    elif stream_metrics and stream_metrics.get("cache") == "hit":
+        caption += " ／ 💾 キャッシュ済みの応答を表示"
+    st.caption(caption)
\ No newline at end of file
@@ -1,25 +1,66 @@
 """
 グラフ描画モジュール
-ヒストグラム、時系列グラフの描画を担当
+ヒストグラム、時系列グラフ、時間帯別ヒートマップの描画を担当
 """
 
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 from constants import (
     ZONES, DEFAULT_TARGET, CHART_HEIGHT, Y_AXIS_RANGE,
-    TARGET_LINE_COLOR, TARGET_LINE_WIDTH
+    TARGET_LINE_COLOR, TARGET_LINE_WIDTH, TIMESERIES_MAX_POINTS, DOWNSAMPLE_METHOD,
+    DEFAULT_THRESHOLD_GOOD
 )
+from downsampling import downsample_indices
+from zone_store import ZoneStore, order_zones
 
 
-def plot_histograms(df, target_values, bins=30):
-    """4ゾーンのヒストグラムを描画（目標線付き）"""
+def histogram_counts(zone_store, bins=30):
+    """全ゾーン共通のビン境界とゾーン別度数をNumPyで計算"""
+    all_values = zone_store.values()
+    if len(all_values) == 0:
+        return np.linspace(0.0, 1.0, bins + 1), {}
+    lo, hi = float(all_values.min()), float(all_values.max())
+    if lo == hi:
+        # 全て同じ値の場合はnp.histogramと同様に±0.5へ広げる（幅0のビンを作らない）
+        lo, hi = lo - 0.5, hi + 0.5
+    edges = np.linspace(lo, hi, bins + 1)
+    counts = {
+        zone: np.histogram(zone_store.values(zone), bins=edges)[0]
+        for zone in zone_store.zones
+    }
+    return edges, counts
+
+
+def plot_histograms(df, target_values, bins=30, zone_store=None, rollups=None):
+    """4ゾーンのヒストグラムを描画（目標線付き）
+
+    度数はサーバー側で集計して棒グラフとして描画するため、
+    ブラウザへ送るデータ量は行数ではなくビン数で決まる。
+    rollups（RollupView）を渡すと集計ロールアップの度数から描画する。
+    """
+    if rollups is not None:
+        edges, counts = rollups.histogram(bins)
+        return plot_histogram_counts(edges, counts, target_values)
+    
+    if zone_store is None:
+        zone_store = ZoneStore.from_frame(df)
+    
+    edges, counts = histogram_counts(zone_store, bins)
+    return plot_histogram_counts(edges, counts, target_values)
+
+
+def plot_histogram_counts(edges, counts, target_values):
+    """集計済みの度数（ゾーン別）からヒストグラムを描画"""
     # 全体の範囲計算（10%マージン）
-    overall_min = df["adjusted_time_seconds"].min()
-    overall_max = df["adjusted_time_seconds"].max()
+    overall_min = edges[0]
+    overall_max = edges[-1]
     margin = (overall_max - overall_min) * 0.1
     x_range = [overall_min - margin, overall_max + margin]
+    centers = (edges[:-1] + edges[1:]) / 2
+    widths = np.diff(edges)
     
+    from plotly.subplots import make_subplots  # 起動時の読み込みを避けるため描画時に読み込む
     fig = make_subplots(rows=2, cols=2, 
                         subplot_titles=ZONES,
                         vertical_spacing=0.20,  # 上下の間隔を広く
@@ -29,13 +70,13 @@ def plot_histograms(df, target_values, bins=30):
     
     for idx, zone in enumerate(ZONES):
         row, col = positions[idx]
-        zone_data = df[df["zone_name"] == zone]["adjusted_time_seconds"]
+        zone_counts = counts.get(zone, np.zeros(len(centers), dtype="int64"))
         target = target_values.get(zone, DEFAULT_TARGET)
         
-        # ヒストグラム
+        # ヒストグラム（集計済みの度数を棒で表示）
         fig.add_trace(
-            go.Histogram(x=zone_data, nbinsx=bins, name=zone,
-                        marker_color='steelblue'),
+            go.Bar(x=centers, y=zone_counts, width=widths, name=zone,
+                   marker_color='steelblue'),
             row=row, col=col
         )
         
@@ -61,8 +102,51 @@ def plot_histograms(df, target_values, bins=30):
     return fig
 
 
-def plot_timeseries(df, target_values, show_ma=False, ma_window=5):
-    """4ゾーンの時系列グラフを描画（縦軸4~12秒統一 + 目標線）"""
+def timeseries_span(zone_store):
+    """時系列グラフのX軸全体範囲（時刻が無い場合は行ラベル）"""
+    spans = []
+    for zone in zone_store.zones:
+        x_data = zone_store.timestamps(zone)
+        if x_data is None:
+            x_data = zone_store.rows(zone)
+        if len(x_data) > 0:
+            spans.append((x_data.min(), x_data.max()))
+    if not spans:
+        return None
+    return min(lo for lo, _ in spans), max(hi for _, hi in spans)
+
+
+def _visible_mask(x_data, time_range):
+    """表示範囲内の点のマスク（範囲指定なしはNone）"""
+    if time_range is None:
+        return None
+    start, end = time_range
+    if np.issubdtype(x_data.dtype, np.datetime64):
+        start, end = pd.Timestamp(start).to_datetime64(), pd.Timestamp(end).to_datetime64()
+    return (x_data >= start) & (x_data <= end)
+
+
+def _downsampled(x_data, y_data, max_points, method):
+    """描画点数上限までLTTB/最小最大で間引いた (x, y)"""
+    keep = ~np.isnan(y_data)
+    x_data, y_data = x_data[keep], y_data[keep]
+    x_numeric = x_data.astype("int64") if np.issubdtype(x_data.dtype, np.datetime64) else x_data
+    idx = downsample_indices(x_numeric, y_data, max_points, method)
+    return x_data[idx], y_data[idx]
+
+
+def plot_timeseries(df, target_values, show_ma=False, ma_window=5, zone_store=None,
+                    time_range=None, max_points=TIMESERIES_MAX_POINTS, method=DOWNSAMPLE_METHOD):
+    """4ゾーンの時系列グラフを描画（縦軸4~12秒統一 + 目標線）
+
+    点数が max_points を超えるゾーンは表示範囲（time_range）内で間引いて
+    WebGL（Scattergl）で描画する。範囲を狭めるほど細部が表示される。
+    移動平均は間引く前の全データで計算する。
+    """
+    if zone_store is None:
+        zone_store = ZoneStore.from_frame(df)
+    
+    from plotly.subplots import make_subplots
     fig = make_subplots(rows=2, cols=2, 
                         subplot_titles=ZONES,
                         vertical_spacing=0.20,  # 上下の間隔を広く
@@ -72,25 +156,33 @@ def plot_timeseries(df, target_values, show_ma=False, ma_window=5):
     
     for idx, zone in enumerate(ZONES):
         row, col = positions[idx]
-        zone_df = df[df["zone_name"] == zone].sort_index()
         target = target_values.get(zone, DEFAULT_TARGET)
         
-        # X軸: timestampがあればそれを、なければindex
-        if "start_datetime" in zone_df.columns:
-            try:
-                x_data = pd.to_datetime(zone_df["start_datetime"])
-            except:
-                x_data = zone_df.index
-        else:
-            x_data = zone_df.index
+        # X軸: timestampがあればそれを、なければindex（ストア作成時に時刻は解析済み）
+        x_data = zone_store.timestamps(zone)
+        if x_data is None:
+            x_data = zone_store.rows(zone)
         
-        y_data = zone_df["adjusted_time_seconds"]
+        y_data = np.asarray(zone_store.values(zone), dtype="float64")
+        
+        # 移動平均（間引き・範囲絞り込みの前に全データで計算）
+        ma = None
+        if show_ma and len(y_data) >= ma_window:
+            ma = pd.Series(y_data).rolling(window=ma_window, center=True).mean().to_numpy()
+        
+        # 表示範囲で絞り込み
+        mask = _visible_mask(x_data, time_range)
+        if mask is not None:
+            x_data, y_data = x_data[mask], y_data[mask]
+            if ma is not None:
+                ma = ma[mask]
         
         # データプロット
+        x_plot, y_plot = _downsampled(x_data, y_data, max_points, method)
         fig.add_trace(
-            go.Scatter(x=x_data, y=y_data, mode='lines+markers',
-                      name=zone, line=dict(color='steelblue', width=1),
-                      marker=dict(size=3)),
+            go.Scattergl(x=x_plot, y=y_plot, mode='lines+markers',
+                         name=zone, line=dict(color='steelblue', width=1),
+                         marker=dict(size=3)),
             row=row, col=col
         )
         
@@ -106,12 +198,12 @@ def plot_timeseries(df, target_values, show_ma=False, ma_window=5):
         )
         
         # 移動平均
-        if show_ma and len(y_data) >= ma_window:
-            ma = y_data.rolling(window=ma_window, center=True).mean()
+        if ma is not None:
+            x_ma, y_ma = _downsampled(x_data, ma, max_points, method)
             fig.add_trace(
-                go.Scatter(x=x_data, y=ma, mode='lines',
-                          name=f'{zone}_MA{ma_window}',
-                          line=dict(color='orange', width=2, dash='dash')),
+                go.Scattergl(x=x_ma, y=y_ma, mode='lines',
+                             name=f'{zone}_MA{ma_window}',
+                             line=dict(color='orange', width=2, dash='dash')),
                 row=row, col=col
             )
         
@@ -123,4 +215,109 @@ def plot_timeseries(df, target_values, show_ma=False, ma_window=5):
         showlegend=False,
         title_text="時系列グラフ"
     )
-    return fig
\ No newline at end of file
+    return fig
+
+
+
+def plot_timeseries_rollups(rollups, target_values, time_range=None, max_points=TIMESERIES_MAX_POINTS):
+    """集計ロールアップから4ゾーンの時系列グラフを描画（区間平均の線＋最小〜最大の帯）
+
+    区間幅は表示期間に応じて分・時の集計から選ぶため、
+    描画点数は蓄積した期間の長さによらずmax_points以下になる。
+    """
+    series = rollups.timeseries(time_range, max_points)
+    
+    from plotly.subplots import make_subplots
+    fig = make_subplots(rows=2, cols=2, 
+                        subplot_titles=ZONES,
+                        vertical_spacing=0.20,  # 上下の間隔を広く
+                        horizontal_spacing=0.1)
+    
+    positions = [(1,1), (1,2), (2,1), (2,2)]
+    
+    for idx, zone in enumerate(ZONES):
+        row, col = positions[idx]
+        target = target_values.get(zone, DEFAULT_TARGET)
+        data = series.get(zone)
+        
+        if data is not None:
+            # 区間の最小〜最大の帯
+            fig.add_trace(
+                go.Scatter(x=data["time"], y=data["max"], mode='lines',
+                           line=dict(width=0), hoverinfo='skip', showlegend=False),
+                row=row, col=col
+            )
+            fig.add_trace(
+                go.Scatter(x=data["time"], y=data["min"], mode='lines', fill='tonexty',
+                           fillcolor='rgba(70, 130, 180, 0.2)', line=dict(width=0),
+                           name=f'{zone}_範囲', hoverinfo='skip'),
+                row=row, col=col
+            )
+            # 区間平均
+            fig.add_trace(
+                go.Scattergl(x=data["time"], y=data["mean"], mode='lines',
+                             name=zone, line=dict(color='steelblue', width=1),
+                             customdata=data["count"],
+                             hovertemplate="%{x}<br>平均: %{y:.2f}秒<br>サイクル数: %{customdata}"),
+                row=row, col=col
+            )
+        
+        # 目標値の水平線を追加
+        fig.add_hline(
+            y=target,
+            line_dash="dash",
+            line_color=TARGET_LINE_COLOR,
+            line_width=TARGET_LINE_WIDTH,
+            annotation_text=f"目標: {target}秒",
+            annotation_position="right",
+            row=row, col=col
+        )
+        
+        fig.update_xaxes(title_text="時刻", row=row, col=col)
+        fig.update_yaxes(range=Y_AXIS_RANGE, title_text="組立時間 (秒)", row=row, col=col)
+    
+    fig.update_layout(
+        height=CHART_HEIGHT,
+        showlegend=False,
+        title_text="時系列グラフ（集計）"
+    )
+    return fig
+
+HEATMAP_METRICS = {
+    "achieve_rate": "達成率 (%)",
+    "mean": "平均 (秒)",
+    "std": "標準偏差 (秒)",
+    "count": "サイクル数",
+    "outliers": "異常値件数",
+}
+
+
+def plot_bucket_heatmap(bucket_stats, metric="achieve_rate", threshold_good=DEFAULT_THRESHOLD_GOOD):
+    """ゾーン×時間区間のヒートマップ（bucket_statisticsの結果から描画）
+
+    達成率は良好しきい値を中心に赤〜緑で塗り分ける。
+    """
+    table = bucket_stats.pivot(index="zone", columns="bucket", values=metric)
+    counts = bucket_stats.pivot(index="zone", columns="bucket", values="count")
+    zones = order_zones(table.index)
+    table, counts = table.reindex(zones), counts.reindex(index=zones, columns=table.columns)
+    
+    color = dict(colorscale="RdYlGn", zmid=threshold_good) if metric == "achieve_rate" \
+        else dict(colorscale="Blues")
+    fig = go.Figure(go.Heatmap(
+        z=table.to_numpy(dtype="float64"),
+        x=[str(bucket) for bucket in table.columns],
+        y=zones,
+        customdata=counts.to_numpy(dtype="float64"),
+        texttemplate="%{z}" if table.shape[1] <= 24 else None,  # 区間が多いときは値をホバーのみで表示
+        hovertemplate="%{y} / %{x}<br>" + HEATMAP_METRICS[metric] + ": %{z}"
+                      "<br>サイクル数: %{customdata}<extra></extra>",
+        colorbar=dict(title=HEATMAP_METRICS[metric]),
+        **color
+    ))
+    fig.update_layout(
+        height=max(300, 80 * len(zones) + 150),
+        title_text=f"時間帯別 {HEATMAP_METRICS[metric]}",
+        yaxis=dict(autorange="reversed")
+    )
+    return fig
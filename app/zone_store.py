@@ -0,0 +1,138 @@
+"""
+ゾーン別配列ストアモジュール
+ゾーン順に並べ替えた連続配列とオフセットで、各ゾーンのデータをコピーなしで参照する
+"""
+
+import os
+import json
+import uuid
+import numpy as np
+import pandas as pd
+from constants import ZONES
+
+FLAG_COLUMNS = ["iqr_flag", "zscore_flag", "hampel_flag"]
+
+
+def order_zones(zones):
+    """ゾーンを表示順に並べる（ZONES定義順、未定義のゾーンは名前順で後ろ）"""
+    zones = set(zones)
+    known = [zone for zone in ZONES if zone in zones]
+    extra = sorted(str(zone) for zone in zones if zone not in ZONES)
+    return known + extra
+
+
+class ZoneStore:
+    """ゾーン別に連続配置したサイクルタイム・時刻・異常値フラグの配列
+
+    ゾーンごとのデータは offsets[i]:offsets[i+1] の範囲にまとまっているため、
+    values(zone) などはNumPyのビューを返し、行の走査やコピーは発生しない。
+    save()した配列はload(mmap=True)で複数プロセスから共有できる。
+    """
+
+    def __init__(self, zones, offsets, values, timestamps=None, rows=None, flags=None, token=None):
+        self.zones = list(zones)
+        self.offsets = offsets
+        self._values = values
+        self._timestamps = timestamps
+        self._rows = rows
+        self._flags = flags or {}
+        self._zone_pos = {zone: i for i, zone in enumerate(self.zones)}
+        self.token = token or uuid.uuid4().hex
+
+    @classmethod
+    def from_frame(cls, df):
+        """DataFrameからストアを作成（ゾーン順への安定ソートは1回だけ）"""
+        zones = order_zones(df["zone_name"].dropna().unique())
+        codes = pd.Categorical(df["zone_name"], categories=zones).codes
+        order = np.argsort(codes, kind="stable")
+        order = order[codes[order] >= 0]
+        counts = np.bincount(codes[codes >= 0], minlength=len(zones))
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype("int64")
+
+        values = df["adjusted_time_seconds"].to_numpy(dtype="float64")[order]
+        timestamps = None
+        if "start_datetime" in df.columns and pd.api.types.is_datetime64_any_dtype(df["start_datetime"]):
+            timestamps = df["start_datetime"].to_numpy(dtype="datetime64[ns]")[order]
+        # 元の行ラベル（整数でなければ位置）
+        if pd.api.types.is_integer_dtype(df.index):
+            rows = df.index.to_numpy(dtype="int64")[order]
+        else:
+            rows = order.astype("int64")
+        flags = {
+            col: df[col].to_numpy(dtype="bool")[order]
+            for col in FLAG_COLUMNS if col in df.columns
+        }
+        return cls(zones, offsets, values, timestamps, rows, flags)
+
+    def __contains__(self, zone):
+        return zone in self._zone_pos
+
+    def __len__(self):
+        return len(self._values)
+
+    def zone_slice(self, zone):
+        """ゾーンの範囲（Noneは全ゾーン、未登録のゾーンは空）"""
+        if zone is None:
+            return slice(0, len(self._values))
+        pos = self._zone_pos.get(zone)
+        if pos is None:
+            return slice(0, 0)
+        return slice(int(self.offsets[pos]), int(self.offsets[pos + 1]))
+
+    def count(self, zone):
+        sl = self.zone_slice(zone)
+        return sl.stop - sl.start
+
+    def values(self, zone=None):
+        """サイクルタイム（zone省略時は全ゾーン）"""
+        return self._values if zone is None else self._values[self.zone_slice(zone)]
+
+    def timestamps(self, zone=None):
+        """開始時刻（start_datetimeが無い場合はNone）"""
+        if self._timestamps is None:
+            return None
+        return self._timestamps[self.zone_slice(zone)]
+
+    def rows(self, zone=None):
+        """元DataFrameの行ラベル"""
+        return self._rows[self.zone_slice(zone)]
+
+    def has_flag(self, name):
+        return name in self._flags
+
+    def flag(self, zone, name):
+        """異常値フラグ（無い列はすべてFalse）"""
+        if name not in self._flags:
+            return np.zeros(self.count(zone), dtype="bool")
+        return self._flags[name][self.zone_slice(zone)]
+
+    def save(self, directory):
+        """配列を.npyとして保存（load(mmap=True)で共有メモリとして開ける）"""
+        os.makedirs(directory, exist_ok=True)
+        arrays = {"offsets": self.offsets, "values": self._values, "rows": self._rows}
+        if self._timestamps is not None:
+            arrays["timestamps"] = self._timestamps
+        for name, flag in self._flags.items():
+            arrays[name] = flag
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, f"{name}.npy"), array)
+        meta = {"zones": self.zones, "flags": list(self._flags), "token": self.token,
+                "has_timestamps": self._timestamps is not None}
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        return directory
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """保存済みのストアを開く（mmap=Trueならページキャッシュを複数プロセスで共有）"""
+        mode = "r" if mmap else None
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        def load_array(name):
+            return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode)
+
+        timestamps = load_array("timestamps") if meta["has_timestamps"] else None
+        flags = {name: load_array(name) for name in meta["flags"]}
+        return cls(meta["zones"], load_array("offsets"), load_array("values"),
+                   timestamps, load_array("rows"), flags, meta["token"])
@@ -0,0 +1,120 @@
+"""
+サイクルデータ生成スクリプト
+既存CSVと同じスキーマのダミーデータを任意の行数・ゾーン数で生成する（異常値・欠損値入り）
+
+使い方:
+    python benchmarks/generate_cycles.py --rows 1000000 --zones 50 --output benchmarks/data/cycles_1m.csv
+"""
+
+import os
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+from constants import ZONES  # noqa: E402
+
+CSV_COLUMNS = [
+    "zone_name", "cycle_number", "start_datetime", "end_datetime", "start_frame", "end_frame",
+    "elapsed_seconds", "adjusted_time_seconds", "is_outlier", "created_at"
+]
+START_TIME = np.datetime64("2025-10-13T09:00:00.000")
+CYCLE_INTERVAL_MS = 6000
+FPS = 30
+
+
+def zone_names(zones):
+    """ゾーン名（4ゾーン以下は既存の名前、それ以上は連番）"""
+    if zones <= len(ZONES):
+        return ZONES[:zones]
+    return ZONES + [f"Z{i:04d}_Assemble" for i in range(len(ZONES), zones)]
+
+
+def zone_profiles(zones, rng):
+    """ゾーンごとに異なる平均・ばらつき（実環境を模擬）"""
+    means = rng.uniform(4.5, 8.0, zones)
+    stds = rng.uniform(0.1, 1.0, zones)
+    return means, stds
+
+
+def format_datetimes(values):
+    return np.char.replace(np.datetime_as_string(values, unit="ms"), "T", " ")
+
+
+def generate_chunk(start_row, rows, names, means, stds, rng,
+                   outlier_rate, missing_rate, invalid_rate):
+    """start_row行目からrows行分のDataFrameを生成（全ゾーンを時刻順に交互に並べる）"""
+    zones = len(names)
+    row_ids = np.arange(start_row, start_row + rows)
+    zone_idx = row_ids % zones
+    cycle = row_ids // zones
+
+    times = rng.normal(means[zone_idx], stds[zone_idx]).clip(min=0.5)
+    is_outlier = rng.random(rows) < outlier_rate
+    times[is_outlier] += rng.uniform(3.0, 8.0, is_outlier.sum())
+    times = times.round(3)
+
+    start = START_TIME + (cycle * CYCLE_INTERVAL_MS).astype("timedelta64[ms]")
+    end = start + (times * 1000).astype("int64").astype("timedelta64[ms]")
+    start_frame = cycle * (CYCLE_INTERVAL_MS // 1000 * FPS)
+
+    df = pd.DataFrame({
+        "zone_name": np.asarray(names, dtype=object)[zone_idx],
+        "cycle_number": cycle + 1,
+        "start_datetime": format_datetimes(start),
+        "end_datetime": format_datetimes(end),
+        "start_frame": start_frame,
+        "end_frame": start_frame + (times * FPS).astype("int64"),
+        "elapsed_seconds": times,
+        "adjusted_time_seconds": times,
+        "is_outlier": is_outlier.astype("int8"),
+        "created_at": np.datetime_as_string(start, unit="s").astype(object),
+    }, columns=CSV_COLUMNS)
+    df["created_at"] = df["created_at"].str.replace("T", " ", regex=False)
+
+    # 欠損値（時間・ゾーン名）と無効値（0以下）を混入
+    missing = rng.random(rows) < missing_rate
+    df.loc[missing & (rng.random(rows) < 0.5), "adjusted_time_seconds"] = np.nan
+    df.loc[missing & (rng.random(rows) >= 0.5), "zone_name"] = None
+    invalid = rng.random(rows) < invalid_rate
+    df.loc[invalid, "adjusted_time_seconds"] = -rng.random(invalid.sum()).round(3)
+    return df
+
+
+def generate_cycles(output_path, rows, zones=4, outlier_rate=0.02, missing_rate=0.001,
+                    invalid_rate=0.001, seed=42, chunk_rows=1_000_000):
+    """ダミーデータをチャンク単位でCSVへ書き出す（大規模でもメモリはチャンク分のみ）"""
+    rng = np.random.default_rng(seed)
+    names = zone_names(zones)
+    means, stds = zone_profiles(zones, rng)
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+
+    for start_row in range(0, rows, chunk_rows):
+        chunk = generate_chunk(
+            start_row, min(chunk_rows, rows - start_row), names, means, stds, rng,
+            outlier_rate, missing_rate, invalid_rate
+        )
+        chunk.to_csv(output_path, mode="w" if start_row == 0 else "a",
+                     header=start_row == 0, index=False)
+    return output_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="サイクルタイムのダミーデータ生成")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--zones", type=int, default=4)
+    parser.add_argument("--outlier-rate", type=float, default=0.02)
+    parser.add_argument("--missing-rate", type=float, default=0.001)
+    parser.add_argument("--invalid-rate", type=float, default=0.001)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args(argv)
+
+    generate_cycles(args.output, args.rows, args.zones, args.outlier_rate,
+                    args.missing_rate, args.invalid_rate, args.seed)
+    print(f"{args.rows}行（{args.zones}ゾーン）を生成しました → {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+解析パイプラインのベンチマーク
+生成データに対して各ステージの実行時間とピークメモリを計測し、JSONで保存する
+
+使い方:
+    python benchmarks/run_benchmarks.py --rows 10000 100000 1000000 --zones 4 100
+    python benchmarks/run_benchmarks.py --rows 100000 --compare benchmarks/results/previous.json
+"""
+
+import os
+import sys
+import gc
+import json
+import time
+import platform
+import argparse
+import subprocess
+import tracemalloc
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "app"))
+sys.path.insert(0, BENCH_DIR)
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+from generate_cycles import generate_cycles, zone_names  # noqa: E402
+from constants import DEFAULT_TARGET, DEFAULT_THRESHOLD_GOOD, DEFAULT_THRESHOLD_OK, DEFAULT_BINS  # noqa: E402
+from data_processing import (  # noqa: E402
+    load_csv_data, load_columnar_data, preprocess_data, analyze_outliers, calculate_statistics
+)
+from llm_payload import generate_llm_json  # noqa: E402
+from visualizations import plot_histograms, plot_timeseries  # noqa: E402
+
+DATA_DIR = os.path.join(BENCH_DIR, "data")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+
+def measure(func, *args, track_memory=True, **kwargs):
+    """関数を1回実行し、(戻り値, 秒, ピークMB)を返す"""
+    gc.collect()
+    if track_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - started
+    peak_mb = None
+    if track_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak_mb = round(peak / 1024 / 1024, 2)
+    return result, elapsed, peak_mb
+
+
+def dataset_path(rows, zones, seed):
+    """生成データのパス（同じ条件なら再生成しない）"""
+    path = os.path.join(DATA_DIR, f"cycles_{rows}rows_{zones}zones_seed{seed}.csv")
+    if not os.path.exists(path):
+        generate_cycles(path, rows, zones, seed=seed)
+    return path
+
+
+def figure_payload(fig):
+    """ブラウザへ送られる図のJSONサイズ（バイト）"""
+    return len(fig.to_json())
+
+
+def run_case(rows, zones, seed=42, repeat=1, track_memory=True):
+    """1条件（行数×ゾーン数）の全ステージを計測"""
+    path = dataset_path(rows, zones, seed)
+    target_values = {zone: DEFAULT_TARGET for zone in zone_names(zones)}
+    stages = [
+        ("load_csv_data", lambda ctx: load_csv_data(path)[0]),
+        ("load_columnar_data", lambda ctx: load_columnar_data(path, use_cache=False)[0]),
+        ("preprocess_data", lambda ctx: preprocess_data(ctx["load_columnar_data"])[0]),
+        ("analyze_outliers", lambda ctx: analyze_outliers(ctx["preprocess_data"])),
+        ("calculate_statistics", lambda ctx: calculate_statistics(ctx["analyze_outliers"], target_values)),
+        ("generate_llm_json", lambda ctx: generate_llm_json(
+            ctx["analyze_outliers"], ctx["calculate_statistics"],
+            DEFAULT_THRESHOLD_GOOD, DEFAULT_THRESHOLD_OK)),
+        ("plot_histograms", lambda ctx: plot_histograms(ctx["analyze_outliers"], target_values, bins=DEFAULT_BINS)),
+        ("plot_timeseries", lambda ctx: plot_timeseries(ctx["analyze_outliers"], target_values)),
+    ]
+
+    results = []
+    context = {}
+    for name, stage in stages:
+        timings = []
+        peak_mb = None
+        for _ in range(repeat):
+            context[name], elapsed, peak_mb = measure(stage, context, track_memory=track_memory)
+            timings.append(elapsed)
+        entry = {
+            "rows": rows,
+            "zones": zones,
+            "stage": name,
+            "seconds": round(min(timings), 4),
+            "peak_mb": peak_mb
+        }
+        if name.startswith("plot_"):
+            entry["payload_bytes"] = figure_payload(context[name])
+        results.append(entry)
+        print(f"{rows:>10} rows {zones:>5} zones  {name:<22} {entry['seconds']:>9.4f}s"
+              f"  peak {peak_mb if peak_mb is not None else '-':>8} MB", file=sys.stderr)
+    return results
+
+
+def environment_info():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": commit or None,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count()
+    }
+
+
+def compare(current, baseline_path):
+    """前回結果と比べた実行時間の比率を表示"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    previous = {(r["rows"], r["zones"], r["stage"]): r for r in baseline["results"]}
+    print(f"\n比較対象: {baseline_path} ({baseline['environment'].get('git_commit')})")
+    for result in current["results"]:
+        before = previous.get((result["rows"], result["zones"], result["stage"]))
+        if before is None or not before["seconds"]:
+            continue
+        ratio = result["seconds"] / before["seconds"]
+        print(f"{result['rows']:>10} rows {result['zones']:>5} zones  {result['stage']:<22}"
+              f" {before['seconds']:>9.4f}s → {result['seconds']:>9.4f}s  (x{ratio:.2f})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="解析パイプラインのベンチマーク")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--zones", type=int, nargs="+", default=[4])
+    parser.add_argument("--repeat", type=int, default=1, help="各ステージの繰り返し回数（最小値を採用）")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-memory", action="store_true", help="ピークメモリを計測しない（計測オーバーヘッド除去）")
+    parser.add_argument("--output", default=None, help="結果JSONの保存先")
+    parser.add_argument("--compare", default=None, help="比較する過去の結果JSON")
+    args = parser.parse_args(argv)
+
+    report = {"environment": environment_info(), "results": []}
+    for zones in args.zones:
+        for rows in args.rows:
+            report["results"].extend(
+                run_case(rows, zones, args.seed, args.repeat, track_memory=not args.no_memory)
+            )
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"bench-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"結果を保存しました → {output}", file=sys.stderr)
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Streamlitアプリの起動ベンチマーク
+新しいプロセスでのmain.pyのインポート時間と初回描画（1回目のスクリプト実行）までの時間を計測し、
+しきい値を超えた場合や起動時に読み込まない重い依存（openai等）が読み込まれた場合は終了コード1で終了する
+
+使い方:
+    python benchmarks/startup.py
+    python benchmarks/startup.py --repeat 5 --max-import-ms 1000 --max-render-ms 2000
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BENCH_DIR)
+APP_DIR = os.path.join(PROJECT_ROOT, "app")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+# 起動時（初回描画まで）に読み込まれてはならないモジュール（使う機能で初めて読み込む）
+LAZY_MODULES = ("openai", "dotenv", "plotly.subplots", "scipy")
+
+# 回帰とみなすしきい値（ミリ秒、中央値で判定）
+MAX_IMPORT_MS = 1500
+MAX_RENDER_MS = 3000
+
+# 子プロセスで実行する計測スクリプト（結果をJSONで標準出力へ）
+IMPORT_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+print(json.dumps({"seconds": elapsed, "modules": sorted(sys.modules)}))
+"""
+
+RENDER_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("main.py", default_timeout=60).run()
+elapsed = time.perf_counter() - started
+print(json.dumps({"seconds": elapsed, "modules": sorted(sys.modules),
+                  "exceptions": [str(e.value) for e in at.exception]}))
+"""
+
+
+def run_child(script):
+    """新しいPythonプロセスでスクリプトを実行して結果を返す（キャッシュの無いコールドスタート）"""
+    env = dict(os.environ, PYTHONPATH=APP_DIR, PYTHONDONTWRITEBYTECODE="1")
+    completed = subprocess.run([sys.executable, "-c", script], cwd=APP_DIR, env=env,
+                               capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def measure(script, repeat):
+    """repeat回計測し、(中央値ミリ秒, 全計測ミリ秒, 読み込まれた遅延対象モジュール, 例外)を返す"""
+    samples, loaded, exceptions = [], set(), []
+    for _ in range(repeat):
+        result = run_child(script)
+        samples.append(result["seconds"] * 1000)
+        loaded |= {name for name in LAZY_MODULES if name in result["modules"]}
+        exceptions += result.get("exceptions", [])
+    return statistics.median(samples), samples, sorted(loaded), exceptions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Streamlitアプリの起動ベンチマーク")
+    parser.add_argument("--repeat", type=int, default=3, help="計測回数（中央値で判定）")
+    parser.add_argument("--max-import-ms", type=float, default=MAX_IMPORT_MS)
+    parser.add_argument("--max-render-ms", type=float, default=MAX_RENDER_MS)
+    parser.add_argument("--output", default=None, help="結果JSONの保存先")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, BENCH_DIR)
+    from run_benchmarks import environment_info
+
+    report = {"environment": environment_info(), "results": []}
+    failures = []
+    for stage, script, limit in (("import_main", IMPORT_SCRIPT, args.max_import_ms),
+                                 ("first_render", RENDER_SCRIPT, args.max_render_ms)):
+        median_ms, samples, loaded, exceptions = measure(script, args.repeat)
+        report["results"].append({
+            "stage": stage, "median_ms": round(median_ms, 1), "samples_ms": [round(s, 1) for s in samples],
+            "limit_ms": limit, "lazy_modules_loaded": loaded, "exceptions": exceptions
+        })
+        print(f"{stage:<14} {median_ms:>8.1f} ms (上限 {limit:.0f} ms)"
+              f"  読み込まれた遅延対象: {', '.join(loaded) or 'なし'}", file=sys.stderr)
+        if median_ms > limit:
+            failures.append(f"{stage}: {median_ms:.1f} ms > {limit:.0f} ms")
+        if loaded:
+            failures.append(f"{stage}: 起動時に読み込まれた {', '.join(loaded)}")
+        if exceptions:
+            failures.append(f"{stage}: 例外 {exceptions}")
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"startup-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"結果を保存しました → {output}", file=sys.stderr)
+
+    if failures:
+        print("起動時間の回帰:\n  " + "\n  ".join(failures), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import os
+import sys
+
+# アプリケーションモジュール（app/）をインポート可能にする
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+
+# ========== OpenAI互換スタブサーバー ==========
+
+class OpenAIStub:
+    """/v1/chat/completions をSSEで返すローカルスタブ（リクエスト内容と同時接続数を記録）"""
+
+    def __init__(self):
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+        self.delay = 0.0
+        self.reply = lambda prompt: ["OK"]  # プロンプト → 返すチャンクのリスト
+        self.status = lambda prompt: 200  # プロンプト → HTTPステータス
+        self.lock = threading.Lock()
+        self.base_url = None
+
+
+def _make_handler(stub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            prompt = body["messages"][-1]["content"]
+            with stub.lock:
+                stub.requests.append(body)
+                stub.active += 1
+                stub.max_active = max(stub.max_active, stub.active)
+            try:
+                time.sleep(stub.delay)
+                status = stub.status(prompt)
+                if status != 200:
+                    payload = json.dumps({"error": {"message": "stub error", "type": "server_error"}}).encode()
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for text in stub.reply(prompt):
+                    chunk = {
+                        "id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": 0,
+                        "model": body["model"],
+                        "choices": [{"index": 0, "delta": {"content": text}, "finish_reason": None}]
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode())
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+            finally:
+                with stub.lock:
+                    stub.active -= 1
+
+    return Handler
+
+
+@pytest.fixture
+def openai_stub():
+    """ローカルのOpenAI互換スタブサーバーを起動"""
+    stub = OpenAIStub()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(stub))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    stub.base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    yield stub
+    server.shutdown()
+    server.server_close()
@@ -1,13 +1,24 @@
+import os
 import pytest
 import pandas as pd
 import numpy as np
-from main import (
-    preprocess_data, 
+import data_processing
+from data_processing import (
+    load_columnar_data,
+    preprocess_data,
+    preprocess_data_chunked,
+    iter_preprocessed_chunks,
+    ChunkedAnalysis,
     detect_outliers_iqr, 
     detect_outliers_zscore,
+    detect_outliers_hampel,
+    analyze_outliers,
+    discover_zones,
     calculate_statistics,
     get_status
 )
+from time_buckets import bucket_codes, bucket_statistics, parse_shift_calendar
+from zone_store import ZoneStore
 
 # ========== テストデータ生成 ==========
 
@@ -29,6 +40,55 @@ def create_test_dataframe():
     
     return df
 
+def write_test_csv(path):
+    """テスト用のCSV（未使用列を含む）を書き出す"""
+    df = create_test_dataframe()
+    df["start_datetime"] = pd.date_range("2025-10-13 09:00", periods=len(df), freq="6s").astype(str)
+    df["end_frame"] = 0
+    df["created_at"] = df["start_datetime"]
+    df.to_csv(path, index=False)
+    return df
+
+# ========== 読み込みテスト ==========
+
+def test_load_columnar_csv_schema(tmp_path, monkeypatch):
+    """CSVを固定スキーマで読み込み、未使用列を除外するテスト"""
+    monkeypatch.setattr(data_processing, "PARQUET_CACHE_DIR", str(tmp_path / "cache"))
+    csv_path = tmp_path / "cycles.csv"
+    write_test_csv(csv_path)
+    
+    df, error = load_columnar_data(str(csv_path))
+    
+    assert error is None
+    assert len(df) == 200
+    assert "end_frame" not in df.columns
+    assert "created_at" not in df.columns
+    assert isinstance(df["zone_name"].dtype, pd.CategoricalDtype)
+    assert df["adjusted_time_seconds"].dtype == np.float32
+    assert pd.api.types.is_datetime64_any_dtype(df["start_datetime"])
+
+def test_load_columnar_csv_uses_parquet_cache(tmp_path, monkeypatch):
+    """2回目以降はParquetキャッシュから同じ内容を読み込むテスト"""
+    pytest.importorskip("pyarrow")
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setattr(data_processing, "PARQUET_CACHE_DIR", str(cache_dir))
+    csv_path = tmp_path / "cycles.csv"
+    write_test_csv(csv_path)
+    
+    first, _ = load_columnar_data(str(csv_path))
+    assert len(os.listdir(cache_dir)) == 1
+    second, error = load_columnar_data(str(csv_path))
+    
+    assert error is None
+    pd.testing.assert_frame_equal(first, second)
+
+def test_load_columnar_missing_file():
+    """存在しないファイルはエラーを返すテスト"""
+    df, error = load_columnar_data("/nonexistent/cycles.csv")
+    
+    assert df is None
+    assert error is not None
+
 # ========== 前処理テスト ==========
 
 def test_preprocess_valid_data():
@@ -74,6 +134,57 @@ def test_preprocess_missing_columns():
     assert df_clean is None
     assert error is not None
 
+def test_preprocess_chunked_matches_in_memory(tmp_path):
+    """チャンク前処理がpreprocess_dataと同じ結果・カウンタになるテスト"""
+    df = create_test_dataframe()
+    df.loc[0, "adjusted_time_seconds"] = np.nan
+    df.loc[50, "zone_name"] = np.nan
+    df.loc[120, "adjusted_time_seconds"] = -1.0
+    df.loc[199, "adjusted_time_seconds"] = 0.0
+    csv_path = tmp_path / "cycles.csv"
+    df.to_csv(csv_path, index=False)
+    
+    expected, expected_stats, _ = preprocess_data(df)
+    df_clean, stats, error = preprocess_data_chunked(str(csv_path), chunksize=32)
+    
+    assert error is None
+    assert stats == expected_stats
+    assert list(df_clean.index) == list(expected.index)
+    assert isinstance(df_clean["zone_name"].dtype, pd.CategoricalDtype)
+    np.testing.assert_allclose(
+        df_clean["adjusted_time_seconds"], expected["adjusted_time_seconds"], rtol=1e-6
+    )
+
+def test_preprocess_chunked_missing_columns(tmp_path):
+    """チャンク前処理で必須列が欠けている場合のテスト"""
+    csv_path = tmp_path / "wrong.csv"
+    pd.DataFrame({"wrong_column": [1, 2, 3]}).to_csv(csv_path, index=False)
+    
+    df_clean, stats, error = preprocess_data_chunked(str(csv_path))
+    
+    assert df_clean is None
+    assert error is not None
+
+def test_chunked_analysis_bounds_recent_rows(tmp_path):
+    """チャンク解析が全行の統計を求め、保持する直近データはwindow_rows行以下になるテスト"""
+    df = create_test_dataframe().sample(frac=1, random_state=0).reset_index(drop=True)
+    df.loc[7, "adjusted_time_seconds"] = 30.0
+    csv_path = tmp_path / "cycles.csv"
+    df.to_csv(csv_path, index=False)
+    stats_log = {"original_rows": 0, "removed_missing": 0, "removed_invalid": 0, "final_rows": 0}
+    analysis = ChunkedAnalysis(window_rows=50)
+    
+    flagged_rows = sum(len(chunk) for chunk in analysis.consume(
+        iter_preprocessed_chunks(str(csv_path), stats_log, chunksize=32)
+    ))
+    recent = analysis.recent_frame()
+    
+    expected, _, _ = preprocess_data(df)
+    assert flagged_rows == stats_log["final_rows"] == len(expected)
+    assert analysis.stats_dict({}) == calculate_statistics(expected, {})
+    assert list(recent.index) == list(expected.index[-50:])
+    assert {"iqr_flag", "zscore_flag", "hampel_flag"} <= set(recent.columns)
+
 # ========== 異常値検出テスト ==========
 
 def test_detect_outliers_iqr():
@@ -101,6 +212,89 @@ def test_detect_outliers_zscore_zero_std():
     
     assert outliers.sum() == 0  # 外れ値なし
 
+def test_analyze_outliers_matches_per_zone_detection():
+    """グループ化した異常値検出がゾーン別の検出関数と一致するテスト"""
+    df = create_test_dataframe()
+    df.loc[150:, "zone_name"] = "C_Unknown"  # ZONESに未定義のゾーン
+    df.loc[160, "adjusted_time_seconds"] = 30.0
+    
+    result = analyze_outliers(df)
+    
+    for zone, zone_df in df.groupby("zone_name"):
+        series = zone_df["adjusted_time_seconds"]
+        pd.testing.assert_series_equal(
+            result.loc[series.index, "iqr_flag"], detect_outliers_iqr(series), check_names=False
+        )
+        pd.testing.assert_series_equal(
+            result.loc[series.index, "zscore_flag"], detect_outliers_zscore(series), check_names=False
+        )
+    assert result.loc[160, "iqr_flag"]
+    assert "iqr_flag" not in df.columns  # 入力は変更しない
+
+def test_detect_outliers_hampel_under_drift():
+    """ドリフト中の局所的な外れ値をHampel法だけが検出するテスト"""
+    rng = np.random.default_rng(0)
+    data = pd.Series(np.linspace(5.0, 8.0, 600) + rng.normal(0, 0.1, 600))
+    spikes = [50, 300, 550]
+    data[spikes] += 1.0
+    
+    hampel = detect_outliers_hampel(data)
+    
+    assert hampel[spikes].all()
+    assert hampel.sum() < len(data) * 0.03
+    assert not detect_outliers_iqr(data)[spikes].any()  # 全体基準では埋もれる
+    assert detect_outliers_hampel(pd.Series([5.0] * 50)).sum() == 0  # MAD=0は判定しない
+
+def brute_force_hampel(values, window, threshold):
+    """窓ごとに中央値・MADを定義どおりに求めるHampel法（比較用）"""
+    left, right = window // 2, window - 1 - window // 2
+    flags = []
+    for i in range(len(values)):
+        window_values = values[max(i - left, 0):i + right + 1]
+        median = np.median(window_values)
+        mad = np.median(np.abs(window_values - median))
+        flags.append(mad > 0 and abs(values[i] - median) > threshold * 1.4826 * mad)
+    return np.array(flags)
+
+@pytest.mark.parametrize("window", [31, 8])
+def test_hampel_matches_brute_force_on_step_change(window):
+    """段差のある系列で、Hampel法の判定が窓ごとに定義どおり求めたMADの判定と一致するテスト"""
+    rng = np.random.default_rng(1)
+    values = np.concatenate([np.full(200, 5.0), np.full(200, 9.0), np.full(5, 6.0)])
+    values += rng.normal(0, 0.1, len(values))
+    values[[100, 201, 399]] += [1.5, -2.0, 3.0]
+    groups = np.zeros(len(values), dtype="int64")
+    
+    flags = data_processing.hampel_flags(values, groups, window=window, threshold=3.0)
+    median = pd.Series(values).rolling(window, center=True, min_periods=1).median().to_numpy()
+    
+    np.testing.assert_array_equal(flags, brute_force_hampel(values, window, 3.0))
+    np.testing.assert_array_equal(data_processing._rolling_mad(values, median, window, block_rows=7),
+                                  data_processing._rolling_mad(values, median, window))
+    if window == 31:
+        assert flags[[100, 201, 399]].all()
+
+def test_analyze_outliers_hampel_uses_cycle_order():
+    """Hampel法がゾーン内の開始時刻順に判定され、行の並びに依存しないテスト"""
+    df = create_test_dataframe().assign(
+        start_datetime=pd.date_range("2025-10-13 09:00", periods=200, freq="6s")
+    )
+    df.loc[40, "adjusted_time_seconds"] = 9.0
+    
+    result = analyze_outliers(df.sample(frac=1.0, random_state=0))
+    
+    for zone, zone_df in df.groupby("zone_name"):
+        expected = detect_outliers_hampel(zone_df.sort_values("start_datetime")["adjusted_time_seconds"])
+        pd.testing.assert_series_equal(result.loc[expected.index, "hampel_flag"], expected,
+                                       check_names=False)
+    assert result.loc[40, "hampel_flag"]
+
+def test_discover_zones_order():
+    """ゾーン検出の順序テスト（定義済みゾーンが先）"""
+    df = pd.DataFrame({"zone_name": ["Z_Extra", "B_Assemble", "A_Assemble", None]})
+    
+    assert discover_zones(df) == ["A_Assemble", "B_Assemble", "Z_Extra"]
+
 # ========== 統計計算テスト ==========
 
 def test_calculate_statistics():
@@ -127,6 +321,47 @@ def test_get_status():
     assert get_status(90, 90, 70) == "○"  # 境界値
     assert get_status(70, 90, 70) == "△"  # 境界値
 
+# ========== 時間帯別集計テスト ==========
+
+def test_bucket_codes_shift_overnight():
+    """夜勤（日付またぎ）のサイクルを開始日のシフトに割り当てるテスト"""
+    timestamps = pd.to_datetime(["2025-10-13 05:59", "2025-10-13 06:00", "2025-10-13 23:00",
+                                 "2025-10-14 01:00", None]).to_numpy()
+    
+    codes, labels = bucket_codes(timestamps, "day_shift", "早番=06:00,遅番=14:00,夜勤=22:00")
+    
+    assert [labels[code] for code in codes[:4]] == [
+        "2025-10-12 夜勤", "2025-10-13 早番", "2025-10-13 夜勤", "2025-10-13 夜勤"
+    ]
+    assert codes[4] == -1
+    assert parse_shift_calendar([("B", "14:00"), ("A", "6")])[0] == ["A", "B"]
+    with pytest.raises(ValueError):
+        bucket_codes(timestamps, "weekly?")
+
+def test_bucket_statistics_matches_groupby():
+    """ゾーン×区間の統計がpandasのgroupbyと一致するテスト"""
+    df = create_test_dataframe().assign(
+        start_datetime=pd.date_range("2025-10-13 00:00", periods=200, freq="17min")
+    )
+    df = analyze_outliers(df)
+    
+    result = bucket_statistics(ZoneStore.from_frame(df), {"A_Assemble": 5.0}, by="hour")
+    
+    grouped = df.groupby(["zone_name", df["start_datetime"].dt.hour])["adjusted_time_seconds"]
+    expected = grouped.agg(["count", "mean", "std"]).reset_index()
+    assert len(result) == len(expected)
+    np.testing.assert_array_equal(result["count"], expected["count"])
+    np.testing.assert_allclose(result["mean"], expected["mean"].round(2))
+    np.testing.assert_allclose(result["std"], expected["std"].round(2))
+    first = result.iloc[0]
+    assert first["achieve_rate"] == round(5.0 / expected["mean"].iloc[0] * 100, 1)
+    assert result["outliers"].sum() == (df["iqr_flag"] | df["zscore_flag"] | df["hampel_flag"]).sum()
+    assert result["hampel_outliers"].sum() == df["hampel_flag"].sum()
+
+def test_bucket_statistics_without_timestamps():
+    """start_datetimeが無いデータでは時間帯別集計を行わないテスト"""
+    assert bucket_statistics(ZoneStore.from_frame(create_test_dataframe()), {}) is None
+
 # ========== 実行 ==========
 
 if __name__ == "__main__":
@@ -0,0 +1,156 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import pandas as pd
+import numpy as np
+from disk_cache import DiskCache, make_key
+from stage_cache import StageCache, source_fingerprint
+from llm_cache import LLMResponseCache
+
+# ========== ディスクキャッシュテスト ==========
+
+def test_make_key_is_canonical():
+    """辞書のキー順に依存しないハッシュキーになるテスト"""
+    assert make_key("statistics", {"A": 5.0, "B": 6.0}) == make_key("statistics", {"B": 6.0, "A": 5.0})
+    assert make_key("statistics", {"A": 5.0}) != make_key("statistics", {"A": 5.1})
+
+def test_disk_cache_lru_eviction(tmp_path):
+    """容量超過時に最終アクセスが古いものから削除されるテスト"""
+    cache = DiskCache(str(tmp_path), max_bytes=300)
+    for i in range(3):
+        cache.write_json(f"key{i}", "x" * 90)
+        past = time.time() - 100 + i
+        os.utime(cache.path_for(f"key{i}", ".json"), (past, past))
+    
+    assert cache.read_json("key0") is not None  # key0を最近アクセスしたことにする
+    cache.write_json("key3", "x" * 90)
+    
+    assert cache.read_json("key1") is None
+    assert cache.read_json("key0") is not None
+    assert cache.read_json("key3") is not None
+
+def test_disk_cache_concurrent_store(tmp_path):
+    """同じキー・別キーへの並行書き込みで一時ファイルが衝突せず、合計サイズが上限内に収まるテスト"""
+    cache = DiskCache(str(tmp_path), max_bytes=20_000, rescan_writes=1_000)
+    barrier = threading.Barrier(16)
+
+    def write(worker):
+        barrier.wait()
+        for i in range(25):
+            cache.write_json("shared", {"worker": worker, "i": i, "pad": "x" * 200})
+            cache.write_json(f"key{worker}-{i}", "x" * 200)
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        list(pool.map(write, range(16)))  # 例外があればここで送出される
+
+    assert cache.read_json("shared")["pad"] == "x" * 200
+    files = [os.path.join(root, name) for root, _, names in os.walk(tmp_path) for name in names]
+    assert not [f for f in files if f.endswith(".tmp")]
+    total = sum(os.path.getsize(f) for f in files)
+    assert total <= 20_000
+    cache.evict()
+    assert cache._total == total
+
+# ========== ステージキャッシュテスト ==========
+
+def test_stage_cache_frame_roundtrip(tmp_path):
+    """異常値フラグ付きDataFrameがParquet経由で型を保って復元されるテスト"""
+    pytest.importorskip("pyarrow")
+    cache = StageCache(str(tmp_path / "stages"), max_bytes=10 * 1024 * 1024)
+    df = pd.DataFrame({
+        "zone_name": pd.Categorical(["A_Assemble", "B_Assemble"]),
+        "start_datetime": pd.to_datetime(["2025-10-13 09:00:00", "2025-10-13 09:00:06"]),
+        "adjusted_time_seconds": np.array([4.7, 6.1], dtype="float32"),
+        "iqr_flag": [False, True],
+        "zscore_flag": [False, False]
+    }, index=[3, 7])
+    source = {"path": "/data/cycles.csv", "size": 100, "mtime_ns": 1}
+    
+    assert cache.get_frame("outliers", source) is None
+    cache.put_frame("outliers", source, df)
+    
+    pd.testing.assert_frame_equal(cache.get_frame("outliers", source), df)
+    assert cache.get_frame("outliers", dict(source, mtime_ns=2)) is None
+
+def test_stage_cache_get_or_compute(tmp_path):
+    """2回目はパラメータが同じならキャッシュから返すテスト"""
+    cache = StageCache(str(tmp_path / "stages"), max_bytes=1024 * 1024)
+    calls = []
+    
+    def compute():
+        calls.append(1)
+        return {"A_Assemble": {"mean": 4.7}}
+    
+    first, hit1 = cache.get_or_compute_json("statistics", {"path": "x"}, compute, params={"A": 5.0})
+    second, hit2 = cache.get_or_compute_json("statistics", {"path": "x"}, compute, params={"A": 5.0})
+    
+    assert (hit1, hit2) == (False, True)
+    assert first == second
+    assert len(calls) == 1
+
+def test_source_fingerprint_changes_with_content(tmp_path):
+    """ファイルが更新されると識別子が変わるテスト"""
+    path = tmp_path / "cycles.csv"
+    path.write_text("zone_name,adjusted_time_seconds\nA_Assemble,5.0\n")
+    before = source_fingerprint(str(path), content_hash=True)
+    path.write_text("zone_name,adjusted_time_seconds\nA_Assemble,6.0\n")
+    
+    assert source_fingerprint(str(path), content_hash=True) != before
+
+# ========== LLM応答キャッシュテスト ==========
+
+class FakePlaceholder:
+    def __init__(self):
+        self.rendered = []
+
+    def markdown(self, text):
+        self.rendered.append(text)
+
+
+class FakeStreamingClient:
+    """チャンクを順に返すOpenAIクライアントの代用品"""
+    def __init__(self, chunks):
+        self.calls = 0
+        self.chunks = chunks
+        self.chat = self
+        self.completions = self
+
+    def create(self, **kwargs):
+        from types import SimpleNamespace
+        self.calls += 1
+        return [
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=c))])
+            for c in self.chunks
+        ]
+
+
+def test_llm_cache_replays_same_payload(tmp_path):
+    """同じLLM向けJSONならAPIを呼ばずにキャッシュ済み応答を表示するテスト"""
+    from llm_handler import analyze_with_llm
+    cache = LLMResponseCache(str(tmp_path), max_bytes=1024 * 1024, ttl_seconds=3600)
+    client = FakeStreamingClient(["改善", "提案"])
+    llm_json = {"zones": {"A_Assemble": {"stats": {"mean": 5.2}}}}
+    
+    first, error = analyze_with_llm(client, llm_json, FakePlaceholder(), response_cache=cache)
+    placeholder = FakePlaceholder()
+    second, _ = analyze_with_llm(client, dict(llm_json), placeholder, response_cache=cache)
+    analyze_with_llm(client, {"zones": {}}, FakePlaceholder(), response_cache=cache)
+    
+    assert error is None
+    assert first == second == "改善提案"
+    assert placeholder.rendered == ["改善提案"]
+    assert client.calls == 2
+
+def test_llm_cache_ttl_expiry(tmp_path):
+    """有効期限を過ぎた応答は返さず削除されるテスト"""
+    cache = LLMResponseCache(str(tmp_path), max_bytes=1024 * 1024, ttl_seconds=60)
+    key = cache.key("system", "template {data}", {"a": 1}, "gpt-4o", 0.7, 2000)
+    cache.put(key, "応答")
+    assert cache.get(key) == "応答"
+    
+    cache.disk.write_json(key, {"created_at": time.time() - 120, "response": "応答"})
+    
+    assert cache.get(key) is None
+    assert not os.path.exists(cache.disk.path_for(key, ".json"))
@@ -0,0 +1,120 @@
+import json
+import pytest
+import pandas as pd
+import numpy as np
+import instrumentation
+from instrumentation import StageTimer, NULL_STAGE, current_stage
+from pipeline import run_pipeline
+from stage_cache import StageCache
+
+# ========== テストデータ生成 ==========
+
+def write_cycles_csv(path, n=200):
+    rng = np.random.default_rng(0)
+    pd.DataFrame({
+        "zone_name": np.repeat(["A_Assemble", "B_Assemble"], n // 2),
+        "start_datetime": pd.date_range("2025-10-13 09:00", periods=n, freq="6s").astype(str),
+        "adjusted_time_seconds": rng.normal(5.0, 0.3, n),
+        "is_outlier": 0
+    }).to_csv(path, index=False)
+
+# ========== 計測テスト ==========
+
+def test_disabled_timer_is_noop(tmp_path):
+    """無効時は共有の何もしないステージを返し、記録も出力もしないテスト"""
+    timer = StageTimer(enabled=False)
+    
+    with timer.stage("load") as stage:
+        stage.set(cache="hit")
+        assert current_stage() is NULL_STAGE
+    
+    assert timer.stage("load") is NULL_STAGE
+    assert timer.records == []
+    assert timer.export("ndjson", str(tmp_path / "metrics")) is None
+
+def test_pipeline_stages_and_cache_status(tmp_path):
+    """パイプラインの各ステージとキャッシュのヒット・ミスが記録されるテスト"""
+    pytest.importorskip("pyarrow")
+    csv_path = tmp_path / "cycles.csv"
+    write_cycles_csv(csv_path)
+    cache = StageCache(str(tmp_path / "stages"), max_bytes=100 * 1024 * 1024)
+    
+    first, second = StageTimer(enabled=True), StageTimer(enabled=True)
+    run_pipeline(str(csv_path), {}, stage_cache=cache, timer=first)
+    run_pipeline(str(csv_path), {}, stage_cache=cache, timer=second)
+    
+    assert [r["stage"] for r in first.records] == [
+        "stage_cache_lookup", "load", "preprocess", "analyze_outliers", "stage_cache_store",
+        "zone_store", "calculate_statistics", "generate_llm_json"
+    ]
+    assert [r["stage"] for r in second.records] == [
+        "stage_cache_lookup", "zone_store", "calculate_statistics", "generate_llm_json"
+    ]
+    cache_status = {r["stage"]: r.get("cache") for r in second.records}
+    assert cache_status["stage_cache_lookup"] == "hit"
+    assert cache_status["calculate_statistics"] == "hit"
+    assert all(r["seconds"] >= 0 for r in first.records)
+
+def test_nested_stage_and_error():
+    """入れ子のステージで実行中のステージが切り替わり、例外も記録されるテスト"""
+    timer = StageTimer(enabled=True)
+    
+    with timer.stage("chart") as outer:
+        with pytest.raises(ValueError):
+            with timer.stage("inner"):
+                current_stage().set(cache="miss")
+                raise ValueError
+        assert current_stage() is outer
+    
+    assert timer.records[0] == {**timer.records[0], "stage": "inner", "cache": "miss", "error": "ValueError"}
+    assert timer.records[1]["stage"] == "chart"
+
+def test_stage_memory_is_current_rss():
+    """メモリはステージ前後の現在の常駐メモリの差で記録され、同じ確保を繰り返しても毎回増加・解放が記録されるテスト"""
+    if instrumentation._current_rss_bytes() is None:
+        pytest.skip("常駐メモリを取得できない環境")
+    timer = StageTimer(enabled=True)
+    
+    for _ in range(2):
+        with timer.stage("allocate"):
+            data = np.ones(64 * 1024 * 1024 // 8)
+        with timer.stage("release"):
+            del data
+    
+    deltas = {stage: [r["rss_delta_mb"] for r in timer.records if r["stage"] == stage]
+              for stage in ("allocate", "release")}
+    assert all(delta > 32 for delta in deltas["allocate"])
+    assert all(delta < -32 for delta in deltas["release"])
+    assert all(r["rss_mb"] > 0 for r in timer.records)
+
+def test_signature_ignores_measurements():
+    """時間・メモリだけが違う記録は同じ内容、キャッシュ状態などが違えば別の内容と判定するテスト"""
+    first, second, third = (StageTimer(enabled=True) for _ in range(3))
+    first.records = [{"stage": "chart", "view": "統計表", "cache": "hit", "seconds": 0.1, "rss_mb": 100.0}]
+    second.records = [{"stage": "chart", "view": "統計表", "cache": "hit", "seconds": 0.3, "rss_mb": 120.0}]
+    third.records = [{"stage": "chart", "view": "統計表", "cache": "miss", "seconds": 0.1, "rss_mb": 100.0}]
+    
+    assert first.signature() == second.signature()
+    assert first.signature() != third.signature()
+
+def test_export_prometheus_and_ndjson(tmp_path):
+    """Prometheus textfile（同名ステージは合計）とNDJSON（追記）で出力されるテスト"""
+    timer = StageTimer(enabled=True)
+    timer.records = [
+        {"stage": "chart", "seconds": 0.25, "cache": "miss", "rss_mb": 100.0, "rss_delta_mb": 2.0},
+        {"stage": "chart", "seconds": 0.5, "cache": "hit", "rss_mb": 99.0, "rss_delta_mb": -1.0},
+        {"stage": "load", "seconds": 1.0},
+    ]
+    
+    prom = open(timer.export("prometheus", str(tmp_path / "m"))).read()
+    timer.export("ndjson", str(tmp_path / "m"))
+    ndjson_path = timer.export("ndjson", str(tmp_path / "m"))
+    
+    assert 'cycleeye_stage_duration_seconds{stage="chart"} 0.75' in prom
+    assert 'cycleeye_stage_duration_seconds{stage="load"} 1' in prom
+    assert 'cycleeye_stage_cache_hit{stage="chart"} 1' in prom
+    assert f'cycleeye_stage_rss_delta_bytes{{stage="chart"}} {1024 * 1024:g}' in prom
+    assert f'cycleeye_stage_rss_bytes{{stage="chart"}} {99 * 1024 * 1024:g}' in prom
+    lines = [json.loads(line) for line in open(ndjson_path)]
+    assert len(lines) == 6
+    assert lines[0]["run_id"] == timer.run_id and lines[0]["stage"] == "chart"
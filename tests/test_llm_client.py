@@ -0,0 +1,229 @@
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import openai
+from openai import OpenAI
+import llm_client
+from llm_client import (
+    ResilientLLMClient, CircuitBreaker, CircuitOpenError, create_openai_client, backoff_delay
+)
+
+MESSAGES = [{"role": "user", "content": "テスト"}]
+
+# ========== テスト用ヘルパー ==========
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def status_sequence(*statuses):
+    """呼び出し順にHTTPステータスを返す（以降は200）"""
+    remaining = list(statuses)
+    return lambda prompt: remaining.pop(0) if remaining else 200
+
+
+def resilient_client(stub, **kwargs):
+    delays = []
+    client = ResilientLLMClient(OpenAI(api_key="test", base_url=stub.base_url, max_retries=0),
+                                sleep=delays.append, **kwargs)
+    return client, delays
+
+# ========== 再試行テスト ==========
+
+def test_retries_rate_limit_then_succeeds(openai_stub):
+    """429・5xxはバックオフして再試行し、計測記録に再試行回数とトークン数を残すテスト"""
+    openai_stub.status = status_sequence(429, 503)
+    openai_stub.reply = lambda prompt: ["改善", "提案"]
+    client, delays = resilient_client(openai_stub, max_retries=3)
+    
+    text = client.stream_chat(MESSAGES, 100)
+    
+    assert text == "改善提案"
+    assert len(openai_stub.requests) == 3
+    assert len(delays) == 2
+    record = client.telemetry.records[-1]
+    assert record["status"] == "ok"
+    assert record["retries"] == 2
+    assert record["completion_tokens"] == 2
+    assert record["prompt_tokens"] > 0
+    assert client.telemetry.summary()["calls"] == 1
+
+def test_client_error_not_retried(openai_stub):
+    """400系（429以外）は再試行せずにそのままエラーにするテスト"""
+    openai_stub.status = lambda prompt: 400
+    client, delays = resilient_client(openai_stub, max_retries=3)
+    
+    with pytest.raises(openai.BadRequestError):
+        client.stream_chat(MESSAGES, 100)
+    
+    assert len(openai_stub.requests) == 1
+    assert delays == []
+    assert client.telemetry.records[-1]["status"] == "BadRequestError"
+
+def test_backoff_delay_jitter_and_retry_after():
+    """待ち時間は上限付きの指数バックオフ範囲内で、Retry-Afterがあれば優先するテスト"""
+    rng = random.Random(0)
+    delays = [backoff_delay(attempt, base=0.5, cap=4.0, rng=rng) for attempt in range(6) for _ in range(50)]
+    assert all(0 <= d <= 4.0 for d in delays)
+    assert max(delays[:50]) <= 0.5
+    
+    class Response:
+        headers = {"retry-after": "2"}
+    error = type("RateLimited", (), {"response": Response()})()
+    assert backoff_delay(5, error, base=0.5, cap=4.0) == 2.0
+
+def test_read_timeout_bounds_hung_stream(openai_stub, monkeypatch):
+    """応答が止まった場合も読み取りタイムアウトで打ち切られるテスト"""
+    monkeypatch.setattr(llm_client, "LLM_READ_TIMEOUT", 0.2)
+    openai_stub.delay = 2.0
+    client = ResilientLLMClient(create_openai_client("test", openai_stub.base_url), max_retries=0)
+    
+    with pytest.raises(openai.APITimeoutError):
+        client.stream_chat(MESSAGES, 100)
+
+# ========== サーキットブレーカーテスト ==========
+
+def test_circuit_breaker_opens_and_recovers(openai_stub):
+    """連続失敗で呼び出しを止め、一定時間後の試行が成功すれば復帰するテスト"""
+    clock = FakeClock()
+    openai_stub.status = lambda prompt: 500
+    client, _ = resilient_client(openai_stub, max_retries=0,
+                                 breaker=CircuitBreaker(failure_threshold=2, reset_seconds=30, clock=clock))
+    
+    for _ in range(2):
+        with pytest.raises(openai.InternalServerError):
+            client.stream_chat(MESSAGES, 100)
+    with pytest.raises(CircuitOpenError):
+        client.stream_chat(MESSAGES, 100)
+    assert len(openai_stub.requests) == 2
+    
+    clock.now = 31
+    openai_stub.status = lambda prompt: 200
+    assert client.stream_chat(MESSAGES, 100) == "OK"
+    assert client.breaker.state == "closed"
+
+def test_circuit_breaker_half_open_allows_single_probe():
+    """half_open中は並行呼び出しのうち1件だけを試行させ、結果の記録まで他を拒否するテスト"""
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30, clock=clock)
+    breaker.record_failure()
+    clock.now = 31
+    barrier = threading.Barrier(16)
+
+    def try_allow():
+        barrier.wait()
+        return breaker.allow()
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        allowed = list(pool.map(lambda _: try_allow(), range(16)))
+    assert allowed.count(True) == 1
+    assert not breaker.allow()
+
+    breaker.record_failure()  # 試行失敗で再び開く
+    assert breaker.state == "open" and not breaker.allow()
+    clock.now = 62
+    assert breaker.allow() and not breaker.allow()
+    breaker.record_success()
+    assert breaker.allow() and breaker.allow()
+
+def test_circuit_breaker_probe_blocks_concurrent_calls(openai_stub):
+    """試行中の呼び出しがあれば、共有クライアントの他の呼び出しはAPIを呼ばずに拒否されるテスト"""
+    clock = FakeClock()
+    openai_stub.status = lambda prompt: 500
+    client, _ = resilient_client(openai_stub, max_retries=0,
+                                 breaker=CircuitBreaker(failure_threshold=1, reset_seconds=30, clock=clock))
+    with pytest.raises(openai.InternalServerError):
+        client.stream_chat(MESSAGES, 100)
+
+    clock.now = 31
+    openai_stub.status = lambda prompt: 200
+    openai_stub.delay = 0.5
+
+    def call(_):
+        try:
+            return client.stream_chat(MESSAGES, 100)
+        except CircuitOpenError:
+            return None
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(call, range(8)))
+
+    assert results.count("OK") == 1
+    assert len(openai_stub.requests) == 2
+    assert client.breaker.state == "closed"
+
+def test_circuit_breaker_ignores_client_errors(openai_stub):
+    """400・401（リクエスト・認証の誤り）では遮断せず、half_openの試行枠も返すテスト"""
+    clock = FakeClock()
+    client, _ = resilient_client(openai_stub, max_retries=0,
+                                 breaker=CircuitBreaker(failure_threshold=2, reset_seconds=30, clock=clock))
+    for status, error in ((400, openai.BadRequestError), (401, openai.AuthenticationError)) * 2:
+        openai_stub.status = lambda prompt, status=status: status
+        with pytest.raises(error):
+            client.stream_chat(MESSAGES, 100)
+    assert client.breaker.state == "closed"
+    assert client.breaker.failures == 0
+
+    openai_stub.status = lambda prompt: 500
+    for _ in range(2):
+        with pytest.raises(openai.InternalServerError):
+            client.stream_chat(MESSAGES, 100)
+    assert client.breaker.state == "open"
+
+    clock.now = 31
+    openai_stub.status = lambda prompt: 400
+    with pytest.raises(openai.BadRequestError):
+        client.stream_chat(MESSAGES, 100)  # 試行枠を返すため、次の呼び出しも試行できる
+    openai_stub.status = lambda prompt: 200
+    assert client.stream_chat(MESSAGES, 100) == "OK"
+    assert client.breaker.state == "closed"
+
+def test_analyze_with_llm_falls_back_to_rules(openai_stub):
+    """API障害時はルールベースの推奨事項で代替表示し、キャッシュしないテスト"""
+    from llm_handler import analyze_with_llm
+    openai_stub.status = lambda prompt: 503
+    client, _ = resilient_client(openai_stub, max_retries=1)
+    llm_json = {"zones": {"A_Assemble": {
+        "evaluation": {"short": "達成率62.0%（ステータス: 🔴 要改善）"},
+        "recommendations": [{"text": "平均サイクルタイムが目標を上回っています", "priority": "High",
+                             "reason": "達成率が62.0%と低い"}]
+    }}}
+    rendered = []
+    placeholder = type("Placeholder", (), {"markdown": lambda self, text: rendered.append(text)})()
+    metrics = {}
+    
+    text, error = analyze_with_llm(client, llm_json, placeholder, stream_metrics=metrics)
+    
+    assert error is None
+    assert "ルールベース" in text
+    assert "**[High]** 平均サイクルタイムが目標を上回っています" in text
+    assert rendered[-1] == text
+    assert metrics["fallback"] is True
+
+def test_analyze_with_llm_reports_cache_status(openai_stub, tmp_path):
+    """応答キャッシュの状態を明示的に記録し、代替表示はキャッシュ済みと扱わないテスト"""
+    from llm_cache import LLMResponseCache
+    from llm_handler import analyze_with_llm
+    cache = LLMResponseCache(str(tmp_path), max_bytes=1024 * 1024, ttl_seconds=3600)
+    client, _ = resilient_client(openai_stub, max_retries=0)
+    placeholder = type("Placeholder", (), {"markdown": lambda self, text: None})()
+    llm_json = {"zones": {}}
+
+    def run():
+        metrics = {}
+        analyze_with_llm(client, llm_json, placeholder, response_cache=cache, stream_metrics=metrics)
+        return metrics
+
+    openai_stub.status = lambda prompt: 400
+    failed = run()
+    openai_stub.status = lambda prompt: 200
+    fresh, cached = run(), run()
+
+    assert failed["cache"] == "miss" and failed["fallback"] is True
+    assert fresh["cache"] == "miss" and fresh["tokens"] == 1
+    assert cached == {"cache": "hit"}
@@ -0,0 +1,151 @@
+import re
+import pytest
+from openai import OpenAI
+from llm_client import ResilientLLMClient
+from llm_mapreduce import zone_groups, run_map_reduce
+import llm_prompts
+from constants import LLM_MAP_REDUCE_MIN_ZONES
+from llm_prompts import build_map_prompt, build_compact_prompt, count_tokens, prompt_report
+
+# ========== テストデータ生成 ==========
+
+def create_llm_json(n_zones):
+    """n_zonesゾーン分のLLM向けJSONを作成"""
+    return {
+        "summary": {"overall_comment": f"製造ラインの{n_zones}ゾーンのサイクルタイムデータを解析しました。"},
+        "zones": {
+            f"Z{i:02d}_Assemble": {"stats": {"mean": 5.0 + i / 10, "achieve_rate": 90.0 - i}}
+            for i in range(n_zones)
+        },
+        "requested_additional_data": ["作業者情報"]
+    }
+
+def stub_reply(prompt):
+    """マップ要求にはゾーン名、リデュース要求には統合結果を返す"""
+    if "グループに分けて分析した結果" in prompt:
+        return ["ライン全体", "レポート"]
+    zones = re.search(r"ゾーン（(.*?)）", prompt).group(1)
+    return ["評価:", zones]
+
+# ========== マップ・リデューステスト ==========
+
+def test_zone_groups_and_map_prompt():
+    """ゾーンをグループに分け、マップ要求には担当ゾーンだけを含めるテスト"""
+    llm_json = create_llm_json(10)
+    
+    groups = zone_groups(llm_json, group_size=4)
+    prompt = build_map_prompt(llm_json, groups[1])
+    
+    assert [len(g) for g in groups] == [4, 4, 2]
+    assert "Z04_Assemble" in prompt and "Z00_Assemble" not in prompt
+
+def test_map_reduce_against_stub_server(openai_stub):
+    """スタブサーバーに対して同時実行数を守って並行分析し、統合レポートを返すテスト"""
+    openai_stub.delay = 0.1
+    openai_stub.reply = stub_reply
+    client = OpenAI(api_key="test", base_url=openai_stub.base_url, max_retries=0)
+    partial_updates = []
+    reduce_updates = []
+    
+    report, error = run_map_reduce(
+        client, create_llm_json(12),
+        on_partial=lambda done, total, partials: partial_updates.append((done, total, len(partials))),
+        on_reduce_delta=reduce_updates.append,
+        concurrency=2, group_size=2
+    )
+    
+    assert error is None
+    assert report == "ライン全体レポート"
+    assert len(openai_stub.requests) == 7  # マップ6件 + リデュース1件
+    assert openai_stub.max_active == 2
+    assert partial_updates == [(i, 6, i) for i in range(1, 7)]
+    assert "".join(reduce_updates) == "ライン全体レポート"
+    
+    # リデュース要求には全ゾーンの部分結果がゾーン順に含まれる
+    reduce_prompt = openai_stub.requests[-1]["messages"][-1]["content"]
+    positions = [reduce_prompt.index(f"評価:Z{i:02d}_Assemble") for i in range(0, 12, 2)]
+    assert positions == sorted(positions)
+
+def test_map_reduce_partial_failure(openai_stub):
+    """一部グループの失敗は統合レポートに注記し、全体は完了するテスト"""
+    openai_stub.reply = stub_reply
+    openai_stub.status = lambda prompt: 500 if "Z00_Assemble" in prompt and "グループに分けて" not in prompt else 200
+    client = ResilientLLMClient(OpenAI(api_key="test", base_url=openai_stub.base_url, max_retries=0), max_retries=0)
+    
+    report, error = run_map_reduce(client, create_llm_json(8), concurrency=4, group_size=4)
+    
+    assert error is None
+    assert report == "ライン全体レポート"
+    assert "1グループは分析に失敗" in openai_stub.requests[-1]["messages"][-1]["content"]
+
+def test_analyze_with_llm_streams_partials(openai_stub):
+    """多ゾーンではマップ・リデュースに切り替わり、途中経過が表示されるテスト"""
+    from llm_handler import analyze_with_llm
+    openai_stub.reply = stub_reply
+    client = OpenAI(api_key="test", base_url=openai_stub.base_url, max_retries=0)
+    rendered = []
+    placeholder = type("Placeholder", (), {"markdown": lambda self, text: rendered.append(text)})()
+    
+    report, error = analyze_with_llm(client, create_llm_json(8), placeholder)
+    
+    assert error is None
+    assert report == "ライン全体レポート"
+    assert any("ゾーン別分析 1/2 完了" in text for text in rendered)
+    assert rendered[-1] == "ライン全体レポート"
+
+# ========== プロンプト縮約テスト ==========
+
+def create_detailed_llm_json(n_zones, n_anomalies=10):
+    """異常値・推奨事項付きのLLM向けJSONを作成"""
+    llm_json = create_llm_json(n_zones)
+    for i, zone_json in enumerate(llm_json["zones"].values()):
+        zone_json["anomalies"] = [
+            {"timestamp": f"2025-10-13 09:{j:02d}:00", "value": 9.0 + j / 10, "iqr_flag": True, "zscore_flag": j % 2 == 0}
+            for j in range(n_anomalies)
+        ]
+        zone_json["recommendations"] = [
+            {"text": "ばらつきが大きいため、工程の安定化が必要です", "priority": "Medium", "reason": "標準偏差が1.2秒"}
+        ] if i % 2 else []
+    return llm_json
+
+def test_compact_prompt_saves_tokens():
+    """表形式のプロンプトが全データを含みつつJSON埋め込みより小さくなるテスト"""
+    llm_json = create_detailed_llm_json(4)
+    
+    prompt, report = build_compact_prompt(llm_json, token_budget=100000)
+    
+    assert report["saved_tokens"] > report["tokens"]
+    assert report["tokens"] == count_tokens(prompt)
+    assert not report["anomalies_summarized"] and report["zones_collapsed"] == 0
+    assert "Z03_Assemble|2025-10-13 09:09:00|9.9|1|0" in prompt
+
+def test_compact_prompt_degrades_under_budget():
+    """予算を超えると異常値の要約、低優先度ゾーンの集約の順に縮めるテスト"""
+    llm_json = create_detailed_llm_json(40)
+    full_tokens = build_compact_prompt(llm_json, token_budget=100000)[1]["tokens"]
+    
+    _, summarized = build_compact_prompt(llm_json, token_budget=full_tokens - 1)
+    prompt, collapsed = build_compact_prompt(llm_json, token_budget=summarized["tokens"] // 2)
+    
+    assert summarized["anomalies_summarized"] and summarized["zones_collapsed"] == 0
+    assert collapsed["tokens"] <= summarized["tokens"] // 2
+    assert collapsed["zones_collapsed"] > 0
+    # 推奨事項のあるゾーン（奇数番）・達成率の低いゾーンは最後まで残る
+    assert "Z39_Assemble|" in prompt
+    assert "Z00_Assemble|" not in prompt
+
+def test_prompt_report_estimated_and_map_reduce(monkeypatch):
+    """tiktokenが無い場合は概算と報告し、多ゾーンではマップ・プロンプトの合計を報告するテスト"""
+    monkeypatch.setattr(llm_prompts, "_encoder", False)
+    few, many = create_detailed_llm_json(4), create_detailed_llm_json(LLM_MAP_REDUCE_MIN_ZONES)
+    
+    single = prompt_report(few)
+    report = prompt_report(many)
+    
+    groups = zone_groups(many)
+    assert single == build_compact_prompt(few)[1]
+    assert single["estimated"] and "map_prompts" not in single
+    assert report["estimated"]
+    assert report["map_prompts"] == len(groups)
+    assert report["tokens"] == sum(count_tokens(build_map_prompt(many, zones)) for zones in groups)
+    assert report["max_tokens"] == max(count_tokens(build_map_prompt(many, zones)) for zones in groups)
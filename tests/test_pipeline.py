@@ -0,0 +1,241 @@
+import os
+import json
+import subprocess
+import sys
+import pytest
+import pandas as pd
+import numpy as np
+import pipeline
+from pipeline import run_pipeline
+from cli import run_batch, run_merged, parse_targets
+from multi_source import MultiSourceLoader, is_multi_source
+from rollup_store import RollupStore
+from data_processing import calculate_statistics
+from llm_payload import anomaly_records, generate_llm_json
+from stage_cache import StageCache
+from zone_store import ZoneStore
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+
+# ========== テストデータ生成 ==========
+
+def write_cycles_csv(path, mean, n=200, seed=0, zones=("A_Assemble", "B_Assemble")):
+    """1ライン・1日分のCSVを書き出す"""
+    rng = np.random.default_rng(seed)
+    zones = list(zones)
+    pd.DataFrame({
+        "zone_name": np.repeat(zones, n // 2),
+        "start_datetime": pd.date_range("2025-10-13 09:00", periods=n, freq="6s").astype(str),
+        "adjusted_time_seconds": rng.normal(mean, 0.3, n),
+        "is_outlier": 0
+    }).to_csv(path, index=False)
+
+# ========== パイプラインテスト ==========
+
+def test_run_pipeline_without_streamlit():
+    """ライブラリAPIがStreamlit・OpenAIを読み込まないテスト"""
+    code = "import sys, pipeline, cli; print('streamlit' in sys.modules, 'openai' in sys.modules)"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                            cwd=APP_DIR, check=True).stdout
+    
+    assert output.strip() == "False False"
+
+def test_run_pipeline_result(tmp_path):
+    """1ファイルの解析結果に統計とLLM向けJSONが含まれるテスト"""
+    csv_path = tmp_path / "cycles.csv"
+    write_cycles_csv(csv_path, 5.0)
+    
+    result, error = run_pipeline(str(csv_path), {"A_Assemble": 5.0})
+    
+    assert error is None
+    assert result["preprocess_stats"]["final_rows"] == 200
+    assert set(result["stats_dict"]) == {"A_Assemble", "B_Assemble"}
+    assert "A_Assemble" in result["llm_json"]["zones"]
+
+def test_run_pipeline_chunked_streams_statistics(tmp_path, monkeypatch):
+    """大容量ファイルのチャンク解析で、統計・集計ロールアップは全行から求まりキャッシュから復元できるテスト"""
+    csv_path = tmp_path / "cycles.csv"
+    write_cycles_csv(csv_path, 5.0, n=2_000)
+    expected, _ = run_pipeline(str(csv_path), {"A_Assemble": 5.0})
+    monkeypatch.setattr(pipeline, "CHUNKED_THRESHOLD_BYTES", 0)
+    stage_cache = StageCache(str(tmp_path / "stages"))
+    store = RollupStore(str(tmp_path / "rollups.sqlite3"))
+    
+    result, error = run_pipeline(str(csv_path), {"A_Assemble": 5.0}, stage_cache=stage_cache,
+                                 rollup_store=store)
+    cached, _ = run_pipeline(str(csv_path), {"B_Assemble": 5.0}, stage_cache=stage_cache,
+                             rollup_store=store)
+    
+    assert error is None
+    assert result["stats_dict"] == expected["stats_dict"]
+    assert result["preprocess_stats"] == expected["preprocess_stats"]
+    assert result["rollups"].row_count() == 2_000
+    expected_b = calculate_statistics(expected["df_clean"], {"B_Assemble": 5.0})
+    assert cached["stats_dict"]["B_Assemble"] == expected_b["B_Assemble"]
+    assert {"iqr_flag", "zscore_flag", "hampel_flag"} <= set(cached["df_clean"].columns)
+
+# ========== バッチCLIテスト ==========
+
+def test_run_batch_writes_reports_and_summary(tmp_path):
+    """複数ライン・複数日のCSVを並列解析し、全体サマリーを統合するテスト"""
+    input_dir = tmp_path / "input"
+    for line, mean in (("line1", 5.0), ("line2", 6.0)):
+        (input_dir / line).mkdir(parents=True)
+        for day in range(2):
+            write_cycles_csv(input_dir / line / f"day{day}.csv", mean, seed=day)
+    (input_dir / "line2" / "broken.csv").write_text("wrong_column\n1\n")
+    output_dir = tmp_path / "reports"
+    
+    summary = run_batch(str(input_dir), str(output_dir), parse_targets([], 5.0),
+                        workers=2, use_cache=False)
+    
+    assert summary["file_count"] == 5
+    assert summary["failed_count"] == 1
+    assert summary["statistics"]["A_Assemble"]["count"] == 400
+    assert (output_dir / "line1__day0.json").exists()
+    assert json.loads((output_dir / "summary.json").read_text())["file_count"] == 5
+
+def test_run_batch_glob_keeps_same_named_files_apart(tmp_path):
+    """globで別ディレクトリの同名ファイルを解析しても、レポートが上書きされないテスト"""
+    for line, mean in (("line1", 5.0), ("line2", 6.0)):
+        (tmp_path / "input" / line).mkdir(parents=True)
+        write_cycles_csv(tmp_path / "input" / line / "day0.csv", mean)
+    output_dir = tmp_path / "reports"
+    
+    summary = run_batch(str(tmp_path / "input" / "*" / "day0.csv"), str(output_dir),
+                        parse_targets([], 5.0), workers=2, use_cache=False)
+    
+    reports = sorted(entry["report"] for entry in summary["files"])
+    assert [os.path.basename(path) for path in reports] == ["line1__day0.json", "line2__day0.json"]
+    means = [json.loads(open(path).read())["statistics"]["A_Assemble"]["mean"] for path in reports]
+    assert means[0] < 5.5 < means[1]
+
+def test_parse_targets():
+    """ゾーン別目標値の指定を解釈するテスト"""
+    targets = parse_targets(["A_Assemble=5.2", "C_New=7"], 5.0)
+    
+    assert targets["A_Assemble"] == 5.2
+    assert targets["B_Assemble"] == 5.0
+    assert targets["C_New"] == 7.0
+    with pytest.raises(ValueError):
+        parse_targets(["A_Assemble"], 5.0)
+
+# ========== 複数ファイル読み込みテスト ==========
+
+def test_run_pipeline_merges_directory(tmp_path):
+    """ディレクトリ配下のファイルを統合し、ファイルごとに異なるゾーンのカテゴリを揃えるテスト"""
+    write_cycles_csv(tmp_path / "line1_day0.csv", 5.0, zones=("A_Assemble", "B_Assemble"))
+    write_cycles_csv(tmp_path / "line2_day0.csv", 6.0, zones=("A2_Assemble", "B2_Assemble"))
+    (tmp_path / "broken.csv").write_text("wrong_column\n1\n")
+    
+    result, error = run_pipeline(str(tmp_path), {"A_Assemble": 5.0})
+    
+    assert error is None
+    assert is_multi_source(str(tmp_path)) and not is_multi_source(str(tmp_path / "line1_day0.csv"))
+    df_clean = result["df_clean"]
+    assert len(df_clean) == 400 and df_clean.index.is_unique
+    assert isinstance(df_clean["zone_name"].dtype, pd.CategoricalDtype)
+    assert set(result["stats_dict"]) == {"A_Assemble", "B_Assemble", "A2_Assemble", "B2_Assemble"}
+    assert result["preprocess_stats"]["files"] == 2
+    assert list(result["preprocess_stats"]["failed_files"]) == [str(tmp_path / "broken.csv")]
+
+def test_partial_merge_not_cached(tmp_path):
+    """一部のファイルを読み込めなかった統合結果はステージキャッシュに保存しないテスト"""
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    write_cycles_csv(input_dir / "day0.csv", 5.0)
+    (input_dir / "broken.csv").write_text("wrong_column\n1\n")
+    stage_cache = StageCache(str(tmp_path / "stages"))
+    
+    result, error = run_pipeline(str(input_dir), {}, stage_cache=stage_cache)
+    
+    assert error is None and result["preprocess_stats"]["failed_files"]
+    assert stage_cache.get_json("preprocess", result["source"]) is None
+    assert stage_cache.get_json("statistics", result["source"], params={}) is None
+
+def test_multi_source_skips_unchanged_files(tmp_path):
+    """マニフェスト（サイズ・更新時刻）が変わったファイルだけを読み直すテスト"""
+    for day in range(3):
+        write_cycles_csv(tmp_path / f"day{day}.csv", 5.0, seed=day)
+    loader = MultiSourceLoader(str(tmp_path), workers=3)
+    
+    df, _, error = loader.load()
+    assert error is None and len(df) == 600
+    assert loader.last_load["read"] == 3
+    fingerprint = loader.fingerprint()
+    
+    df, _, _ = loader.load()
+    assert loader.last_load["read"] == 0 and loader.last_load["skipped"] == 3
+    assert loader.fingerprint() == fingerprint
+    
+    write_cycles_csv(tmp_path / "day1.csv", 5.0, n=100, seed=9)
+    os.remove(tmp_path / "day2.csv")
+    df, preprocess_stats, _ = loader.load()
+    assert loader.last_load["read"] == 1 and loader.last_load["removed"] == 1
+    assert len(df) == 300 and preprocess_stats["final_rows"] == 300
+    assert loader.fingerprint() != fingerprint
+
+def test_run_merged_writes_single_report(tmp_path):
+    """--merge指定時は全ファイルを1つのレポートにまとめるテスト"""
+    input_dir = tmp_path / "input"
+    for line in ("line1", "line2"):
+        (input_dir / line).mkdir(parents=True)
+        write_cycles_csv(input_dir / line / "day0.csv", 5.0)
+    output_dir = tmp_path / "reports"
+    
+    summary = run_merged(str(input_dir), str(output_dir), parse_targets([], 5.0), use_cache=False)
+    
+    assert summary["file_count"] == 2 and summary["failed_count"] == 0
+    assert summary["statistics"]["A_Assemble"]["count"] == 200
+    assert json.loads((output_dir / "merged.json").read_text())["preprocess_stats"]["files"] == 2
+
+def test_run_merged_reports_failed_files(tmp_path):
+    """--merge指定時に読み込めなかったファイルをサマリーの失敗件数とファイル一覧に含めるテスト"""
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    write_cycles_csv(input_dir / "day0.csv", 5.0)
+    (input_dir / "broken.csv").write_text("wrong_column\n1\n")
+    
+    summary = run_merged(str(input_dir), str(tmp_path / "reports"), parse_targets([], 5.0), use_cache=False)
+    
+    assert summary["file_count"] == 2 and summary["failed_count"] == 1
+    assert list(summary["files"][0]["failed_files"]) == [str(input_dir / "broken.csv")]
+
+# ========== LLM向けJSONテスト ==========
+
+def test_anomaly_records_first_per_zone():
+    """異常値レコードが各ゾーンの先頭から上限件数まで一括で作られるテスト"""
+    n = 30
+    df = pd.DataFrame({
+        "zone_name": np.tile(["A_Assemble", "Z_Extra"], n),
+        "start_datetime": pd.date_range("2025-10-13 09:00", periods=2 * n, freq="s"),
+        "adjusted_time_seconds": np.arange(2 * n) / 7,
+        "iqr_flag": np.arange(2 * n) % 3 == 0,
+        "zscore_flag": False
+    })
+    
+    records = anomaly_records(ZoneStore.from_frame(df), limit=4)
+    
+    expected = df[df["iqr_flag"]].groupby("zone_name").head(4)
+    for zone in ["A_Assemble", "Z_Extra"]:
+        zone_rows = expected[expected["zone_name"] == zone]
+        assert [r["timestamp"] for r in records[zone]] == zone_rows["start_datetime"].astype(str).tolist()
+        assert [r["value"] for r in records[zone]] == zone_rows["adjusted_time_seconds"].round(3).tolist()
+        assert all(r["iqr_flag"] and not r["zscore_flag"] for r in records[zone])
+
+def test_generate_llm_json_dynamic_zones():
+    """ZONES以外のゾーンも含め、コメントのゾーン数が実データに合うテスト"""
+    df = pd.DataFrame({
+        "zone_name": ["A_Assemble", "C_Weld", "D_Paint"],
+        "adjusted_time_seconds": [5.0, 6.0, 7.0],
+        "iqr_flag": [False, True, False],
+        "zscore_flag": False
+    })
+    stats = {zone: {"target": 5.0, "mean": 5.0, "std": 0.0, "min": 5.0, "max": 5.0,
+                    "achieve_rate": 100.0, "count": 1} for zone in df["zone_name"]}
+    
+    llm_json = generate_llm_json(df, stats, 90, 80)
+    
+    assert list(llm_json["zones"]) == ["A_Assemble", "C_Weld", "D_Paint"]
+    assert "3ゾーン" in llm_json["summary"]["overall_comment"]
+    assert llm_json["zones"]["C_Weld"]["anomalies"][0]["timestamp"] == "1"
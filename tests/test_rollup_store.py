@@ -0,0 +1,179 @@
+import pytest
+import pipeline
+import pandas as pd
+import numpy as np
+from data_processing import analyze_outliers, calculate_statistics
+from live_tail import LiveAnalysisSession
+from pipeline import run_pipeline
+from rollup_store import RollupStore, RollupView
+from visualizations import plot_timeseries_rollups
+
+# ========== テストデータ生成 ==========
+
+def create_cycles(n, start="2025-10-13 09:00", freq="7s", seed=0):
+    """2ゾーン分の異常値フラグ付きDataFrameを作成"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "zone_name": pd.Categorical(rng.choice(["A_Assemble", "B_Assemble"], n)),
+        "start_datetime": pd.date_range(start, periods=n, freq=freq),
+        "adjusted_time_seconds": rng.normal(5.0, 0.3, n).astype("float32")
+    })
+    df.loc[n // 2, "adjusted_time_seconds"] = 12.0
+    return analyze_outliers(df)
+
+@pytest.fixture
+def store(tmp_path):
+    return RollupStore(str(tmp_path / "rollups.sqlite3"))
+
+# ========== 取り込みテスト ==========
+
+def test_rollup_statistics_match_raw(store):
+    """集計から求めた統計が生データの統計と一致し、同じ版数は取り込み直さないテスト"""
+    df = create_cycles(20_000)
+    target_values = {"A_Assemble": 5.2}
+
+    assert store.ingest("cycles", df, "v1")
+    assert not store.ingest("cycles", df, "v1")
+    rollups = store.view("cycles")
+
+    assert calculate_statistics(df, target_values, rollups=rollups) == calculate_statistics(df, target_values)
+    assert rollups.row_count() == len(df)
+
+def test_rollup_append_matches_ingest(store):
+    """追記分の加算（ライブ取り込み）が一括取り込みと同じ集計になるテスト"""
+    df = create_cycles(5_000)
+    for start in range(0, len(df), 1_000):
+        store.append("live", df.iloc[start:start + 1_000])
+    store.ingest("batch", df, "v1")
+
+    live, batch = store.view("live"), store.view("batch")
+
+    assert live.statistics({}) == batch.statistics({})
+    for zone, series in batch.timeseries().items():
+        pd.testing.assert_frame_equal(live.timeseries()[zone], series)
+
+def test_rollup_time_range_statistics(store):
+    """期間指定の統計が分単位の集計から求まるテスト"""
+    df = create_cycles(20_000)
+    store.ingest("cycles", df, "v1")
+    time_range = (pd.Timestamp("2025-10-13 12:00"), pd.Timestamp("2025-10-13 14:59:59"))
+
+    stats = store.view("cycles").statistics({}, time_range)
+
+    in_range = df[df["start_datetime"].between(*time_range)]
+    assert stats == calculate_statistics(in_range, {})
+
+# ========== 表示用問い合わせテスト ==========
+
+def test_rollup_timeseries_points_bounded(store):
+    """表示点数が蓄積期間の長さによらず上限以下になるテスト（長期間は時単位の集計）"""
+    df = create_cycles(200_000, freq="40s")  # 約3か月
+    store.ingest("cycles", df, "v1")
+    rollups = store.view("cycles")
+
+    series = rollups.timeseries(max_points=500)
+    zoomed = rollups.timeseries((pd.Timestamp("2025-10-14 00:00"), pd.Timestamp("2025-10-14 06:00")),
+                                max_points=500)
+
+    assert all(len(data) <= 500 for data in series.values())
+    assert sum(data["count"].sum() for data in series.values()) == len(df)
+    assert (zoomed["A_Assemble"]["time"].diff().dropna() == pd.Timedelta(minutes=1)).any()
+    fig = plot_timeseries_rollups(rollups, {}, max_points=500)
+    assert len(fig.data[2].x) == len(series["A_Assemble"])
+
+def test_rollup_histogram_counts(store):
+    """集計から作ったヒストグラムの度数が全件と一致し、ビン幅が保存ビンの整数倍になるテスト"""
+    df = create_cycles(20_000)
+    store.ingest("cycles", df, "v1")
+
+    edges, counts = store.view("cycles").histogram(bins=30)
+
+    assert len(edges) <= 31
+    assert sum(int(c.sum()) for c in counts.values()) == len(df)
+    widths = np.diff(edges) / store.bin_width
+    np.testing.assert_allclose(widths, np.round(widths[0]))
+
+def test_run_pipeline_updates_rollups(tmp_path, store):
+    """パイプライン実行時に集計が更新され、入力が変わらなければ取り込み直さないテスト"""
+    csv_path = tmp_path / "cycles.csv"
+    create_cycles(2_000)[["zone_name", "start_datetime", "adjusted_time_seconds"]].to_csv(csv_path, index=False)
+
+    result, error = run_pipeline(str(csv_path), {}, rollup_store=store)
+    version = store.version(str(csv_path))
+    run_pipeline(str(csv_path), {}, rollup_store=store)
+
+    assert error is None
+    assert result["rollups"].statistics({}) == result["stats_dict"]
+    assert store.version(str(csv_path)) == version is not None
+
+def test_live_sessions_keep_separate_rollups(tmp_path, store):
+    """同じファイルを追う2つのライブセッションが互いの集計を消したり二重に加算したりしないテスト"""
+    csv_path = tmp_path / "live.csv"
+    create_cycles(500)[["zone_name", "start_datetime", "adjusted_time_seconds"]].to_csv(csv_path, index=False)
+    first = LiveAnalysisSession(str(csv_path), rollup_store=store)
+    first.poll()
+    second = LiveAnalysisSession(str(csv_path), rollup_store=store)
+    second.poll()
+
+    assert first.rollups().row_count() == second.rollups().row_count() == 500
+    second.close()
+    assert second.rollups().row_count() == 0
+    assert first.rollups().row_count() == 500
+
+def test_run_pipeline_statistics_from_rollups(tmp_path, store, monkeypatch):
+    """しきい値以上の行数では統計を集計ロールアップから求めるテスト"""
+    csv_path = tmp_path / "cycles.csv"
+    create_cycles(2_000)[["zone_name", "start_datetime", "adjusted_time_seconds"]].to_csv(csv_path, index=False)
+    expected, _ = run_pipeline(str(csv_path), {"A_Assemble": 5.2})
+    calls = []
+    statistics = RollupView.statistics
+    monkeypatch.setattr(RollupView, "statistics", lambda self, *args: calls.append(args) or statistics(self, *args))
+    monkeypatch.setattr(pipeline, "ROLLUP_VIEW_MIN_ROWS", 1)
+
+    result, error = run_pipeline(str(csv_path), {"A_Assemble": 5.2}, rollup_store=store)
+
+    assert error is None
+    assert calls
+    assert result["stats_dict"] == expected["stats_dict"]
+
+def test_run_pipeline_without_start_datetime_skips_rollups(tmp_path, store, monkeypatch):
+    """start_datetimeの無いCSVでは集計を使わず、生データから統計を求めるテスト"""
+    csv_path = tmp_path / "cycles.csv"
+    create_cycles(2_000)[["zone_name", "adjusted_time_seconds"]].to_csv(csv_path, index=False)
+    expected, _ = run_pipeline(str(csv_path), {"A_Assemble": 5.2})
+    monkeypatch.setattr(pipeline, "ROLLUP_VIEW_MIN_ROWS", 1)
+
+    result, error = run_pipeline(str(csv_path), {"A_Assemble": 5.2}, rollup_store=store)
+
+    assert error is None
+    assert result["rollups"] is None
+    assert result["stats_dict"] == expected["stats_dict"]
+
+def test_run_pipeline_partial_timestamps_skips_rollups(tmp_path, store, monkeypatch):
+    """半数のstart_datetimeを解釈できないデータでは集計を使わず、全行から統計を求めるテスト"""
+    csv_path = tmp_path / "cycles.csv"
+    df = create_cycles(2_000)[["zone_name", "start_datetime", "adjusted_time_seconds"]]
+    df["start_datetime"] = df["start_datetime"].astype(str).where(df.index % 2 == 0, "不明")
+    df.to_csv(csv_path, index=False)
+    expected, _ = run_pipeline(str(csv_path), {"A_Assemble": 5.2})
+    monkeypatch.setattr(pipeline, "ROLLUP_VIEW_MIN_ROWS", 1)
+
+    result, error = run_pipeline(str(csv_path), {"A_Assemble": 5.2}, rollup_store=store)
+
+    assert error is None
+    assert result["rollups"] is None
+    assert expected["preprocess_stats"]["final_rows"] == 2_000
+    assert result["stats_dict"] == expected["stats_dict"]
+
+def test_rollup_variance_without_cancellation(store):
+    """平均が大きく分散が小さい値でも、集計（追記の統合を含む）の標準偏差が生データと一致するテスト"""
+    df = create_cycles(6_000)
+    df["adjusted_time_seconds"] = 1e8 + df["adjusted_time_seconds"].astype("float64")
+    for start in range(0, len(df), 1_500):
+        store.append("live", df.iloc[start:start + 1_500])
+
+    stats = store.view("live").statistics({})
+
+    expected = df.groupby("zone_name", observed=True)["adjusted_time_seconds"].std()
+    for zone, std in expected.items():
+        assert stats[zone]["std"] == round(std, 1) > 0
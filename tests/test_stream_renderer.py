@@ -0,0 +1,74 @@
+import pytest
+from openai import OpenAI
+from stream_renderer import StreamRenderer
+
+# ========== テスト用の表示先・時計 ==========
+
+class FakePlaceholder:
+    def __init__(self):
+        self.rendered = []
+
+    def markdown(self, text):
+        self.rendered.append(text)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+# ========== ストリーミング表示テスト ==========
+
+def test_renderer_coalesces_by_frame_rate():
+    """チャンクごとではなく更新間隔ごとにまとめて表示するテスト"""
+    placeholder = FakePlaceholder()
+    clock = FakeClock()
+    renderer = StreamRenderer(placeholder, fps=10, max_chunks=1000, clock=clock)
+    
+    clock.now = 0.5  # 初回トークンまで0.5秒
+    for i in range(200):
+        renderer.feed(f"t{i} ")
+        clock.now += 0.01
+    text = renderer.finish()
+    
+    assert text == "".join(f"t{i} " for i in range(200))
+    assert placeholder.rendered[-1] == text
+    assert all(r.endswith("▌") for r in placeholder.rendered[:-1])
+    assert len(placeholder.rendered) <= 22  # 2秒間 × 10回/秒 + 初回 + 確定
+    
+    metrics = renderer.metrics()
+    assert metrics["ttft_seconds"] == 0.5
+    assert metrics["tokens"] == 200
+    assert metrics["tokens_per_second"] == pytest.approx(100.0)
+    assert metrics["flushes"] == len(placeholder.rendered)
+
+def test_renderer_flushes_on_chunk_threshold():
+    """更新間隔内でもチャンク数の上限に達したら表示するテスト"""
+    placeholder = FakePlaceholder()
+    clock = FakeClock()
+    renderer = StreamRenderer(placeholder, fps=1, max_chunks=50, clock=clock)
+    
+    for _ in range(120):
+        renderer.feed("x")
+    
+    assert [len(r) for r in placeholder.rendered] == [51, 101]  # カーソル1文字を含む
+    assert renderer.text == "x" * 120
+
+def test_analyze_with_llm_reports_stream_metrics(openai_stub):
+    """スタブサーバーからの応答を表示し、TTFT・トークン/秒を記録するテスト"""
+    from llm_handler import analyze_with_llm
+    openai_stub.reply = lambda prompt: [f"{i}," for i in range(300)]
+    client = OpenAI(api_key="test", base_url=openai_stub.base_url, max_retries=0)
+    placeholder = FakePlaceholder()
+    metrics = {}
+    
+    text, error = analyze_with_llm(client, {"zones": {}}, placeholder, stream_metrics=metrics)
+    
+    assert error is None
+    assert text == "".join(f"{i}," for i in range(300))
+    assert placeholder.rendered[-1] == text
+    assert len(placeholder.rendered) < 300
+    assert metrics["tokens"] == 300
+    assert metrics["ttft_seconds"] >= 0
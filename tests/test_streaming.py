@@ -0,0 +1,262 @@
+import pytest
+import pandas as pd
+import numpy as np
+from data_processing import detect_outliers_iqr, detect_outliers_zscore
+from streaming import TDigest, RunningMoments, StreamingOutlierDetector, ZoneStatsAccumulator
+from live_tail import CsvTailReader, LiveAnalysisSession
+
+# ========== テストデータ生成 ==========
+
+def create_stream_dataframe(n_per_zone=5000, seed=0):
+    """ストリーミング検証用のDataFrameを作成（外れ値入り）"""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for zone, (mean, std) in {"A_Assemble": (5.0, 0.5), "B_Assemble": (7.0, 1.0)}.items():
+        values = rng.normal(mean, std, n_per_zone)
+        outlier_idx = rng.choice(n_per_zone, n_per_zone // 100, replace=False)
+        values[outlier_idx] += rng.uniform(4, 8, len(outlier_idx))
+        frames.append(pd.DataFrame({"zone_name": zone, "adjusted_time_seconds": values}))
+    # 到着順を混ぜる
+    df = pd.concat(frames, ignore_index=True)
+    return df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+def feed_in_batches(detector, df, batch_size=500):
+    for start in range(0, len(df), batch_size):
+        detector.update(df.iloc[start:start + batch_size])
+    return detector
+
+# ========== t-digestテスト ==========
+
+@pytest.mark.parametrize("q", [0.05, 0.25, 0.5, 0.75, 0.95])
+def test_tdigest_rank_error(q):
+    """推定分位点の順位誤差が0.5%以内に収まるテスト"""
+    values = np.random.default_rng(1).lognormal(1.5, 0.3, 50000)
+    digest = TDigest()
+    for batch in np.array_split(values, 100):
+        digest.update(batch)
+    
+    estimate = digest.quantile(q)
+    
+    assert abs((values <= estimate).mean() - q) < 0.005
+    assert len(digest._means) < 2 * digest.compression
+
+def test_tdigest_exact_for_small_input():
+    """圧縮前の少量データはpandasのquantileと一致するテスト"""
+    values = pd.Series([4.2, 5.1, 4.8, 6.3, 5.0, 4.9, 12.0])
+    digest = TDigest()
+    digest.update(values)
+    
+    for q in (0.25, 0.5, 0.75):
+        assert digest.quantile(q) == pytest.approx(values.quantile(q))
+
+def test_tdigest_merge_matches_single():
+    """シャードごとのスケッチを統合しても誤差が増えないテスト"""
+    values = np.random.default_rng(2).normal(6.0, 1.0, 40000)
+    shards = [TDigest() for _ in range(4)]
+    for shard, part in zip(shards, np.array_split(values, 4)):
+        shard.update(part)
+    merged = shards[0]
+    for shard in shards[1:]:
+        merged.merge(shard)
+    
+    assert merged.count == len(values)
+    for q in (0.25, 0.75):
+        assert abs((values <= merged.quantile(q)).mean() - q) < 0.005
+
+def test_tdigest_quantile_cached_until_update(monkeypatch):
+    """分位点の問い合わせだけでは圧縮し直さず、値が追加されたときだけ求め直すテスト"""
+    digest = TDigest(buffer_size=1000)
+    digest.update(np.arange(100.0))
+    compressions = []
+    merge_centroids = TDigest._merge_centroids
+    monkeypatch.setattr(TDigest, "_merge_centroids",
+                        lambda self, *args: compressions.append(1) or merge_centroids(self, *args))
+    
+    first = [digest.quantile(q) for q in (0.25, 0.75)]
+    assert [digest.quantile(q) for q in (0.25, 0.75)] == first
+    assert len(compressions) == 1
+    
+    digest.update([1000.0] * 50)
+    assert digest.quantile(0.75) > first[1]
+    assert len(compressions) == 2
+
+def test_streaming_detector_bounds_cached_until_update():
+    """判定しきい値は次のバッチ取り込みまで再計算しないテスト"""
+    detector = StreamingOutlierDetector()
+    df = pd.DataFrame({"zone_name": ["A_Assemble"] * 200,
+                       "adjusted_time_seconds": np.random.default_rng(0).normal(5.0, 0.3, 200)})
+    detector.update(df)
+    
+    bounds = detector.bounds()
+    detector.flag(df)
+    assert detector.bounds() is bounds
+    detector.update(df.assign(adjusted_time_seconds=df["adjusted_time_seconds"] + 1.0))
+    assert detector.bounds() is not bounds
+    assert detector.bounds().loc["A_Assemble", "count"] == 400
+
+# ========== 逐次モーメントテスト ==========
+
+def test_running_moments_matches_pandas():
+    """Welford法の平均・標準偏差がpandasと一致するテスト"""
+    values = pd.Series(np.random.default_rng(3).normal(5.0, 0.7, 10000))
+    moments = RunningMoments()
+    left = RunningMoments()
+    for batch in np.array_split(values.to_numpy(), 37):
+        moments.update(batch)
+    for batch in np.array_split(values.to_numpy()[:5000], 5):
+        left.update(batch)
+    right = RunningMoments()
+    right.update(values.to_numpy()[5000:])
+    left.merge(right)
+    
+    for result in (moments, left):
+        assert result.count == len(values)
+        assert result.mean == pytest.approx(values.mean(), rel=1e-12)
+        assert result.std == pytest.approx(values.std(), rel=1e-9)
+        assert result.min == values.min()
+        assert result.max == values.max()
+
+# ========== 逐次統計テスト ==========
+
+def expected_zone_stats(df, target_values):
+    """全件を再走査して求めたゾーン別統計（比較用）"""
+    expected = {}
+    for zone, series in df.groupby("zone_name")["adjusted_time_seconds"]:
+        target = target_values.get(zone, 5.0)
+        expected[zone] = {
+            "target": round(target, 1),
+            "mean": round(series.mean(), 1),
+            "min": round(series.min(), 1),
+            "max": round(series.max(), 1),
+            "std": round(series.std(), 1),
+            "achieve_rate": round(target / series.mean() * 100, 1),
+            "count": len(series)
+        }
+    return expected
+
+def test_zone_stats_accumulator_matches_full_scan():
+    """バッチ追加した逐次統計が全件走査と同じstats_dictになるテスト"""
+    df = create_stream_dataframe()
+    target_values = {"A_Assemble": 5.0, "B_Assemble": 6.5}
+    accumulator = ZoneStatsAccumulator()
+    for start in range(0, len(df), 700):
+        accumulator.update(df.iloc[start:start + 700])
+    
+    assert accumulator.to_stats_dict(target_values) == expected_zone_stats(df, target_values)
+    assert list(accumulator.to_stats_dict(target_values)) == ["A_Assemble", "B_Assemble"]
+
+def test_zone_stats_accumulator_merge_and_serialize(tmp_path):
+    """日次の集計を保存・復元してから週次に統合できるテスト"""
+    df = create_stream_dataframe()
+    daily_paths = []
+    for day, start in enumerate(range(0, len(df), 2000)):
+        path = tmp_path / f"day{day}.json"
+        ZoneStatsAccumulator().update(df.iloc[start:start + 2000]).save(path)
+        daily_paths.append(path)
+    
+    weekly = ZoneStatsAccumulator()
+    for path in daily_paths:
+        weekly.merge(ZoneStatsAccumulator.load(path))
+    
+    assert weekly.to_stats_dict({}) == expected_zone_stats(df, {})
+
+# ========== ストリーミング異常値検出テスト ==========
+
+def test_streaming_detector_matches_exact_detection():
+    """全件取り込み後の判定が厳密なIQR法・Z-score法とほぼ一致するテスト"""
+    df = create_stream_dataframe()
+    detector = feed_in_batches(StreamingOutlierDetector(), df)
+    
+    flagged = detector.flag(df)
+    
+    for zone, zone_df in df.groupby("zone_name"):
+        series = zone_df["adjusted_time_seconds"]
+        iqr_exact = detect_outliers_iqr(series)
+        zscore_exact = detect_outliers_zscore(series)
+        iqr_mismatch = (flagged.loc[series.index, "iqr_flag"] != iqr_exact).mean()
+        zscore_mismatch = (flagged.loc[series.index, "zscore_flag"] != zscore_exact).mean()
+        assert iqr_mismatch <= 0.002
+        assert zscore_mismatch == 0
+
+def test_streaming_detector_flags_incoming_batch():
+    """新しいバッチに明確な外れ値が含まれる場合に検出されるテスト"""
+    df = create_stream_dataframe(n_per_zone=2000)
+    detector = feed_in_batches(StreamingOutlierDetector(), df)
+    batch = pd.DataFrame({
+        "zone_name": ["A_Assemble", "A_Assemble", "B_Assemble", "C_New"],
+        "adjusted_time_seconds": [5.0, 15.0, 7.0, 3.0]
+    })
+    
+    flagged = detector.update(batch)
+    
+    assert flagged["iqr_flag"].tolist() == [False, True, False, False]
+    assert flagged["zscore_flag"].tolist() == [False, True, False, False]
+
+def test_streaming_detector_merge_shards():
+    """ワーカーごとの検出器を統合した結果が単一検出器と一致するテスト"""
+    df = create_stream_dataframe()
+    single = feed_in_batches(StreamingOutlierDetector(), df)
+    parts = [df.iloc[start:start + len(df) // 3 + 1] for start in range(0, len(df), len(df) // 3 + 1)]
+    shards = [feed_in_batches(StreamingOutlierDetector(), part) for part in parts]
+    merged = shards[0]
+    for shard in shards[1:]:
+        merged.merge(shard)
+    
+    single_bounds = single.bounds()
+    merged_bounds = merged.bounds().loc[single_bounds.index]
+    
+    assert (merged_bounds["count"] == single_bounds["count"]).all()
+    np.testing.assert_allclose(merged_bounds["mean"], single_bounds["mean"], rtol=1e-12)
+    np.testing.assert_allclose(merged_bounds[["q1", "q3"]], single_bounds[["q1", "q3"]], atol=0.02)
+
+# ========== ライブ取り込みテスト ==========
+
+CSV_HEADER = "zone_name,cycle_number,start_datetime,end_frame,adjusted_time_seconds,is_outlier\n"
+
+def csv_rows(start, count, value=5.0):
+    return "".join(
+        f"A_Assemble,{i},2025-10-13 09:00:{i % 60:02d},0,{value},0\n" for i in range(start, start + count)
+    )
+
+def test_tail_reader_reads_only_appended_complete_lines(tmp_path):
+    """追記分の完全な行だけを読み、書き込み途中の行は次回に回すテスト"""
+    path = tmp_path / "live.csv"
+    path.write_text(CSV_HEADER + csv_rows(0, 3))
+    reader = CsvTailReader(str(path))
+    
+    first = reader.read_new_rows()
+    with open(path, "a") as f:
+        f.write(csv_rows(3, 2) + "A_Assemble,5,2025-10-13")  # 最終行は書き込み途中
+    second = reader.read_new_rows()
+    with open(path, "a") as f:
+        f.write(" 09:00:05,0,6.0,0\n")
+    third = reader.read_new_rows()
+    
+    assert first["cycle_number"].tolist() == [0, 1, 2]
+    assert second["cycle_number"].tolist() == [3, 4]
+    assert third["cycle_number"].tolist() == [5]
+    assert "end_frame" not in third.columns
+    assert reader.read_new_rows() is None
+
+def test_live_session_updates_incrementally(tmp_path):
+    """ライブ解析が追記分だけで前処理カウンタと統計を更新するテスト"""
+    path = tmp_path / "live.csv"
+    path.write_text(CSV_HEADER + csv_rows(0, 50) + "A_Assemble,50,2025-10-13 09:00:50,0,-1.0,0\n")
+    session = LiveAnalysisSession(str(path), window_rows=20)
+    
+    assert session.poll() == (51, None)
+    version = session.data_version()
+    assert session.poll() == (0, None)
+    assert session.data_version() == version
+    with open(path, "a") as f:
+        f.write(csv_rows(51, 10, value=7.0))
+    assert session.poll() == (10, None)
+    assert session.data_version() != version
+    
+    assert session.preprocess_stats == {
+        "original_rows": 61, "removed_missing": 0, "removed_invalid": 1, "final_rows": 60
+    }
+    assert session.stats_dict({})["A_Assemble"]["count"] == 60
+    assert session.stats_dict({})["A_Assemble"]["max"] == 7.0
+    assert len(session.recent_frame()) == 20
+    assert {"iqr_flag", "zscore_flag"} <= set(session.recent_frame().columns)
@@ -0,0 +1,108 @@
+import pytest
+import pandas as pd
+import numpy as np
+from visualizations import plot_histograms, plot_timeseries, histogram_counts, plot_bucket_heatmap
+from time_buckets import bucket_statistics
+from zone_store import ZoneStore
+
+# ========== テストデータ生成 ==========
+
+def create_plot_dataframe(n_per_zone):
+    """4ゾーン分の描画用DataFrameを作成"""
+    rng = np.random.default_rng(0)
+    zones = ["A_Assemble", "A2_Assemble", "B_Assemble", "B2_Assemble"]
+    return pd.DataFrame({
+        "zone_name": np.repeat(zones, n_per_zone),
+        "adjusted_time_seconds": rng.normal(6.0, 1.0, n_per_zone * 4),
+        "start_datetime": pd.date_range("2025-10-13 09:00", periods=n_per_zone * 4, freq="s")
+    })
+
+# ========== ヒストグラムテスト ==========
+
+def test_histogram_counts_shared_edges():
+    """全ゾーン共通のビン境界で、度数の合計が行数と一致するテスト"""
+    store = ZoneStore.from_frame(create_plot_dataframe(1000))
+    
+    edges, counts = histogram_counts(store, bins=30)
+    
+    assert len(edges) == 31
+    assert edges[0] == store.values().min()
+    assert edges[-1] == store.values().max()
+    for zone, zone_counts in counts.items():
+        assert zone_counts.sum() == store.count(zone)
+
+def test_histogram_counts_constant_values():
+    """全て同じ値でも幅のあるビンになり、値が中央のビンに入るテスト（np.histogramと同じ）"""
+    df = create_plot_dataframe(100).assign(adjusted_time_seconds=np.float32(5.0))
+    store = ZoneStore.from_frame(df)
+    
+    edges, counts = histogram_counts(store, bins=10)
+    
+    np.testing.assert_allclose(edges, np.histogram(np.full(3, 5.0), bins=10)[1])
+    for zone_counts in counts.values():
+        assert zone_counts[5] == zone_counts.sum() == 100
+
+def test_histogram_payload_independent_of_rows():
+    """図のデータ量が行数ではなくビン数で決まるテスト"""
+    small = plot_histograms(create_plot_dataframe(100), {}, bins=30)
+    large = plot_histograms(create_plot_dataframe(20000), {}, bins=30)
+    
+    assert all(len(trace.x) == 30 for trace in large.data)
+    assert len(large.to_json()) < len(small.to_json()) * 1.5
+
+# ========== 時系列ダウンサンプリングテスト ==========
+
+def test_downsample_indices_keeps_extremes():
+    """LTTB/最小最大の間引きが点数上限を守り、スパイクと端点を残すテスト"""
+    from downsampling import downsample_indices
+    rng = np.random.default_rng(1)
+    y = rng.normal(6.0, 0.1, 50000)
+    y[12345] = 20.0
+    x = np.arange(len(y))
+    
+    for method in ["lttb", "minmax"]:
+        idx = downsample_indices(x, y, 500, method)
+        assert len(idx) <= 502
+        assert idx[0] == 0 and idx[-1] == len(y) - 1
+        assert 12345 in idx
+        assert np.all(np.diff(idx) > 0)
+
+def test_timeseries_downsampled_with_full_ma():
+    """時系列が上限点数まで間引かれ、移動平均は全データで計算されるテスト"""
+    df = create_plot_dataframe(10000)
+    
+    fig = plot_timeseries(df, {}, show_ma=True, ma_window=5, max_points=500)
+    
+    assert all(trace.type == "scattergl" for trace in fig.data)
+    assert all(len(trace.x) <= 502 for trace in fig.data)
+    
+    zone_df = df[df["zone_name"] == "A_Assemble"]
+    full_ma = zone_df["adjusted_time_seconds"].rolling(5, center=True).mean()
+    ma_trace = fig.data[1]
+    expected = full_ma.set_axis(zone_df["start_datetime"]).loc[pd.to_datetime(ma_trace.x)]
+    assert np.allclose(ma_trace.y, expected.to_numpy())
+
+def test_timeseries_time_range_zoom():
+    """表示範囲を狭めると範囲内の点だけが描画されるテスト"""
+    df = create_plot_dataframe(10000)
+    start, end = pd.Timestamp("2025-10-13 09:10"), pd.Timestamp("2025-10-13 09:20")
+    
+    fig = plot_timeseries(df, {}, max_points=2000, time_range=(start, end))
+    
+    x = pd.to_datetime(fig.data[0].x)
+    assert x.min() >= start and x.max() <= end
+    assert len(x) == 601
+
+# ========== 時間帯別ヒートマップテスト ==========
+
+def test_bucket_heatmap_zone_by_bucket():
+    """ゾーン×区間の行列で描画し、データ量が行数ではなく区間数で決まるテスト"""
+    df = create_plot_dataframe(5000)
+    bucket_stats = bucket_statistics(ZoneStore.from_frame(df), {}, by="30min")
+    
+    fig = plot_bucket_heatmap(bucket_stats, "achieve_rate")
+    
+    heatmap = fig.data[0]
+    assert list(heatmap.y) == ["A_Assemble", "A2_Assemble", "B_Assemble", "B2_Assemble"]
+    assert len(heatmap.x) == bucket_stats["bucket"].nunique()
+    assert np.asarray(heatmap.z).shape == (4, len(heatmap.x))
@@ -0,0 +1,46 @@
+import pytest
+import pandas as pd
+import numpy as np
+from zone_store import ZoneStore
+
+# ========== テストデータ生成 ==========
+
+def create_store_dataframe():
+    """ゾーンが混在した順序のDataFrameを作成"""
+    return pd.DataFrame({
+        "zone_name": ["B_Assemble", "A_Assemble", "Z_Extra", "A_Assemble", None, "B_Assemble"],
+        "adjusted_time_seconds": [7.0, 5.0, 9.0, 5.5, 4.0, 7.5],
+        "start_datetime": pd.date_range("2025-10-13 09:00", periods=6, freq="6s"),
+        "iqr_flag": [False, False, True, True, False, False],
+        "zscore_flag": [False, False, False, True, False, True]
+    }, index=range(10, 16))
+
+# ========== ゾーン別ストアテスト ==========
+
+def test_zone_store_views():
+    """ゾーンごとに元の行順を保ったビューが返るテスト"""
+    store = ZoneStore.from_frame(create_store_dataframe())
+    
+    assert store.zones == ["A_Assemble", "B_Assemble", "Z_Extra"]
+    assert len(store) == 5  # ゾーン欠損行は含まない
+    assert store.values("A_Assemble").tolist() == [5.0, 5.5]
+    assert store.rows("B_Assemble").tolist() == [10, 15]
+    assert store.flag("A_Assemble", "iqr_flag").tolist() == [False, True]
+    assert store.timestamps("Z_Extra")[0] == np.datetime64("2025-10-13T09:00:12")
+    assert np.shares_memory(store.values("B_Assemble"), store.values())
+    assert store.values("C_Missing").size == 0
+
+def test_zone_store_save_and_mmap(tmp_path):
+    """保存したストアをメモリマップで開いて同じ内容が得られるテスト"""
+    store = ZoneStore.from_frame(create_store_dataframe())
+    store.save(tmp_path / "store")
+    
+    loaded = ZoneStore.load(tmp_path / "store", mmap=True)
+    
+    assert isinstance(loaded.values(), np.memmap)
+    assert loaded.token == store.token
+    assert loaded.zones == store.zones
+    for zone in store.zones:
+        np.testing.assert_array_equal(loaded.values(zone), store.values(zone))
+        np.testing.assert_array_equal(loaded.timestamps(zone), store.timestamps(zone))
+        np.testing.assert_array_equal(loaded.flag(zone, "zscore_flag"), store.flag(zone, "zscore_flag"))